@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from functools import lru_cache
+from glob import glob
+from multiprocessing import cpu_count
+from typing import List, Optional, Sequence, Tuple
+
+from logging_util import init_logger
+
+log = init_logger(__name__, debug_mode=False)
+
+ARCHIVE_THREADS_ENV = "QT_PACKAGING_ARCHIVE_THREADS"
+ARCHIVE_PROFILE_ENV = "QT_PACKAGING_ARCHIVE_PROFILE"
+# compression level by profile name, 7z and the tar compressors share the 1-9 range
+COMPRESSION_PROFILES = {"fast": 1, "normal": 5, "max": 9}
+DEFAULT_COMPRESSION_PROFILE = "normal"
+ARCHIVE_FORMATS = {
+    ".7z": "7z", ".zip": "zip", ".tar": "tar", ".tar.gz": "gz", ".tgz": "gz",
+    ".tar.xz": "xz", ".txz": "xz", ".tar.bz2": "bz2", ".tbz": "bz2",
+}
+# tar flag for the built-in single threaded compressors
+TAR_COMPRESSION_FLAGS = {"tar": "", "gz": "z", "xz": "J", "bz2": "j"}
+# external compressors usable by tar in order of preference and their thread count option
+TAR_COMPRESSORS = {
+    "gz": [("pigz", "-p {threads}")],
+    "xz": [("pixz", "-p {threads}"), ("xz", "-T{threads}")],
+    "bz2": [("lbzip2", "-n {threads}"), ("pbzip2", "-p{threads}")],
+}
+# 7z installed with Homebrew is not necessarily in PATH on macOS
+PROGRAM_FALLBACK_PATHS = {"7z": "/usr/local/bin/7z"}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+@dataclass
+class ArchiveReport:
+    """Statistics of a single extract or compress operation"""
+
+    operation: str
+    archive: str
+    backend: str
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Archive bytes processed per second"""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.operation} {self.archive} using {self.backend}: {self.bytes} bytes in "
+            f"{self.seconds:.2f}s ({self.throughput / 1e6:.1f} MB/s)"
+        )
+
+
+def archive_format(path: str) -> Optional[str]:
+    suffix = next((s for s in sorted(ARCHIVE_FORMATS, key=len, reverse=True) if path.lower().endswith(s)), None)
+    return ARCHIVE_FORMATS[suffix] if suffix else None
+
+
+def archive_threads(threads: Optional[int] = None) -> int:
+    """The thread count from the argument, QT_PACKAGING_ARCHIVE_THREADS or the CPU count"""
+    return max(1, threads or int(os.environ.get(ARCHIVE_THREADS_ENV) or cpu_count()))
+
+
+def compression_level(profile: Optional[str] = None) -> int:
+    """The compression level of the profile from the argument or QT_PACKAGING_ARCHIVE_PROFILE"""
+    profile = profile or os.environ.get(ARCHIVE_PROFILE_ENV) or DEFAULT_COMPRESSION_PROFILE
+    if profile not in COMPRESSION_PROFILES:
+        raise ArchiveError(f"Unknown compression profile '{profile}', use one of: {list(COMPRESSION_PROFILES)}")
+    return COMPRESSION_PROFILES[profile]
+
+
+@lru_cache(maxsize=None)
+def find_program(name: str) -> Optional[str]:
+    """Return the name of the program if it can be run from PATH, else the fallback location"""
+    if shutil.which(name):
+        return name
+    fallback = PROGRAM_FALLBACK_PATHS.get(name)
+    return fallback if fallback and os.path.isfile(fallback) else None
+
+
+def _tar_compress_program(fmt: str, threads: int, level: Optional[int] = None) -> Optional[Tuple[str, str]]:
+    """Return the name and the command line of the fastest available parallel compressor"""
+    for program, thread_option in TAR_COMPRESSORS.get(fmt, []):
+        if find_program(program):
+            options = thread_option.format(threads=threads) + ("" if level is None else f" -{level}")
+            return program, f"{program} {options}"
+    return None
+
+
+def _archive_command(
+    fmt: str, tar_mode: str, threads: int, level: Optional[int] = None
+) -> Tuple[str, List[str]]:
+    """Return the backend name and the command line without the archive and file arguments"""
+    if fmt in ("7z", "zip"):
+        sevenzip = find_program("7z") or "7z"
+        if tar_mode == "x":
+            return "7z", [sevenzip, "x", "-y", f"-mmt={threads}"]
+        return "7z", [sevenzip, "a", f"-t{fmt}", f"-mx{level}", f"-mmt={threads}"]
+    tar = find_program("tar") or "tar"
+    compressor = _tar_compress_program(fmt, threads, level)
+    if compressor:
+        name, command = compressor
+        return f"tar+{name}", [tar, f"--use-compress-program={command}", f"-{tar_mode}f"]
+    return "tar", [tar, f"-{tar_mode}{TAR_COMPRESSION_FLAGS[fmt]}f"]
+
+
+def _extract_format(path: str) -> str:
+    fmt = archive_format(path)
+    if fmt is None and fnmatch(path, "*.tar*"):
+        # let tar detect the compression of the other tar variants
+        fmt = "tar"
+    if fmt is None:
+        raise ArchiveError(f"Could not find suitable extractor for: {path}")
+    return fmt
+
+
+def extract_command(path: str, threads: Optional[int] = None) -> List[str]:
+    """Return the fastest command line extracting the archive into the working directory"""
+    fmt = _extract_format(path)
+    return _archive_command(fmt, "x", archive_threads(threads))[1] + [path]
+
+
+def _run(cmd: List[str], cwd: str) -> None:
+    # imported here, runner imports bld_utils which imports this module
+    from runner import run_cmd  # pylint: disable=import-outside-toplevel
+
+    # streamed, the output is logged as it arrives and only its tail is kept in memory
+    run_cmd(cmd=cmd, cwd=cwd, stream=True)
+
+
+def _expand_wildcards(sources: Sequence[str], cwd: str) -> List[str]:
+    """Expand the wildcards in the sources like 7z does, tar does not do it by itself"""
+    expanded = []
+    for source in sources:
+        matches = sorted(glob(os.path.join(cwd, source))) if any(c in source for c in "*?[") else []
+        expanded.extend([os.path.relpath(match, cwd) for match in matches] or [source])
+    return expanded
+
+
+def extract_archive(path: str, to_directory: str = ".", threads: Optional[int] = None) -> ArchiveReport:
+    """
+    Extract the archive into the directory with the fastest available backend
+
+    A relative archive path is resolved against the target directory. 7z is used for .7z and
+    .zip files, tar with a parallel decompressor for the tar variants. Python's zipfile and
+    tarfile modules are used if the tools are not installed.
+    """
+    fmt = _extract_format(path)
+    os.makedirs(to_directory, exist_ok=True)
+    archive_path = os.path.join(to_directory, path)
+    start = time.perf_counter()
+    if fmt == "zip" and not find_program("7z"):
+        backend = "zipfile"
+        with zipfile.ZipFile(archive_path) as zip_file:
+            zip_file.extractall(to_directory)
+    elif fmt != "7z" and fmt != "zip" and not find_program("tar"):
+        backend = "tarfile"
+        with tarfile.open(archive_path) as tar_file:
+            target_dir = os.path.realpath(to_directory)
+            for member in tar_file.getmembers():
+                member_path = os.path.realpath(os.path.join(target_dir, member.name))
+                if os.path.commonpath([target_dir, member_path]) != target_dir:
+                    raise ArchiveError(f"Attempted path traversal in tar file: {member.name}")
+            tar_file.extractall(to_directory)
+    else:
+        backend, cmd = _archive_command(fmt, "x", archive_threads(threads))
+        _run(cmd + [path], cwd=to_directory)
+    report = ArchiveReport("Extracted", path, backend, os.path.getsize(archive_path), time.perf_counter() - start)
+    log.info("%s", report)
+    return report
+
+
+def compress_archive(
+    target: str, sources: Sequence[str], cwd: str = ".", profile: Optional[str] = None,
+    threads: Optional[int] = None, extra_args: Sequence[str] = ()
+) -> ArchiveReport:
+    """
+    Create the archive from the sources relative to the working directory
+
+    The format is chosen by the target file suffix. The extra arguments are passed to the
+    backend as they are, e.g. exclude patterns. Wildcards in the sources are expanded by 7z
+    itself and with glob for the tar variants.
+    """
+    fmt = archive_format(target)
+    if fmt is None:
+        raise ArchiveError(f"Could not find suitable archiver for: {target}")
+    level = compression_level(profile)
+    if fmt not in ("7z", "zip"):
+        sources = _expand_wildcards(sources, cwd)
+    start = time.perf_counter()
+    if fmt not in ("7z", "zip") and not find_program("tar"):
+        backend = "tarfile"
+        mode = "w" if fmt == "tar" else f"w:{fmt}"
+        with tarfile.open(os.path.join(cwd, target), mode) as tar_file:  # type: ignore
+            for source in sources:
+                tar_file.add(os.path.join(cwd, source), arcname=source)
+    else:
+        backend, cmd = _archive_command(fmt, "c", archive_threads(threads), level)
+        if fmt in ("7z", "zip"):
+            cmd += list(extra_args) + [target]
+        else:
+            # the target has to follow the -f option of tar
+            cmd += [target] + list(extra_args)
+        _run(cmd + list(sources), cwd=cwd)
+    report = ArchiveReport(
+        "Compressed", target, backend, os.path.getsize(os.path.join(cwd, target)), time.perf_counter() - start
+    )
+    log.info("%s", report)
+    return report
@@ -34,7 +34,12 @@ from configparser import ConfigParser
 from typing import List
 from urllib.parse import urlparse
 
-from bldinstallercommon import config_section_map, is_content_url_valid, safe_config_key_fetch
+from bldinstallercommon import (
+    SubstitutionTable,
+    config_section_map,
+    is_content_url_valid,
+    safe_config_key_fetch,
+)
 from logging_util import init_logger
 from pkg_constants import PKG_TEMPLATE_BASE_DIR_NAME
 
@@ -75,7 +80,7 @@ class ArchiveLocationResolver:
         target_config: ConfigParser,
         server_base_url_override: str,
         configurations_root_dir: str,
-        key_substitution_list: List[List[str]],
+        key_substitution_list: SubstitutionTable,
     ) -> None:
         """Init data based on the target configuration"""
         self.server_list = []
@@ -132,10 +137,7 @@ class ArchiveLocationResolver:
             return the resolved URI
         """
         # substitute key value pairs if any
-        for item in self.key_substitution_list:
-            temp = archive_uri.replace(item[0], item[1])
-            if temp != archive_uri:
-                archive_uri = temp
+        archive_uri = self.key_substitution_list.replace(archive_uri)
         # 1. check if given archive_uri denotes a package under package templates directory
         base_path = os.path.join(self.configurations_root_dir, PKG_TEMPLATE_BASE_DIR_NAME)
         package_path = package_name + os.sep + 'data' + os.sep + archive_uri
@@ -34,15 +34,16 @@ import os
 import re
 import shlex
 import shutil
-import subprocess
 import sys
 from multiprocessing import cpu_count
 from pathlib import Path
 from typing import Dict, List
 
+from archive_engine import compress_archive
 from bld_utils import is_linux, is_macos, is_windows
 from bldinstallercommon import (
     clone_repository,
+    drain_tree_removals,
     extract_file,
     get_tag_from_branch,
     is_content_url_valid,
@@ -50,7 +51,9 @@ from bldinstallercommon import (
     locate_path,
     move_tree,
     remove_tree,
+    remove_tree_async,
     retrieve_url,
+    sweep_tree_trash,
 )
 from installer_utils import PackagingError, ch_dir
 from logging_util import init_logger
@@ -65,16 +68,6 @@ QT_VERSION = '5.12'
 QT_VERSION_MINOR = '5.12.7'
 
 
-ARCHIVE_PROGRAM = '7z'
-if is_macos():
-    try:
-        log.info("Trying to use 7z from")
-        subprocess.call(["where", "7z"])
-    except OSError:
-        log.warning("7z not found from path. Try to use 7z from /usr/local/bin")
-        ARCHIVE_PROGRAM = "/usr/local/bin/7z"
-
-
 ##################################################################
 # Get static Qt configure arguments. Platform is detected.
 ##################################################################
@@ -395,19 +388,19 @@ def build_qt(options: IfwOptions, qt_build_dir: str, qt_configure_options: str,
     # shlex does not like backslashes
     cmd_args = cmd_args.replace("\\", "/")
     extra_env = get_build_env(options.openssl_dir)
-    run_cmd(cmd=shlex.split(cmd_args), cwd=options.qt_source_dir, env=extra_env)
+    run_cmd(cmd=shlex.split(cmd_args), cwd=options.qt_source_dir, env=extra_env, stream=True)
     log.info("--------------------------------------------------------------------")
     log.info("Building Qt")
     cmd_args = options.make_cmd
     for module in qt_modules:
         cmd_args += " module-" + module
-    run_cmd(cmd=cmd_args, cwd=options.qt_source_dir, env=extra_env)
+    run_cmd(cmd=cmd_args, cwd=options.qt_source_dir, env=extra_env, stream=True)
     log.info("--------------------------------------------------------------------")
     log.info("Installing Qt")
     cmd_args = options.make_install_cmd
     for module in qt_modules:
         module_dir = os.path.join(options.qt_source_dir, module)
-        run_cmd(cmd=cmd_args, cwd=module_dir)
+        run_cmd(cmd=cmd_args, cwd=module_dir, stream=True)
 
 
 ###############################
@@ -430,9 +423,9 @@ def prepare_installer_framework(options: IfwOptions) -> None:
 
 
 def start_ifw_build(options: IfwOptions, cmd_args: List[str], installer_framework_build_dir: str) -> None:
-    run_cmd(cmd=cmd_args, cwd=installer_framework_build_dir)
+    run_cmd(cmd=cmd_args, cwd=installer_framework_build_dir, stream=True)
     cmd_args = options.make_cmd.split(" ")
-    run_cmd(cmd=cmd_args, cwd=installer_framework_build_dir)
+    run_cmd(cmd=cmd_args, cwd=installer_framework_build_dir, stream=True)
 
 
 ###############################
@@ -530,8 +523,7 @@ def create_installer_package(options: IfwOptions) -> None:
         shutil.copytree(os.path.join(options.installer_framework_source_dir, 'examples'), os.path.join(package_dir, 'examples'))
         shutil.copy(os.path.join(options.installer_framework_source_dir, 'README'), package_dir)
         # pack payload into separate .7z archive for later usage
-        cmd_args = [ARCHIVE_PROGRAM, 'a', options.installer_framework_payload_arch, package_dir]
-        run_cmd(cmd=cmd_args, cwd=ROOT_DIR)
+        compress_archive(options.installer_framework_payload_arch, [package_dir], cwd=ROOT_DIR)
         shutil.move(os.path.join(ROOT_DIR, options.installer_framework_payload_arch), options.build_artifacts_dir)
         # create 7z
         archive_file = os.path.join(options.installer_framework_source_dir, 'dist', 'packages', 'org.qtproject.ifw.binaries', 'data', 'data.7z')
@@ -565,8 +557,7 @@ def build_and_archive_qt(options: IfwOptions) -> None:
 
     log.info("--------------------------------------------------------------------")
     log.info("Archive static Qt binaries")
-    cmd_args_archive = [ARCHIVE_PROGRAM, 'a', options.qt_static_binary_name, options.qt_build_dir]
-    run_cmd(cmd=cmd_args_archive, cwd=ROOT_DIR)
+    compress_archive(options.qt_static_binary_name, [options.qt_build_dir], cwd=ROOT_DIR)
 
     log.info("--------------------------------------------------------------------")
     log.info("Build shared Qt")
@@ -579,23 +570,31 @@ def build_and_archive_qt(options: IfwOptions) -> None:
 
     log.info("--------------------------------------------------------------------")
     log.info("Archive shared Qt binaries")
-    cmd_args = [ARCHIVE_PROGRAM, 'a', options.qt_shared_binary_name, options.qt_build_dir_dynamic]
-    run_cmd(cmd=cmd_args, cwd=ROOT_DIR)
+    compress_archive(options.qt_shared_binary_name, [options.qt_build_dir_dynamic], cwd=ROOT_DIR)
 
 
 ###############################
 # function
 ###############################
 def clean_build_environment(options: IfwOptions) -> None:
+    # trash left behind by remove_tree_async of a killed run
+    build_dirs = [
+        options.build_artifacts_dir,
+        options.installer_framework_build_dir,
+        options.installer_framework_source_dir,
+        options.qt_source_dir,
+    ]
+    for parent_dir in sorted({os.path.dirname(os.path.normpath(item)) for item in build_dirs}):
+        sweep_tree_trash(parent_dir)
     if os.path.isfile(options.installer_framework_archive_name):
         os.remove(options.installer_framework_archive_name)
     if os.path.isfile(options.installer_framework_payload_arch):
         os.remove(options.installer_framework_payload_arch)
     if os.path.exists(options.build_artifacts_dir):
-        remove_tree(options.build_artifacts_dir)
+        remove_tree_async(options.build_artifacts_dir)
     Path(options.build_artifacts_dir).mkdir(parents=True, exist_ok=True)
     if os.path.exists(options.installer_framework_build_dir):
-        remove_tree(options.installer_framework_build_dir)
+        remove_tree_async(options.installer_framework_build_dir)
 
     if os.path.exists(options.installer_framework_pkg_dir):
         shutil.rmtree(options.installer_framework_pkg_dir)
@@ -603,18 +602,20 @@ def clean_build_environment(options: IfwOptions) -> None:
         shutil.rmtree(options.installer_framework_target_dir)
 
     if options.incremental_mode:
+        drain_tree_removals()
         return
 
     if os.path.exists(options.installer_framework_source_dir):
-        remove_tree(options.installer_framework_source_dir)
+        remove_tree_async(options.installer_framework_source_dir)
     if os.path.exists(options.qt_source_dir):
-        remove_tree(options.qt_source_dir)
+        remove_tree_async(options.qt_source_dir)
     if os.path.exists(options.qt_build_dir):
-        remove_tree(options.qt_source_dir)
+        remove_tree_async(options.qt_source_dir)
     if os.path.isfile(options.qt_source_package_uri_saveas):
         os.remove(options.qt_source_package_uri_saveas)
     if os.path.isfile(options.qt_installer_framework_uri_saveas):
         os.remove(options.qt_installer_framework_uri_saveas)
+    drain_tree_removals()
 
 
 ###############################
@@ -628,8 +629,7 @@ def archive_installer_framework(installer_framework_build_dir: str, installer_fr
         for filename in files:
             if filename.endswith(('.moc', 'Makefile', '.cpp', '.h', '.o')) or filename == 'Makefile':
                 os.remove(os.path.join(root, filename))
-    cmd_args = [ARCHIVE_PROGRAM, 'a', installer_framework_archive_name, os.path.basename(installer_framework_build_dir)]
-    run_cmd(cmd=cmd_args, cwd=ROOT_DIR)
+    compress_archive(installer_framework_archive_name, [os.path.basename(installer_framework_build_dir)], cwd=ROOT_DIR)
     shutil.move(installer_framework_archive_name, options.build_artifacts_dir)
     # Check if installer framework is created from branch. If so, check if the branch is tagged and
     # create a package with a tagged name.
@@ -649,14 +649,12 @@ def archive_installer_framework(installer_framework_build_dir: str, installer_fr
 def archive_installerbase(options: IfwOptions) -> None:
     log.info("--------------------------------------------------------------------")
     log.info("Archive Installerbase")
-    cmd_args_archive = []
     cmd_args_clean = []
     bin_temp = ''
     if is_linux() or is_macos():
         bin_path = locate_executable(options.installer_framework_build_dir, ['installerbase'])
         bin_temp = ROOT_DIR + os.sep + '.tempSDKMaintenanceTool'
         shutil.copy(bin_path, bin_temp)
-        cmd_args_archive = [ARCHIVE_PROGRAM, 'a', options.installer_base_archive_name, bin_temp]
         cmd_args_clean = ['rm', bin_temp]
     if is_windows():
         bin_path = locate_executable(options.installer_framework_build_dir, ['installerbase.exe'])
@@ -664,9 +662,8 @@ def archive_installerbase(options: IfwOptions) -> None:
         shutil.copy(bin_path, bin_temp)
         if options.signserver and options.signpwd:
             sign_windows_installerbase('tempSDKMaintenanceToolBase.exe')
-        cmd_args_archive = [ARCHIVE_PROGRAM, 'a', options.installer_base_archive_name, bin_temp]
         cmd_args_clean = ['del', bin_temp]
-    run_cmd(cmd=cmd_args_archive, cwd=ROOT_DIR)
+    compress_archive(options.installer_base_archive_name, [bin_temp], cwd=ROOT_DIR)
     run_cmd(cmd=cmd_args_clean, cwd=ROOT_DIR)
     if not os.path.isfile(options.installer_base_archive_name):
         raise SystemExit(f"Failed to generate archive: {options.installer_base_archive_name}")
@@ -679,7 +676,6 @@ def archive_installerbase(options: IfwOptions) -> None:
 def archive_binarycreator(options: IfwOptions) -> None:
     log.info("--------------------------------------------------------------------")
     log.info("Archive Installerbase and Binarycreator")
-    cmd_args_archive = []
     if is_linux() or is_macos():
         bin_path = locate_executable(options.installer_framework_build_dir, ['installerbase'])
         binarycreator_path = locate_executable(options.installer_framework_build_dir, ['binarycreator'])
@@ -688,8 +684,7 @@ def archive_binarycreator(options: IfwOptions) -> None:
         binarycreator_path = locate_executable(options.installer_framework_build_dir, ['binarycreator.exe'])
     else:
         raise Exception("Not a supported platform")
-    cmd_args_archive = ['7z', 'a', options.binarycreator_archive_name, bin_path, binarycreator_path]
-    run_cmd(cmd=cmd_args_archive, cwd=ROOT_DIR)
+    compress_archive(options.binarycreator_archive_name, [bin_path, binarycreator_path], cwd=ROOT_DIR)
     if not os.path.isfile(options.binarycreator_archive_name):
         raise Exception(f"*** Failed to generate archive: {options.binarycreator_archive_name}")
     shutil.move(options.binarycreator_archive_name, options.build_artifacts_dir)
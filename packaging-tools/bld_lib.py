@@ -45,6 +45,8 @@ from typing import List, Tuple
 from urllib.parse import urlparse
 from urllib.request import urlretrieve
 
+from archive_engine import compress_archive
+from archive_engine import extract_archive as extract_archive_file
 from bld_utils import is_windows
 from logging_util import init_logger
 from read_remote_config import get_pkg_value
@@ -122,7 +124,7 @@ def extract_archive(save_as: str, current_dir: str) -> str:
                 safe_extract(tar, qt_dest_dir)
         elif save_as.endswith(".7z"):
             try:
-                run_cmd(cmd=["7z", "x", save_as], cwd=qt_dest_dir)
+                extract_archive_file(save_as, qt_dest_dir)
             except CalledProcessError as error:
                 log.error("Extracting 7z file failed: %s", str(error))
                 raise
@@ -188,7 +190,7 @@ def archive(args: argparse.Namespace, install_root_dir: str, current_dir: str) -
     artifacts_file_name = "artifacts-" + plat.system().lower() + "-" + arch + ".7z"
     artifacts_file_path = os.path.join(current_dir, artifacts_file_name)
     try:
-        run_cmd(["7z", "a", "-m0=lzma2", "-mmt=16", artifacts_file_path, "*"], cwd=archive_path)
+        compress_archive(artifacts_file_path, ["*"], cwd=archive_path)
     except CalledProcessError as error:
         log.error(str(error))
         raise
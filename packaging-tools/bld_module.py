@@ -50,7 +50,7 @@ from bld_utils import (
 )
 from bldinstallercommon import (
     clone_repository,
-    create_download_and_extract_tasks,
+    create_download_extract_task,
     create_qt_download_task,
     locate_path,
     locate_paths,
@@ -61,7 +61,7 @@ from bldinstallercommon import (
 from installer_utils import PackagingError
 from logging_util import init_logger
 from runner import run_cmd
-from threadedwork import ThreadedWork
+from threadedwork import TaskExecutor
 
 log = init_logger(__name__, debug_mode=False)
 
@@ -205,8 +205,8 @@ def main() -> None:
         qt_module_source_directory = MODULE_SRC_DIR
     elif caller_arguments.module7z != '':
         Path(MODULE_SRC_DIR).mkdir(parents=True, exist_ok=True)
-        my_get_qt_module = ThreadedWork("get and extract module src")
-        my_get_qt_module.add_task_object(create_download_and_extract_tasks(caller_arguments.module7z, MODULE_SRC_DIR, temp_path))
+        my_get_qt_module = TaskExecutor("get and extract module src")
+        my_get_qt_module.add_task_object(create_download_extract_task(caller_arguments.module7z, MODULE_SRC_DIR, temp_path))
         my_get_qt_module.run()
         qt_module_source_directory = MODULE_SRC_DIR
     else:
@@ -242,7 +242,7 @@ def main() -> None:
 
     if not os.path.lexists(caller_arguments.qt5path):
         # get Qt
-        my_get_qt_binary_work = ThreadedWork("get and extract Qt 5 binary")
+        my_get_qt_binary_work = TaskExecutor("get and extract Qt 5 binary")
         my_get_qt_binary_work.add_task_object(
             create_qt_download_task(
                 caller_arguments.qt5_module_urls,
@@ -97,11 +97,11 @@ def configure_qt(params: BuildParams, src: str, build: str) -> None:
     Path(build).mkdir(parents=True, exist_ok=True)
     configure = os.path.join(src, "configure")
     cmd = [configure, "-prefix", build] + qt_static_configure_options()
-    run_cmd(cmd=cmd, cwd=build, redirect=params.redirect_output)
+    run_cmd(cmd=cmd, cwd=build, redirect=params.redirect_output, stream=True)
 
 
 def build_qt(params: BuildParams, build: str) -> None:
-    run_cmd(cmd=[params.make_command], cwd=build, redirect=params.redirect_output)
+    run_cmd(cmd=[params.make_command], cwd=build, redirect=params.redirect_output, stream=True)
 
 
 def build_sdktool_impl(params: BuildParams, qt_build_path: str) -> None:
@@ -116,10 +116,10 @@ def build_sdktool_impl(params: BuildParams, qt_build_path: str) -> None:
         cmake_args += ['-DCMAKE_C_COMPILER=cl', '-DCMAKE_CXX_COMPILER=cl']
 
     cmd = cmake_args + ['-G', 'Ninja', params.src_path]
-    run_cmd(cmd=cmd, cwd=params.build_path, redirect=params.redirect_output)
-    run_cmd(cmd=['cmake', '--build', '.'], cwd=params.build_path, redirect=params.redirect_output)
+    run_cmd(cmd=cmd, cwd=params.build_path, redirect=params.redirect_output, stream=True)
+    run_cmd(cmd=['cmake', '--build', '.'], cwd=params.build_path, redirect=params.redirect_output, stream=True)
     cmd = ['cmake', '--install', '.', '--prefix', params.target_path]
-    run_cmd(cmd=cmd, cwd=params.build_path, redirect=params.redirect_output)
+    run_cmd(cmd=cmd, cwd=params.build_path, redirect=params.redirect_output, stream=True)
 
 
 def build_sdktool(qt_src_url: str, qt_build_base: str, sdktool_src_path: str, sdktool_build_path: str, sdktool_target_path: str,
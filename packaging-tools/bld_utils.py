@@ -29,7 +29,9 @@
 #
 #############################################################################
 
+import codecs
 import os
+import selectors
 import shutil
 import sys
 from argparse import Namespace
@@ -39,22 +41,27 @@ from copy import deepcopy
 from socket import setdefaulttimeout
 from subprocess import PIPE, STDOUT, Popen
 from sys import platform
-from threading import current_thread
+from threading import Thread, current_thread
 from time import sleep
-from typing import Any, Dict, List, Optional, Union
+from typing import IO, Any, Deque, Dict, List, Optional, TextIO, Union
 from urllib.error import HTTPError
 from urllib.parse import urljoin, urlparse
 from urllib.request import pathname2url, urlopen
 
-# 3rd party module to read process output in a convenient way
-from asynchronousfilereader import AsynchronousFileReader
+from archive_engine import compress_archive
+from download_cache import get_download_cache
 from logging_util import init_logger
+from process_accounting import account_command
 
 log = init_logger(__name__, debug_mode=False)
 
 # make a timeout for download jobs
 setdefaulttimeout(30)
 
+# lines of process output kept for the error message of a failed command
+RUN_COMMAND_TAIL_LINES = 1000
+PIPE_READ_SIZE = 65536
+
 
 def is_windows() -> bool:
     """Return True if the current platform is Windows. False otherwise."""
@@ -104,7 +111,7 @@ def compress(path: str, directory_name: str, sevenzip_target: str) -> None:
         sevenzip_target = sevenzip_target + sevenzip_extension
     sevenzip_filename = os.path.split(sevenzip_target)[1]
     with DirRenamer(path, directory_name):
-        run_command(' '.join(('7z a -mx9', sevenzip_filename, directory_name)), parent_directory_path)
+        compress_archive(sevenzip_filename, [directory_name], cwd=parent_directory_path, profile="max")
 
     current_sevenzip_path = os.path.join(parent_directory_path, sevenzip_filename)
     if current_sevenzip_path != sevenzip_target:
@@ -139,7 +146,7 @@ def urllib2_response_read(response: Any, file_path: str, block_size: int, total_
     return bytes_count
 
 
-def download(url: str, target: str, read_block_size: int = 1048576) -> None:
+def download(url: str, target: str, read_block_size: int = 1048576, use_cache: bool = True) -> None:
     try:
         if os.path.isdir(os.path.abspath(target)):
             filename = os.path.basename(urlparse(url).path)
@@ -170,6 +177,13 @@ def download(url: str, target: str, read_block_size: int = 1048576) -> None:
             local_download(url, target)
             return
 
+        download_cache = get_download_cache() if use_cache else None
+        if download_cache is not None:
+            def remote_download(cache_url: str, cache_target: str) -> None:
+                download(cache_url, cache_target, read_block_size, use_cache=False)
+            if download_cache.fetch(url, target, remote_download):
+                return
+
         savefile_tmp = os.extsep.join((target, 'tmp'))
         try:
             os.makedirs(os.path.dirname(savefile_tmp))
@@ -243,6 +257,62 @@ def get_environment(extra_environment: Optional[Dict[str, str]] = None) -> Dict[
     return environment
 
 
+class OutputTail:
+    """Decode process output in bulk and keep a bounded tail of its lines"""
+
+    def __init__(self, max_lines: int = RUN_COMMAND_TAIL_LINES, echo: Optional[TextIO] = None) -> None:
+        self.lines: Deque[str] = deque(maxlen=max_lines)
+        self.echo = echo
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._partial_line = ""
+
+    def feed(self, data: bytes, final: bool = False) -> None:
+        text = self._partial_line + self._decoder.decode(data, final)
+        lines = text.splitlines(keepends=True)
+        self._partial_line = ""
+        # keep an incomplete last line until the rest of it arrives
+        if lines and not final and not lines[-1].endswith("\n"):
+            self._partial_line = lines.pop()
+        if not lines:
+            return
+        self.lines.extend(lines)
+        if self.echo is not None:
+            self.echo.write("".join(lines))
+
+
+def _drain_pipe(pipe: IO[bytes], tail: OutputTail) -> None:
+    for data in iter(lambda: pipe.read1(PIPE_READ_SIZE), b""):  # type: ignore
+        tail.feed(data)
+    tail.feed(b"", final=True)
+
+
+def pump_process_output(process: "Popen[bytes]", stdout_tail: OutputTail, stderr_tail: OutputTail) -> None:
+    """Drain the stdout and stderr pipes of the process until both are closed"""
+    assert process.stdout is not None and process.stderr is not None
+    if is_windows():
+        # select() does not support pipes on Windows, block in a reader thread per pipe instead
+        readers = [
+            Thread(target=_drain_pipe, args=(process.stdout, stdout_tail), daemon=True),
+            Thread(target=_drain_pipe, args=(process.stderr, stderr_tail), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        return
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ, stdout_tail)
+        selector.register(process.stderr, selectors.EVENT_READ, stderr_tail)
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fd, PIPE_READ_SIZE)
+                if data:
+                    key.data.feed(data)
+                else:
+                    selector.unregister(key.fileobj)
+                    key.data.feed(b"", final=True)
+
+
 @deep_copy_arguments
 def run_command(command: Union[List[str], str], cwd: str, extra_environment: Optional[Dict[str, str]] = None, only_error_case_output: bool = False, expected_exit_codes: Optional[List[int]] = None) -> int:
     expected_exit_codes = expected_exit_codes or [0]
@@ -280,59 +350,39 @@ def run_command(command: Union[List[str], str], cwd: str, extra_environment: Opt
         raise Exception(f"The current working directory is not existing: {cwd}")
 
     use_shell = is_windows()
-    last_stdout_lines: List[Any] = []
-    last_stderr_lines: List[Any] = []
-    if current_thread().name == "MainThread" and not only_error_case_output:
-        process = Popen(
-            command_as_list, shell=use_shell,
-            cwd=cwd, bufsize=-1, env=environment
-        )
-    else:
-        process = Popen(  # pylint: disable=R1732
-            command_as_list, shell=use_shell,
-            stdout=PIPE, stderr=PIPE,
-            cwd=cwd, bufsize=-1, env=environment
-        )
-
-        max_saved_line_numbers = 1000
-        last_stdout_lines = list(deque(maxlen=max_saved_line_numbers))
-        last_stderr_lines = list(deque(maxlen=max_saved_line_numbers))
-
-        # Launch the asynchronous readers of the process' stdout and stderr.
-        stdout = AsynchronousFileReader(process.stdout)
-        stderr = AsynchronousFileReader(process.stderr)
-
-        # Check the readers if we received some output (until there is nothing more to get).
-        while not stdout.eof() or not stderr.eof():
-            # Show what we received from standard output.
-            for line in stdout.readlines():
-                line = line.decode()
-                last_stdout_lines.append(line)
-                if current_thread().name != "MainThread":
-                    sys.stdout.write(line)
-
-            # Show what we received from standard error.
-            for line in stderr.readlines():
-                line = line.decode()
-                last_stderr_lines.append(line)
-                if current_thread().name != "MainThread":
-                    sys.stdout.write(line)
-
-            # Sleep a bit before polling the readers again.
-            sleep(1)
-
-        # Let's be tidy and join the threads we've started.
-        stdout.join()
-        stderr.join()
-
-        # Close subprocess' file descriptors.
-        if process.stdout:
-            process.stdout.close()
-        if process.stderr:
-            process.stderr.close()
-
-    process.wait()
-    exit_code = process.returncode
+    last_stdout_lines: Deque[str] = deque()
+    last_stderr_lines: Deque[str] = deque()
+    with account_command(command_as_list, cwd) as record:
+        if current_thread().name == "MainThread" and not only_error_case_output:
+            process = Popen(
+                command_as_list, shell=use_shell,
+                cwd=cwd, bufsize=-1, env=environment
+            )
+        else:
+            process = Popen(  # pylint: disable=R1732
+                command_as_list, shell=use_shell,
+                stdout=PIPE, stderr=PIPE,
+                cwd=cwd, bufsize=-1, env=environment
+            )
+
+            # show the output only if we are not in the main thread
+            echo = sys.stdout if current_thread().name != "MainThread" else None
+            stdout_tail = OutputTail(echo=echo)
+            stderr_tail = OutputTail(echo=echo)
+            # returns as soon as the process closed its output
+            pump_process_output(process, stdout_tail, stderr_tail)
+            last_stdout_lines = stdout_tail.lines
+            last_stderr_lines = stderr_tail.lines
+
+            # Close subprocess' file descriptors.
+            if process.stdout:
+                process.stdout.close()
+            if process.stderr:
+                process.stderr.close()
+
+        process.wait()
+        exit_code = process.returncode
+        record.exit_code = exit_code
 
     # lets keep that for debugging
     # if environment:
@@ -343,10 +393,10 @@ def run_command(command: Union[List[str], str], cwd: str, extra_environment: Opt
         exit_type = ""
         if current_thread().name != "MainThread" or only_error_case_output:
             if len(last_stderr_lines) != 0:
-                last_output += "".join(str(last_stderr_lines))
+                last_output += "".join(last_stderr_lines)
                 exit_type = "error "
             elif len(last_stdout_lines) != 0:
-                last_output += "".join(str(last_stdout_lines))
+                last_output += "".join(last_stdout_lines)
         pretty_last_output = os.linesep + '======================= error =======================' + os.linesep
         pretty_last_output += "Working Directory: " + cwd + os.linesep
         pretty_last_output += "Last command:      " + ' '.join(command_as_list) + os.linesep
@@ -29,30 +29,58 @@
 #
 #############################################################################
 
+import atexit
 import errno
+import mmap
 import os
 import re
 import shutil
 import stat
 import sys
+import tarfile
+import threading
+import time
+import uuid
 from argparse import Namespace
-from configparser import ConfigParser
-from contextlib import suppress
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, suppress
+from dataclasses import dataclass, field
 from fnmatch import fnmatch
+from functools import lru_cache, partial
+from itertools import islice
+from multiprocessing import get_context
 from pathlib import Path
-from subprocess import CalledProcessError
+from subprocess import PIPE, CalledProcessError, Popen
 from tempfile import mkdtemp
 from traceback import print_exc
 from types import TracebackType
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Tuple,
+    Union,
+)
 from urllib.parse import urlparse
-from urllib.request import urlcleanup, urlopen, urlretrieve
+from urllib.request import Request, urlcleanup, urlopen, urlretrieve
 
+from archive_engine import ArchiveError, extract_archive
 from bld_utils import download, is_linux, is_macos, is_windows, run_command
+from config_cache import ConfigType
+from download_cache import reflink
+from elf_rpath import ElfError, read_elf_rpath, write_elf_rpath
+from git_mirror import get_git_mirror_cache
 from installer_utils import PackagingError
 from logging_util import init_logger
 from runner import run_cmd
-from threadedwork import Task, ThreadedWork
+from threadedwork import Task, TaskExecutor
 
 # need to include this for win platforms as long path names cause problems
 if is_windows():
@@ -62,22 +90,53 @@ log = init_logger(__name__, debug_mode=False)
 
 MAX_DEBUG_PRINT_LENGTH = 10000
 
+_URL_SIZE_MEMO: Dict[str, int] = {}
+_URL_SIZE_LOCK = threading.Lock()
+
 
 ###############################
 # function
 ###############################
-def is_content_url_valid(url: str) -> bool:
+def content_url_size(url: str) -> int:
+    """Return the size of the content behind url in bytes, 0 if the url is not valid"""
     # check first if the url points to file on local file system
     if os.path.isfile(url):
-        return True
+        return os.path.getsize(url)
+    # remote content is checked only once per run, the same archives are validated repeatedly
+    with _URL_SIZE_LOCK:
+        if url in _URL_SIZE_MEMO:
+            return _URL_SIZE_MEMO[url]
     # throws error if url does not point to valid object
     try:
-        with urlopen(url) as response:
+        with urlopen(Request(url, method="HEAD")) as response:
             total_size = response.info().get('Content-Length').strip()
-            return int(total_size) > 0
+            size = max(int(total_size), 0)
     except Exception:
-        pass
-    return False
+        # not memoized, the failure may be a transient network error
+        return 0
+    with _URL_SIZE_LOCK:
+        _URL_SIZE_MEMO[url] = size
+    return size
+
+
+def content_url_sizes(urls: List[str]) -> Dict[str, int]:
+    """Return the sizes of the urls like content_url_size, the urls are checked concurrently"""
+    unique_urls = list(dict.fromkeys(urls))
+    if len(unique_urls) < 2:
+        return {url: content_url_size(url) for url in unique_urls}
+    # one round trip for all of the urls instead of one per url
+    with ThreadPoolExecutor(max_workers=min(len(unique_urls), 16)) as pool:
+        return dict(zip(unique_urls, pool.map(content_url_size, unique_urls)))
+
+
+def is_content_url_valid(url: str) -> bool:
+    # an empty file on local file system is still valid content
+    return os.path.isfile(url) or content_url_size(url) > 0
+
+
+def clear_url_validity_memo() -> None:
+    with _URL_SIZE_LOCK:
+        _URL_SIZE_MEMO.clear()
 
 
 ###############################
@@ -119,17 +178,43 @@ def retrieve_url(url: str, savefile: str) -> None:
 ###############################
 # function
 ###############################
-def search_for_files(
-    search_path: Union[str, Path], suffixes: List[str], rgx_pattern: str
-) -> List[str]:
+# files with a NUL byte in the first block are treated as binary and never match
+BINARY_FILE_PROBE_SIZE = 8192
+# above this amount of candidate files the content search is done in a process pool
+SEARCH_PARALLEL_FILE_COUNT = 512
+
+
+def process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Return a process pool with spawned workers, forking from threaded callers is not safe"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context("spawn"))
+
+
+def file_matches_regexp(path: Union[str, Path], rgx_pattern: bytes) -> bool:
+    """Search the memory mapped file for the bytes pattern, binary files never match"""
     pattern = re.compile(rgx_pattern, flags=re.MULTILINE)
+    with open(path, 'rb') as handle:
+        if not os.fstat(handle.fileno()).st_size:
+            return bool(pattern.search(b""))
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            if content.find(b"\0", 0, BINARY_FILE_PROBE_SIZE) != -1:
+                return False
+            return pattern.search(content) is not None
 
-    def _matches_rgx(path: Path) -> bool:
-        if rgx_pattern:
-            with open(path, 'r', encoding="utf-8") as handle:
-                return bool(pattern.search(handle.read()))
-        return True
-    return locate_paths(search_path, suffixes, filters=[os.path.isfile, _matches_rgx])
+
+def search_for_files(
+    search_path: Union[str, Path], suffixes: List[str], rgx_pattern: str,
+    max_workers: Optional[int] = None
+) -> List[str]:
+    file_list = locate_paths(search_path, suffixes, filters=[os.path.isfile])
+    if not rgx_pattern:
+        return file_list
+    matches_rgx = partial(file_matches_regexp, rgx_pattern=rgx_pattern.encode("utf-8"))
+    if len(file_list) > SEARCH_PARALLEL_FILE_COUNT and max_workers != 1:
+        with process_pool(max_workers) as pool:
+            results = list(pool.map(matches_rgx, file_list, chunksize=64))
+    else:
+        results = [matches_rgx(path) for path in file_list]
+    return [path for path, result in zip(file_list, results) if result]
 
 
 ###############################
@@ -161,27 +246,108 @@ def move_tree(srcdir: str, dstdir: str, pattern: Optional[str] = None) -> None:
                 shutil.move(srcfname, dstfname)
 
 
+@dataclass
+class CopyReport:
+    """Statistics of a copy_tree call"""
+
+    files: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    methods: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, size: int, method: str) -> None:
+        self.files += 1
+        self.bytes += size
+        self.methods[method] = self.methods.get(method, 0) + 1
+
+    def __str__(self) -> str:
+        methods = ", ".join(f"{name}: {count}" for name, count in sorted(self.methods.items()))
+        return f"{self.files} files, {self.bytes} bytes in {self.seconds:.2f}s ({methods})"
+
+
+def _copy_file_range(source: str, target: str) -> bool:
+    """Copy the file content inside the kernel with copy_file_range, return False if not supported"""
+    if not hasattr(os, "copy_file_range"):
+        return False
+    with open(source, "rb") as src_handle, open(target, "wb") as dst_handle:
+        size = os.fstat(src_handle.fileno()).st_size
+        try:
+            while size > 0:
+                copied = os.copy_file_range(src_handle.fileno(), dst_handle.fileno(), size)
+                if copied == 0:
+                    break
+                size -= copied
+        except OSError as err:
+            if err.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP) and not dst_handle.tell():
+                return False
+            raise
+    return True
+
+
+def copy_file(source: str, target: str, hardlink: bool = False) -> str:
+    """
+    Copy the file content and permission bits, return the used method
+
+    A copy-on-write reflink is tried first, then a hardlink if allowed, then copy_file_range and
+    finally a regular copy. Hardlinked files share the content with the source, so they must not
+    be modified in place afterwards.
+    """
+    if reflink(source, target):
+        method = "reflink"
+    elif hardlink and not is_windows():
+        with suppress(FileNotFoundError):
+            os.remove(target)
+        try:
+            os.link(source, target)
+            return "hardlink"
+        except OSError:
+            method = "copy_file_range" if _copy_file_range(source, target) else "copy"
+    elif _copy_file_range(source, target):
+        method = "copy_file_range"
+    else:
+        method = "copy"
+    if method == "copy":
+        shutil.copyfile(source, target)
+    shutil.copymode(source, target)
+    return method
+
+
 ###############################
 # function
 ###############################
-def copy_tree(source_dir: str, dest_dir: str) -> None:
+def copy_tree(
+    source_dir: str, dest_dir: str, hardlink: bool = False, max_workers: Optional[int] = None
+) -> CopyReport:
+    """Copy the content of source_dir into dest_dir, the files are copied in a thread pool"""
+    start = time.perf_counter()
     # windows has length limit for path names so try to truncate them as much as possible
     if is_windows():
         source_dir = win32api.GetShortPathName(source_dir)
         dest_dir = win32api.GetShortPathName(dest_dir)
-    src_files = os.listdir(source_dir)
-    for file_name in src_files:
-        full_file_name = os.path.join(source_dir, file_name)
-        if not full_file_name:
-            raise IOError('*** Fatal error! Unable to create source file path, too long path name!')
-        if is_windows():
-            if len(full_file_name) > 255:
-                raise IOError(f'given full_file_name length [{len(full_file_name)}] too long for Windows: {full_file_name}')
-        if os.path.isdir(full_file_name):
-            Path(dest_dir + os.sep + file_name).mkdir(parents=True, exist_ok=True)
-            copy_tree(full_file_name, dest_dir + os.sep + file_name)
-        if os.path.isfile(full_file_name):
-            shutil.copy(full_file_name, dest_dir)
+    report = CopyReport()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = []
+        stack = [(source_dir, dest_dir)]
+        while stack:
+            src_dir, dst_dir = stack.pop()
+            with os.scandir(src_dir) as iterator:
+                entries = list(iterator)
+            for entry in entries:
+                full_file_name = entry.path
+                if is_windows():
+                    if len(full_file_name) > 255:
+                        raise IOError(f'given full_file_name length [{len(full_file_name)}] too long for Windows: {full_file_name}')
+                if entry.is_dir():
+                    Path(dst_dir + os.sep + entry.name).mkdir(parents=True, exist_ok=True)
+                    stack.append((full_file_name, dst_dir + os.sep + entry.name))
+                elif entry.is_file():
+                    target = os.path.join(dst_dir, entry.name)
+                    futures.append((entry.stat().st_size, pool.submit(copy_file, full_file_name, target, hardlink)))
+        for size, future in futures:
+            report.add(size, future.result())
+    report.seconds = time.perf_counter() - start
+    log.debug("Copied '%s' into '%s': %s", source_dir, dest_dir, report)
+    return report
 
 
 def remove_one_tree_level(directory: str) -> None:
@@ -190,14 +356,17 @@ def remove_one_tree_level(directory: str) -> None:
     if items == 1:
         dir_name = dircontents[0]
         full_dir_name = os.path.join(directory, dir_name)
-        # avoid directory name collision by first moving to temporary dir
-        tempdir_base = mkdtemp()
-        tempdir = os.path.join(tempdir_base, 'a')  # dummy name
-        shutil.move(full_dir_name, tempdir)
-        move_tree(tempdir, directory)
-        remove_tree(tempdir_base)
+        if not os.path.isdir(full_dir_name) or os.path.islink(full_dir_name):
+            raise IOError(f'Cannot remove one level of directory structure of "{directory}", "{dir_name}" is not a directory')
+        # avoid directory name collision by first renaming to a temporary sibling name,
+        # only the top level entries are renamed so the content is never copied
+        tempdir = os.path.join(directory, '.' + dir_name + '.' + uuid.uuid4().hex)
+        os.rename(full_dir_name, tempdir)
+        for name in os.listdir(tempdir):
+            os.rename(os.path.join(tempdir, name), os.path.join(directory, name))
+        os.rmdir(tempdir)
     else:
-        raise IOError(f'Cannot remove one level of directory structure of "{dir}", it has {items} subdirectories')
+        raise IOError(f'Cannot remove one level of directory structure of "{directory}", it has {items} subdirectories')
 
 
 ###############################
@@ -224,43 +393,305 @@ def remove_tree(path: str) -> bool:
             except Exception:
                 print_exc()
         else:
-            # shutil.rmtree(path)
-            run_command(['rm', '-rf', path], os.getcwd(), only_error_case_output=True)
+            try:
+                delete_tree(path)
+            except OSError as err:
+                log.error("Unable to remove '%s': %s", path, err)
     return not os.path.exists(path)
 
 
+def _retry_writable(func: Callable[[str], None], path: str) -> None:
+    try:
+        func(path)
+    except PermissionError:
+        # make the parent directory and the item itself writable, e.g. read-only files on Windows
+        os.chmod(os.path.dirname(path), stat.S_IRWXU)
+        if not os.path.islink(path):
+            os.chmod(path, stat.S_IRWXU)
+        func(path)
+
+
+def delete_tree(path: str) -> None:
+    """Delete the directory tree in process with os.scandir, symlinks are not followed"""
+    stack = [(path, False)]
+    while stack:
+        directory, visited = stack.pop()
+        if visited:
+            _retry_writable(os.rmdir, directory)
+            continue
+        stack.append((directory, True))
+        with os.scandir(directory) as iterator:
+            for entry in iterator:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, False))
+                else:
+                    _retry_writable(os.unlink, entry.path)
+
+
+# name of the sibling trash directory of a tree removed with TreeRemover
+TRASH_DIR_PATTERN = re.compile(r"\..+\.trash-[0-9a-f]{32}")
+
+
+class TreeRemover:
+    """
+    Delete directory trees in the background
+
+    The tree is first renamed to a trash directory on the same file system so that the original
+    path is free for reuse immediately. The subdirectories of the trash directory are then
+    deleted in parallel by a small thread pool. drain() waits for the pending deletions, it is
+    called at process exit at the latest. A killed process leaves its trash behind, sweep()
+    deletes it on the next run.
+    """
+
+    def __init__(self, max_workers: int = 4) -> None:
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._futures: List["Future[None]"] = []
+        self._lock = threading.Lock()
+
+    def _submit(self, func: Callable[[], None]) -> "Future[None]":
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="TreeRemover")
+                atexit.register(self.drain)
+            future = self._pool.submit(func)
+            self._futures.append(future)
+            return future
+
+    def remove(self, path: str, trash_dir: Optional[str] = None) -> bool:
+        """Move the tree to trash and schedule its deletion, return False if it can't be moved"""
+        path = os.path.normpath(path)
+        if trash_dir:
+            Path(trash_dir).mkdir(parents=True, exist_ok=True)
+            trash = os.path.join(trash_dir, uuid.uuid4().hex)
+        else:
+            trash = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.trash-{uuid.uuid4().hex}")
+        try:
+            os.rename(path, trash)
+        except OSError as err:
+            log.warning("Unable to move '%s' to trash, removing it in place: %s", path, err)
+            return False
+        log.info("Removing in background: %s", path)
+        with os.scandir(trash) as iterator:
+            subdirs = [entry.path for entry in iterator if entry.is_dir(follow_symlinks=False)]
+        pending = [len(subdirs) + 1]
+        pending_lock = threading.Lock()
+
+        def delete(subdir: Optional[str] = None) -> None:
+            try:
+                if subdir:
+                    delete_tree(subdir)
+                else:
+                    with os.scandir(trash) as iterator:
+                        for entry in iterator:
+                            if not entry.is_dir(follow_symlinks=False):
+                                _retry_writable(os.unlink, entry.path)
+            finally:
+                with pending_lock:
+                    pending[0] -= 1
+                    last = pending[0] == 0
+            # the trash directory itself is removed by the last finished task
+            if last:
+                _retry_writable(os.rmdir, trash)
+
+        for subdir in subdirs:
+            self._submit(partial(delete, subdir))
+        self._submit(delete)
+        return True
+
+    def sweep(self, directory: str) -> int:
+        """Schedule the deletion of the trash directories left in directory, return their count"""
+        trash: List[str] = []
+        with suppress(FileNotFoundError), os.scandir(directory) as iterator:
+            trash = [
+                entry.path for entry in iterator
+                if entry.is_dir(follow_symlinks=False) and TRASH_DIR_PATTERN.fullmatch(entry.name)
+            ]
+        for path in trash:
+            log.info("Removing leftover trash in background: %s", path)
+            self._submit(partial(delete_tree, path))
+        return len(trash)
+
+    def drain(self) -> bool:
+        """Wait for the scheduled deletions, return False if any of them failed"""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        success = True
+        for future in futures:
+            try:
+                future.result()
+            except Exception as err:
+                log.warning("Background removal failed: %s", err)
+                success = False
+        return success
+
+
+_tree_remover = TreeRemover()
+
+
+def remove_tree_async(path: str, trash_dir: Optional[str] = None) -> bool:
+    """
+    Remove the directory tree without waiting for the deletion, return whether the path is gone
+
+    The trash_dir must be on the same file system as the path, by default a sibling name is
+    used. Falls back to a synchronous remove_tree if the tree can't be moved.
+    """
+    if not os.path.isdir(path):
+        return not os.path.exists(path)
+    if _tree_remover.remove(path, trash_dir):
+        return True
+    return remove_tree(path)
+
+
+def drain_tree_removals() -> bool:
+    """Wait for the background deletions started by remove_tree_async"""
+    return _tree_remover.drain()
+
+
+def sweep_tree_trash(directory: str) -> int:
+    """Remove in background the trash left in directory by remove_tree_async of a killed process"""
+    return _tree_remover.sweep(directory)
+
+
 ###############################
 # function
 ###############################
 # substitute all matches in files with replacement_string
-def replace_in_files(filelist: List[str], regexp: str, replacement_string: str) -> None:
-    regexp_obj = re.compile(regexp)
-    for xfile in filelist:
-        with open(xfile, 'r+', encoding="utf-8") as handle:
+def replace_in_files(filelist: List[str], regexp: str, replacement_string: str) -> Dict[str, int]:
+    return SubstitutionTable([(regexp, replacement_string)]).sub_in_files(filelist)
+
+
+class SubstitutionTable:
+    """
+    Ordered list of (tag, value) substitutions applied in a single pass per string or file
+
+    The substitutions are applied in order so a value may contain a tag substituted later on.
+    Tags are matched either literally with replace() or as regular expressions with sub(), the
+    regular expressions are compiled once per table. Files are processed as bytes so their
+    encoding does not matter.
+    """
+
+    REGEXP_SPECIAL_CHARS = frozenset(".^$*+?{}[]\\|()")
+    # file lists longer than this are processed in a thread pool
+    PARALLEL_FILE_COUNT = 32
+
+    def __init__(self, substitutions: Iterable[Sequence[str]] = ()) -> None:
+        self.substitutions: List[Tuple[str, str]] = [(item[0], item[1]) for item in substitutions]
+        self._compiled: Optional[List[Tuple[Pattern[str], Optional[str], str]]] = None
+        self._compiled_bytes: Optional[List[Tuple[Pattern[bytes], Optional[bytes], bytes]]] = None
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(self.substitutions)
+
+    def __len__(self) -> int:
+        return len(self.substitutions)
+
+    def _compile(self) -> List[Tuple[Pattern[str], Optional[str], str]]:
+        if self._compiled is None:
+            compiled = []
+            for tag, value in self.substitutions:
+                # plain tags can be looked up with a substring search before running the regexp
+                literal = None if self.REGEXP_SPECIAL_CHARS.intersection(tag) else tag
+                compiled.append((re.compile(tag), literal, value))
+            self._compiled = compiled
+        return self._compiled
+
+    def _compile_bytes(self) -> List[Tuple[Pattern[bytes], Optional[bytes], bytes]]:
+        if self._compiled_bytes is None:
+            self._compiled_bytes = [
+                (re.compile(regexp_obj.pattern.encode("utf-8")), None if literal is None else literal.encode("utf-8"),
+                 value.encode("utf-8"))
+                for regexp_obj, literal, value in self._compile()
+            ]
+        return self._compiled_bytes
+
+    def replace(self, text: str) -> str:
+        """Substitute the tags literally in the given string"""
+        for tag, value in self.substitutions:
+            if tag in text:
+                text = text.replace(tag, value)
+        return text
+
+    def sub(self, text: str) -> str:
+        """Substitute the tags as regular expressions in the given string"""
+        for regexp_obj, literal, value in self._compile():
+            if literal is None or literal in text:
+                text = regexp_obj.sub(value, text)
+        return text
+
+    def _may_match_file(self, path: str) -> bool:
+        """Check with a substring search of the mapped file whether any of the tags can match"""
+        compiled = self._compile_bytes()
+        if any(literal is None for _, literal, _ in compiled):
+            return True
+        with open(path, 'rb') as handle:
+            if not os.fstat(handle.fileno()).st_size:
+                return any(not literal for _, literal, _ in compiled)
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                # a later tag can only appear as a result of an earlier substitution
+                return any(content.find(literal) != -1 for _, literal, _ in compiled if literal is not None)
+
+    def sub_in_file(self, path: str) -> int:
+        """Substitute the tags in the given file, return the number of matches"""
+        if not self._may_match_file(path):
+            return 0
+        with open(path, 'rb') as handle:
             old_contents = handle.read()
-            new_contents = re.sub(regexp_obj, replacement_string, old_contents)
-            if old_contents != new_contents:
-                log.info("Replacement '%s' applied into: %s", replacement_string, xfile)
-            handle.seek(0)
-            handle.write(new_contents)
-            handle.truncate()
+        new_contents, matches = old_contents, 0
+        for regexp_obj, literal, value in self._compile_bytes():
+            if literal is not None and literal not in new_contents:
+                continue
+            new_contents, count = regexp_obj.subn(value, new_contents)
+            if count:
+                log.info("Replacement '%s' applied into: %s", value.decode("utf-8"), path)
+                matches += count
+        if new_contents != old_contents:
+            # write into a temporary file first so that the file is never left half written,
+            # this also breaks a possible hardlink to the source of a copied file
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, 'wb') as handle:
+                    handle.write(new_contents)
+                shutil.copymode(path, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                with suppress(FileNotFoundError):
+                    os.remove(tmp_path)
+        return matches
+
+    def sub_in_files(self, filelist: List[str]) -> Dict[str, int]:
+        """Substitute the tags in the given files, return the number of matches per file"""
+        if len(filelist) > self.PARALLEL_FILE_COUNT:
+            with ThreadPoolExecutor() as pool:
+                return dict(zip(filelist, pool.map(self.sub_in_file, filelist)))
+        return {path: self.sub_in_file(path) for path in filelist}
 
 
 ###############################
 # function
 ###############################
-def safe_config_key_fetch(conf: ConfigParser, section: str, key: str) -> Any:
+def safe_config_key_fetch(conf: ConfigType, section: str, key: str) -> Any:
+    """
+    Return the value of the key like config_section_map(conf, section)[key] did
+
+    A missing section or key and a value failing to interpolate give '', an option without a
+    value (allow_no_value) gives None.
+    """
     if not conf.has_section(section):
         return ''
     if not conf.has_option(section, key):
         return ''
-    return config_section_map(conf, section)[key]
+    try:
+        return conf.get(section, key)
+    except Exception as error:
+        log.exception("exception on %s!", key, exc_info=error)
+        return ''
 
 
 ###############################
 # function
 ###############################
-def config_section_map(conf: ConfigParser, section: str) -> Dict[str, Any]:
+def config_section_map(conf: ConfigType, section: str) -> Dict[str, Any]:
     dict1: Dict[str, Any] = {}
     options = conf.options(section)
     for option in options:
@@ -284,9 +715,10 @@ def locate_executable(search_dir: Union[str, Path], patterns: List[str]) -> str:
 # Function
 ###############################
 def locate_path(search_dir: Union[str, Path], patterns: List[str],
-                filters: Optional[List[Callable[[Path], bool]]] = None) -> str:
-    filters = filters or []
-    matches = locate_paths(search_dir, patterns, filters)
+                filters: Optional[List[Callable[[Path], bool]]] = None,
+                max_depth: Optional[int] = None, prune: Optional[List[str]] = None) -> str:
+    # stop the search on the second match, the result is an error anyway
+    matches = list(islice(iterate_paths(search_dir, patterns, filters, max_depth, prune), 2))
     if len(matches) != 1:
         raise PackagingError(f"Expected one result in '{search_dir}' matching '{patterns}'"
                              f" and filters. Got '{matches}'")
@@ -297,11 +729,99 @@ def locate_path(search_dir: Union[str, Path], patterns: List[str],
 # Function
 ###############################
 def locate_paths(search_dir: Union[str, Path], patterns: List[str],
-                 filters: Optional[List[Callable[[Path], bool]]] = None) -> List[str]:
-    filters = filters or []
-    patterns = patterns if patterns else ["*"]
-    paths = [p for p in Path(search_dir).rglob("*") if any(p.match(ptn) for ptn in patterns)]
-    return [str(p) for p in paths if all(f(p) for f in filters)]
+                 filters: Optional[List[Callable[[Path], bool]]] = None,
+                 max_depth: Optional[int] = None, prune: Optional[List[str]] = None) -> List[str]:
+    return list(iterate_paths(search_dir, patterns, filters, max_depth, prune))
+
+
+def _glob_part_to_regex(part: str) -> str:
+    """Translate a glob pattern for a single path component, wildcards never match a separator"""
+    regex, index = "", 0
+    while index < len(part):
+        char = part[index]
+        index += 1
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = index + 1 if part[index:index + 1] == "!" else index
+            end = part.find("]", end + 1 if part[end:end + 1] == "]" else end)
+            if end == -1:
+                regex += "\\["
+                continue
+            chars = part[index:end].replace("\\", "\\\\")
+            if chars.startswith("!"):
+                chars = "^/" + chars[1:]
+            elif chars.startswith("^"):
+                chars = "\\" + chars
+            regex += f"[{chars}]"
+            index = end + 1
+        else:
+            regex += re.escape(char)
+    return regex
+
+
+@lru_cache(maxsize=256)
+def compile_path_patterns(patterns: Tuple[str, ...]) -> Pattern[str]:
+    """
+    Compile glob patterns into one regular expression with the semantics of PurePath.match
+
+    Relative patterns match the trailing components of a '/' separated path, absolute patterns
+    match the whole path. Matching is case insensitive on Windows.
+    """
+    alternatives = []
+    for pattern in patterns:
+        parts = [part for part in re.split(r"[\\/]" if is_windows() else "/", pattern) if part]
+        regex = "/".join(_glob_part_to_regex(part) for part in parts)
+        alternatives.append(("^/?" if pattern.startswith(("/", "\\")) else "(?:^|/)") + regex + "$")
+    return re.compile("|".join(f"(?:{alt})" for alt in alternatives), re.IGNORECASE if is_windows() else 0)
+
+
+# os.path filters with an equivalent check on cached os.DirEntry type information
+_DIR_ENTRY_FILTERS: Dict[Any, Callable[["os.DirEntry[str]"], bool]] = {
+    os.path.isfile: lambda entry: entry.is_file(),
+    os.path.isdir: lambda entry: entry.is_dir(),
+}
+
+
+###############################
+# Function
+###############################
+def iterate_paths(search_dir: Union[str, Path], patterns: List[str],
+                  filters: Optional[List[Callable[[Path], bool]]] = None,
+                  max_depth: Optional[int] = None, prune: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    Yield the paths under search_dir matching any of the patterns and all of the filters
+
+    The tree is walked with os.scandir in the same order as Path.rglob, without following
+    symlinked directories. max_depth limits the walk, 1 being the direct children of search_dir.
+    Directories matching a pattern in prune are not descended into but may still be yielded.
+    """
+    regex = compile_path_patterns(tuple(patterns)) if patterns and "*" not in patterns else None
+    prune_regex = compile_path_patterns(tuple(prune)) if prune else None
+    entry_filters = [_DIR_ENTRY_FILTERS.get(f) for f in filters or []]
+    stack = [(str(search_dir), 1)]
+    while stack:
+        directory, depth = stack.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        subdirs = []
+        for entry in entries:
+            path = entry.path.replace("\\", "/") if is_windows() else entry.path
+            if regex is None or regex.search(path):
+                if all(
+                    entry_filter(entry) if entry_filter else path_filter(Path(entry.path))
+                    for entry_filter, path_filter in zip(entry_filters, filters or [])
+                ):
+                    yield entry.path
+            if (max_depth is None or depth < max_depth) and entry.is_dir(follow_symlinks=False):
+                if prune_regex is None or not prune_regex.search(path):
+                    subdirs.append((entry.path, depth + 1))
+        stack.extend(reversed(subdirs))
 
 
 ###############################
@@ -311,10 +831,8 @@ def requires_rpath(file_path: str) -> bool:
     if is_linux():
         if not os.access(file_path, os.X_OK):
             return False
-        with suppress(CalledProcessError):
-            output = run_cmd(cmd=["chrpath", "-l", file_path])
-            if output:
-                return re.search(r":*.R.*PATH=", output) is not None
+        with suppress(ElfError):
+            return read_elf_rpath(file_path) is not None
     return False
 
 
@@ -325,22 +843,16 @@ def sanity_check_rpath_max_length(file_path: str, new_rpath: str) -> bool:
     if is_linux():
         if not os.access(file_path, os.X_OK):
             return False
-        result = None
-        with suppress(CalledProcessError):
-            output = run_cmd(cmd=["chrpath", "-l", file_path])
-            result = re.search(r":*.R.*PATH=.*", output)
-        if result is None:
+        rpath = None
+        with suppress(ElfError):
+            rpath = read_elf_rpath(file_path)
+        if rpath is None:
             log.info("No RPath found from given file: %s", file_path)
-        else:
-            rpath = result.group()
-            index = rpath.index('=')
-            rpath = rpath[index + 1:]
-            space_for_new_rpath = len(rpath)
-            if len(new_rpath) > space_for_new_rpath:
-                log.warning("Warning - Not able to process RPath for file: %s", file_path)
-                log.warning("New RPath [%s] length: %s", new_rpath, str(len(new_rpath)))
-                log.warning("Space available inside the binary: %s", str(space_for_new_rpath))
-                raise IOError()
+        elif len(new_rpath.encode("utf-8")) > rpath.space:
+            log.warning("Warning - Not able to process RPath for file: %s", file_path)
+            log.warning("New RPath [%s] length: %s", new_rpath, str(len(new_rpath)))
+            log.warning("Space available inside the binary: %s", str(rpath.space))
+            raise IOError()
     return True
 
 
@@ -402,6 +914,30 @@ def calculate_rpath(file_full_path: str, destination_lib_path: str) -> str:
     return full_rpath
 
 
+# above this amount of executable files the rpaths are patched in a process pool
+RPATH_PARALLEL_FILE_COUNT = 256
+
+
+def _handle_file_rpath(file_full_path: str, component_root_path: str, destination_lib_paths: str) -> None:
+    # the dynamic section is parsed once, files without an existing rpath are left as they are
+    old_rpath = None
+    with suppress(ElfError):
+        old_rpath = read_elf_rpath(file_full_path)
+    if old_rpath is None:
+        return
+    rpaths = []
+    for destination_lib_path in destination_lib_paths.split(':'):
+        dst = os.path.normpath(component_root_path + os.sep + destination_lib_path)
+        rpaths.append(calculate_rpath(file_full_path, dst))
+    # keep an existing $ORIGIN path of the binary
+    origin_rpath = re.search(r"\$ORIGIN[^:\n]*", old_rpath.value)
+    if origin_rpath is not None and origin_rpath.group() not in rpaths:
+        rpaths.append(origin_rpath.group())
+    rpath = ':'.join(rpaths)
+    log.debug("RPath value: [%s] for file: [%s]", rpath, file_full_path)
+    write_elf_rpath(old_rpath, rpath)
+
+
 ##############################################################
 # Handle the RPath in the given component files
 ##############################################################
@@ -412,35 +948,24 @@ def handle_component_rpath(component_root_path: str, destination_lib_paths: str)
     log.info("Component root path:  %s", component_root_path)
     log.info("Destination lib path: %s", destination_lib_paths)
 
-    # loop on all files
+    if not is_linux():
+        return
+    file_list = []
     for root, _, files in os.walk(component_root_path):
         for name in files:
             file_full_path = os.path.join(root, name)
-            if not os.path.isdir(file_full_path) and not os.path.islink(file_full_path):
-                if requires_rpath(file_full_path):
-                    rpaths = []
-                    for destination_lib_path in destination_lib_paths.split(':'):
-                        dst = os.path.normpath(component_root_path + os.sep + destination_lib_path)
-                        rpath = calculate_rpath(file_full_path, dst)
-                        rpaths.append(rpath)
-
-                    # look for existing $ORIGIN path in the binary
-                    origin_rpath = None
-                    with suppress(CalledProcessError):
-                        output = run_cmd(cmd=["chrpath", "-l", file_full_path])
-                        origin_rpath = re.search(r"\$ORIGIN[^:\n]*", output)
-
-                    if origin_rpath is not None:
-                        if origin_rpath.group() not in rpaths:
-                            rpaths.append(origin_rpath.group())
-
-                    rpath = ':'.join(rpaths)
-                    if sanity_check_rpath_max_length(file_full_path, rpath):
-                        log.debug("RPath value: [%s] for file: [%s]", rpath, file_full_path)
-                        cmd_args = ['chrpath', '-r', rpath, file_full_path]
-                        # force silent operation
-                        work_dir = os.path.dirname(os.path.realpath(__file__))
-                        run_cmd(cmd=cmd_args, cwd=work_dir)
+            if not os.path.islink(file_full_path) and os.access(file_full_path, os.X_OK):
+                file_list.append(file_full_path)
+    handle_file = partial(
+        _handle_file_rpath, component_root_path=component_root_path,
+        destination_lib_paths=destination_lib_paths
+    )
+    if len(file_list) > RPATH_PARALLEL_FILE_COUNT:
+        with process_pool() as pool:
+            list(pool.map(handle_file, file_list, chunksize=32))
+    else:
+        for file_full_path in file_list:
+            handle_file(file_full_path)
 
 
 ###############################
@@ -459,6 +984,11 @@ def clone_repository(
     log.info("Destination: %s", destination_folder)
     log.info("--------------------------------------------------------------------")
 
+    mirror_cache = get_git_mirror_cache()
+    if mirror_cache is not None:
+        # the checkout shares the objects of the mirror so a full clone costs the same
+        mirror_cache.clone(repo_url, repo_branch_or_tag, destination_folder, init_subrepos=init_subrepos)
+        return
     work_dir = os.path.dirname(os.path.realpath(__file__))
     if full_clone:
         cmd_args = ["git", "clone", repo_url, destination_folder, "-b", repo_branch_or_tag]
@@ -515,6 +1045,12 @@ def git_archive_repo(repo_and_ref: str) -> str:
     archive_name = os.path.join(work_dir, project_name + "-" + ref.replace("/", "-") + file_extension)
     if os.path.isfile(archive_name):
         os.remove(archive_name)
+    mirror_cache = get_git_mirror_cache()
+    if mirror_cache is not None:
+        # git archive does not include the submodules, no checkout is needed
+        mirror_cache.archive(repository, ref, archive_name)
+        log.info("Created archive: %s", archive_name)
+        return archive_name
     # create temp directory
     checkout_dir = mkdtemp()
     # clone given repo to temp
@@ -530,27 +1066,125 @@ def git_archive_repo(repo_and_ref: str) -> str:
 # function
 ###############################
 def extract_file(path: str, to_directory: str = ".") -> bool:
-    cmd_args = []
-    if path.endswith('.tar'):
-        cmd_args = ['tar', '-xf', path]
-    elif path.endswith('.tar.gz') or path.endswith('.tgz'):
-        cmd_args = ['tar', '-xzf', path]
-    elif path.endswith('.tar.xz'):
-        cmd_args = ['tar', '-xf', path]
-    elif path.endswith('.tar.bz2') or path.endswith('.tbz'):
-        cmd_args = ['tar', '-xjf', path]
-    elif path.endswith('.7z') or path.endswith('.zip'):
-        cmd_args = ['7z', 'x', path]
-    else:
+    try:
+        extract_archive(path, to_directory)
+    except ArchiveError:
         log.warning("Extract fail: %s. Not an archive or appropriate extractor was not found", path)
         return False
-
-    ret = run_command(cmd_args, cwd=to_directory, only_error_case_output=True)
-    if ret:
-        raise RuntimeError(f"Failure running the last command: {ret}")
+    except CalledProcessError as err:
+        raise RuntimeError(f"Failure running the last command: {err.returncode}") from err
     return True
 
 
+# tar decompression flag by archive file suffix for the archives that can be extracted from a stream
+TAR_STREAM_DECOMPRESS_FLAGS = {
+    '.tar': '', '.tar.gz': 'z', '.tgz': 'z', '.tar.xz': 'J', '.tar.bz2': 'j', '.tbz': 'j'
+}
+
+
+def is_stream_extractable(path: str) -> bool:
+    return path.endswith(tuple(TAR_STREAM_DECOMPRESS_FLAGS))
+
+
+###############################
+# function
+###############################
+def stream_extract_url(url: str, to_directory: str, read_block_size: int = 1048576) -> None:
+    """Pipe the archive content into tar while it is being downloaded, nothing is saved on disk"""
+    suffix = next(s for s in sorted(TAR_STREAM_DECOMPRESS_FLAGS, key=len, reverse=True) if url.endswith(s))
+    cmd_args = ['tar', '-x' + TAR_STREAM_DECOMPRESS_FLAGS[suffix] + 'f', '-']
+    Path(to_directory).mkdir(parents=True, exist_ok=True)
+    received_size = 0
+    with urlopen(url) as response:
+        total_size = response.info().get('Content-Length')
+        log.info("Stream extract '%s' sized %s bytes into: %s", url, total_size, to_directory)
+        with Popen(cmd_args, stdin=PIPE, cwd=to_directory) as process:
+            assert process.stdin is not None
+            try:
+                for block in iter(lambda: response.read(read_block_size), b''):
+                    process.stdin.write(block)
+                    received_size += len(block)
+            except BrokenPipeError:
+                log.error("Extractor exited before the download of '%s' was complete", url)
+            finally:
+                with suppress(BrokenPipeError):
+                    process.stdin.close()
+    if process.returncode:
+        raise RuntimeError(f"Failure running the last command: {' '.join(cmd_args)}: {process.returncode}")
+    if total_size and received_size != int(total_size):
+        raise RuntimeError(f"Broken download, got a wrong size from '{url}' (total size: {total_size}, but {received_size} received).")
+
+
+# tarfile stream write mode by archive file suffix for the archives that can be repacked on the fly
+TAR_STREAM_WRITE_MODES = {
+    '.tar': 'w|', '.tar.gz': 'w|gz', '.tgz': 'w|gz', '.tar.xz': 'w|xz', '.tar.bz2': 'w|bz2', '.tbz': 'w|bz2'
+}
+
+
+def is_stream_repackable(path: str) -> bool:
+    return path.endswith(tuple(TAR_STREAM_WRITE_MODES))
+
+
+def _rewrite_member_path(name: str, strip_dirs: int, prefix: List[str], stripped: List[str]) -> Optional[str]:
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    # the directories to be stripped must form a single chain like with remove_one_tree_level
+    for index, part in enumerate(parts[:strip_dirs]):
+        if index == len(stripped):
+            stripped.append(part)
+        elif stripped[index] != part:
+            raise IOError(f'Cannot remove one level of directory structure of "{name}", it has multiple top level entries')
+    if len(parts) <= strip_dirs:
+        return None
+    return '/'.join(prefix + parts[strip_dirs:])
+
+
+###############################
+# function
+###############################
+def repack_tar_stream(
+    source: Union[str, IO[bytes]], target: str, strip_dirs: int = 0, prefix: str = ""
+) -> None:
+    """
+    Copy the members of a tar archive into a new archive while rewriting their paths
+
+    The given number of leading directories is stripped from the member paths and the prefix
+    is prepended, which equals extracting the archive, removing tree levels and packing the
+    content again, but without ever writing the content to disk.
+    """
+    mode = next(TAR_STREAM_WRITE_MODES[s] for s in sorted(TAR_STREAM_WRITE_MODES, key=len, reverse=True) if target.endswith(s))
+    prefix_parts = [part for part in prefix.replace(os.sep, '/').split('/') if part not in ('', '.')]
+    stripped: List[str] = []
+    log.info("Repacking '%s' into '%s' (strip dirs: %s, prefix: '%s')", source, target, strip_dirs, prefix)
+    try:
+        with ExitStack() as stack:
+            if isinstance(source, str):
+                src_tar = stack.enter_context(tarfile.open(source, mode='r|*'))
+            else:
+                src_tar = stack.enter_context(tarfile.open(fileobj=source, mode='r|*'))
+            dst_tar = stack.enter_context(tarfile.open(target, mode=mode, format=tarfile.PAX_FORMAT))  # type: ignore
+            for index in range(len(prefix_parts)):
+                prefix_dir = tarfile.TarInfo('/'.join(prefix_parts[:index + 1]))
+                prefix_dir.type, prefix_dir.mode = tarfile.DIRTYPE, 0o755
+                dst_tar.addfile(prefix_dir)
+            for member in src_tar:
+                new_name = _rewrite_member_path(member.name, strip_dirs, prefix_parts, stripped)
+                if new_name is None:
+                    if not member.isdir():
+                        raise IOError(f'Cannot remove one level of directory structure, "{member.name}" is not a directory')
+                    continue
+                member.name = new_name
+                if member.islnk():
+                    link_name = _rewrite_member_path(member.linkname, strip_dirs, prefix_parts, stripped)
+                    if link_name is None:
+                        raise IOError(f'Hard link target "{member.linkname}" is removed by the repacking')
+                    member.linkname = link_name
+                dst_tar.addfile(member, src_tar.extractfile(member) if member.isreg() else None)
+    except Exception:
+        with suppress(FileNotFoundError):
+            os.remove(target)
+        raise
+
+
 ###############################
 # function
 ###############################
@@ -588,10 +1222,7 @@ def create_mac_disk_image(execution_path: str, file_directory: str, file_base_na
 ###############################
 def create_extract_function(file_path: str, target_path: str) -> Callable[[], Any]:
     Path(target_path).mkdir(parents=True, exist_ok=True)
-    working_dir = os.path.dirname(file_path)
-    if file_path.endswith('.tar.gz'):
-        return lambda: run_command(['tar', 'zxf', file_path, '-C', target_path], working_dir)
-    return lambda: run_command(['7z', 'x', '-y', file_path, '-o' + target_path], working_dir)
+    return lambda: extract_archive(os.path.abspath(file_path), target_path)
 
 
 ###############################
@@ -624,16 +1255,20 @@ def create_download_extract_task(url: str, target_path: str, temp_path: str) ->
 ###############################
 def create_qt_download_task(module_urls: List[str], target_qt5_path: str, temp_path: str, caller_arguments: Optional[Namespace]) -> Task:
     qt_task = Task(f'download and extract Qt to "{target_qt5_path}"', function=None)
-    download_work = ThreadedWork(f'download Qt packages to "{temp_path}"')
+    download_work = TaskExecutor(f'download Qt packages to "{temp_path}"')
     unzip_task = Task(f'extracting packages to "{target_qt5_path}"', function=None)
+    extra_names = ([] if is_macos() else ["icu7z"]) + (["d3dcompiler7z", "opengl32sw7z", "openssl7z"] if is_windows() else [])
+    extra_urls = [getattr(caller_arguments, name, None) for name in extra_names] if caller_arguments else []
+    # the sizes are the cost hints of the downloads, the biggest archives are downloaded first
+    url_sizes = content_url_sizes(module_urls + [url for url in extra_urls if url])
     # add Qt modules
     for module_url in module_urls:
         if is_content_url_valid(module_url):
             (download_task, extract_task) = create_download_and_extract_tasks(
                 module_url, target_qt5_path, temp_path
             )
-            download_work.add_task_object(download_task)
-            unzip_task.add_function(extract_task.do_task)
+            download_work.add_task_object(download_task, cost=url_sizes[module_url])
+            unzip_task.add_function(extract_task.run_functions)
         else:
             log.warning("could not find '%s' for download", module_url)
     # add icu, d3dcompiler, opengl32, openssl
@@ -643,29 +1278,29 @@ def create_qt_download_task(module_urls: List[str], target_qt5_path: str, temp_p
             (download_task, extract_task) = create_download_and_extract_tasks(
                 caller_arguments.icu7z, target_path, temp_path
             )
-            download_work.add_task_object(download_task)
-            unzip_task.add_function(extract_task.do_task)
+            download_work.add_task_object(download_task, cost=url_sizes[caller_arguments.icu7z])
+            unzip_task.add_function(extract_task.run_functions)
         if is_windows():
             if hasattr(caller_arguments, 'd3dcompiler7z') and caller_arguments.d3dcompiler7z:
                 (download_task, extract_task) = create_download_and_extract_tasks(
                     caller_arguments.d3dcompiler7z, target_path, temp_path
                 )
-                download_work.add_task_object(download_task)
-                unzip_task.add_function(extract_task.do_task)
+                download_work.add_task_object(download_task, cost=url_sizes[caller_arguments.d3dcompiler7z])
+                unzip_task.add_function(extract_task.run_functions)
             if hasattr(caller_arguments, 'opengl32sw7z') and caller_arguments.opengl32sw7z:
                 (download_task, extract_task) = create_download_and_extract_tasks(
                     caller_arguments.opengl32sw7z, target_path, temp_path
                 )
-                download_work.add_task_object(download_task)
-                unzip_task.add_function(extract_task.do_task)
+                download_work.add_task_object(download_task, cost=url_sizes[caller_arguments.opengl32sw7z])
+                unzip_task.add_function(extract_task.run_functions)
             if hasattr(caller_arguments, 'openssl7z') and caller_arguments.openssl7z:
                 (download_task, extract_task) = create_download_and_extract_tasks(
                     caller_arguments.openssl7z, target_path, temp_path
                 )
-                download_work.add_task_object(download_task)
-                unzip_task.add_function(extract_task.do_task)
+                download_work.add_task_object(download_task, cost=url_sizes[caller_arguments.openssl7z])
+                unzip_task.add_function(extract_task.run_functions)
     qt_task.add_function(download_work.run)
-    qt_task.add_function(unzip_task.do_task)
+    qt_task.add_function(unzip_task.run_functions)
     return qt_task
 
 
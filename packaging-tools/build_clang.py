@@ -38,14 +38,20 @@ from typing import Dict, List, Optional
 import environmentfrombatchfile
 from bld_utils import is_linux, is_macos, is_windows, run_command
 from bldinstallercommon import create_download_extract_task, create_qt_download_task
+from git_mirror import get_git_mirror_cache
 from read_remote_config import get_pkg_value
 from runner import run_cmd
-from threadedwork import ThreadedWork
+from threadedwork import TaskExecutor
 
 
 def git_clone_and_checkout(
     base_path: str, remote_repository_url: str, directory: str, revision: str
 ) -> None:
+    mirror_cache = get_git_mirror_cache()
+    if mirror_cache is not None:
+        mirror_cache.clone(remote_repository_url, revision, os.path.join(base_path, directory), init_subrepos=True,
+                           recursive=True, config={'core.eol': 'lf', 'core.autocrlf': 'input'})
+        return
     run_command(['git', 'clone',
                  '--depth', '1',
                  '--config', 'core.eol=lf',
@@ -196,7 +202,7 @@ def mingw_training(
     qt_mingw_module_urls = [qt_base_url + '/' + module + '/' + module + qt_mingw_postfix for module in qt_modules]
     qt_temp = os.path.join(base_path, 'qt_download')
     qt_mingw_temp = os.path.join(base_path, 'qt_download_mingw')
-    download_packages_work = ThreadedWork("get and extract Qt")
+    download_packages_work = TaskExecutor("get and extract Qt")
     download_packages_work.add_task_object(create_qt_download_task(qt_module_urls, qt_dir, qt_temp, None))
     download_packages_work.add_task_object(create_qt_download_task(qt_mingw_module_urls, qt_mingw_dir, qt_mingw_temp, None))
 
@@ -351,8 +357,8 @@ def build_and_install(
     build_targets: List[str],
     install_targets: List[str],
 ) -> None:
-    run_cmd(cmd=build_command() + build_targets, cwd=build_path, env=environment)
-    run_cmd(cmd=install_command() + install_targets, cwd=build_path, env=environment)
+    run_cmd(cmd=build_command() + build_targets, cwd=build_path, env=environment, stream=True)
+    run_cmd(cmd=install_command() + install_targets, cwd=build_path, env=environment, stream=True)
 
 
 def get_cmake_command(
@@ -413,7 +419,7 @@ def build_clang(
         toolchain, src_path, install_path, profile_data_path, first_run, bitness, build_type
     )
 
-    run_cmd(cmd=cmake_cmd, cwd=build_path, env=environment)
+    run_cmd(cmd=cmake_cmd, cwd=build_path, env=environment, stream=True)
 
     build_targets = ['libclang', 'clang', 'llvm-config']
     install_targets = ['install/strip']
@@ -454,7 +460,7 @@ def build_clazy(
 
     cmake_cmd.extend(bitness_flags(bitness))
     cmake_cmd.append(src_path)
-    run_cmd(cmd=cmake_cmd, cwd=build_path, env=environment)
+    run_cmd(cmd=cmake_cmd, cwd=build_path, env=environment, stream=True)
 
     install_targets = ['install/strip']
     if is_msvc_toolchain(toolchain):
@@ -471,7 +477,7 @@ def check_clang(toolchain: str, build_path: str, env: Optional[Dict[str, str]])
             env[path_key] += ';' + tools_path
 
     with suppress(CalledProcessError):
-        run_cmd(cmd=build_command() + ["check-clang"], cwd=build_path, env=env)
+        run_cmd(cmd=build_command() + ["check-clang"], cwd=build_path, env=env, stream=True)
 
 
 def package_clang(install_path: str, result_file_path: str) -> None:
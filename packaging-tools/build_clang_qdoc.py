@@ -36,11 +36,17 @@ from typing import Dict, List, Optional
 
 import environmentfrombatchfile
 from bld_utils import is_linux, is_windows, run_command
+from git_mirror import get_git_mirror_cache
 from read_remote_config import get_pkg_value
 from runner import run_cmd
 
 
 def git_clone_and_checkout(base_path: str, remote_repository_url: str, directory: str, revision: str) -> None:
+    mirror_cache = get_git_mirror_cache()
+    if mirror_cache is not None:
+        mirror_cache.clone(remote_repository_url, revision, os.path.join(base_path, directory), init_subrepos=True,
+                           recursive=True, config={'core.eol': 'lf', 'core.autocrlf': 'input'})
+        return
     run_command(['git', 'clone',
                  '--config', 'core.eol=lf',
                  '--config', 'core.autocrlf=input',
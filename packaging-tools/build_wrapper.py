@@ -50,6 +50,7 @@ from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 from urllib.request import urlopen
 
+from archive_engine import compress_archive
 from bld_sdktool import build_sdktool, zip_sdktool
 from bld_utils import (
     download,
@@ -58,10 +59,10 @@ from bld_utils import (
     is_linux,
     is_macos,
     is_windows,
-    run_command,
 )
 from bldinstallercommon import (
     clone_repository,
+    content_url_sizes,
     copy_tree,
     create_download_and_extract_tasks,
     create_download_extract_task,
@@ -76,7 +77,7 @@ from notarize import notarize
 from optionparser import get_pkg_options
 from read_remote_config import get_pkg_value
 from runner import run_cmd
-from threadedwork import Task, ThreadedWork
+from threadedwork import Task, TaskExecutor
 
 log = init_logger(__name__, debug_mode=False)
 
@@ -214,8 +215,8 @@ def create_download_documentation_task(
         dest_doc_path = os.path.join(download_path, 'doc')
         os.rename(source_path, dest_doc_path)
         # limit compression to 2 cores to limit memory footprint for 32bit Windows
-        run_command(['7z', 'a', '-mx1', '-mmt2', '-md32m', '-ms=1g', target_filepath, dest_doc_path],
-                    dest_doc_path)
+        compress_archive(target_filepath, [dest_doc_path], cwd=dest_doc_path, profile="fast", threads=2,
+                         extra_args=['-md32m', '-ms=1g'])
 
     download_task = Task(f"downloading documentation from {base_url}", function=None)
     for item in file_list:
@@ -254,8 +255,7 @@ def create_download_openssl_task(url: str, download_path: str) -> Tuple[Task, Ta
         else:
             source_path = linuxdir
             pattern = '*.so*'
-        run_command(['7z', 'a', '-mmt2', target_filepath, pattern],
-                    source_path)
+        compress_archive(target_filepath, [pattern], cwd=source_path, threads=2)
 
     download_task = Task(f"downloading openssl from {url}", function=None)
     download_task.add_function(download, url, download_filepath)
@@ -680,14 +680,16 @@ def handle_qt_creator_build(option_dict: Dict[str, str], qtcreator_plugins: List
     if gammaray_url:
         gammaray_url = (pkg_base_path + '/' + gammaray_url + '/' + target_env_dir + '/qt5_gammaray.7z')
 
-    download_work = ThreadedWork('Download packages')
+    download_work = TaskExecutor('Download packages')
     extract_work = Task('Extract packages', function=None)
+    sized_downloads: List[Tuple[str, Task]] = []
 
     def add_download_extract(url: str, target_path: str) -> None:
         (dl_task, extract) = create_download_and_extract_tasks(
             url, target_path, download_temp)
-        download_work.add_task_object(dl_task)
-        extract_work.add_function(extract.do_task)
+        # queued once the sizes of all urls are known
+        sized_downloads.append((url, dl_task))
+        extract_work.add_function(extract.run_functions)
 
     # clang package
     use_optimized_libclang = False
@@ -726,17 +728,22 @@ def handle_qt_creator_build(option_dict: Dict[str, str], qtcreator_plugins: List
     (dl_task, repackage, documentation_local_url) = create_download_documentation_task(
         pkg_base_path + '/' + qt_base_path, os.path.join(download_temp, 'qtdocumentation'))
     download_work.add_task_object(dl_task)
-    extract_work.add_function(repackage.do_task)
+    extract_work.add_function(repackage.run_functions)
 
     if openssl_libs:
         (dl_task, repackage, openssl_local_url) = create_download_openssl_task(openssl_libs, os.path.join(download_temp, 'openssl'))
         download_work.add_task_object(dl_task)
-        extract_work.add_function(repackage.do_task)
+        extract_work.add_function(repackage.run_functions)
+
+    # the sizes are the cost hints of the downloads, the biggest archives are downloaded first
+    url_sizes = content_url_sizes([url for url, _ in sized_downloads])
+    for url, dl_task in sized_downloads:
+        download_work.add_task_object(dl_task, cost=url_sizes[url])
 
     download_packages_work = Task('Get and extract all needed packages', function=None)
     download_packages_work.add_function(download_work.run)
-    download_packages_work.add_function(extract_work.do_task)
-    download_packages_work.do_task()
+    download_packages_work.add_function(extract_work.run_functions)
+    download_packages_work.run_functions()
 
     # copy optimized clang package
     if use_optimized_libclang:
@@ -1052,7 +1059,7 @@ def handle_sdktool_build(option_dict: Dict[str, str]) -> None:
                     '--build', os.path.join(work_dir, 'build'),
                     '--no-qtcreator']
 
-        download_packages_work = ThreadedWork('Get and extract all needed packages')
+        download_packages_work = TaskExecutor('Get and extract all needed packages')
         python_path = None
         python_url = option_dict.get('PYTHON_URL')
         if python_url:
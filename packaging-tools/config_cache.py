@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+from configparser import ConfigParser, ExtendedInterpolation, NoOptionError, NoSectionError
+from contextlib import suppress
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from logging_util import init_logger
+
+log = init_logger(__name__, debug_mode=False)
+
+CONFIG_CACHE_DIR_ENV = "QT_PACKAGING_CONFIG_CACHE_DIR"
+# bump when the pickled layout changes so stale cache files are ignored
+CONFIG_CACHE_VERSION = 2
+
+
+class CompiledConfig:
+    """
+    Read-only, fully interpolated configuration with the lookup methods of ConfigParser
+
+    Lookups are plain dict accesses. A value which fails to interpolate is stored as an empty
+    string like safe_config_key_fetch returns it.
+    """
+
+    def __init__(self, sections: Dict[str, Dict[str, str]]) -> None:
+        self.data = sections
+
+    @classmethod
+    def from_parser(cls, parser: ConfigParser) -> "CompiledConfig":
+        sections: Dict[str, Dict[str, str]] = {}
+        for section in parser.sections():
+            values = sections[section] = {}
+            for option in parser.options(section):
+                try:
+                    values[option] = parser.get(section, option)
+                except Exception as error:
+                    log.exception("exception on %s!", option, exc_info=error)
+                    values[option] = ""
+        return cls(sections)
+
+    def sections(self) -> List[str]:
+        return list(self.data)
+
+    def has_section(self, section: str) -> bool:
+        return section in self.data
+
+    def has_option(self, section: str, option: str) -> bool:
+        return option.lower() in self.data.get(section, {})
+
+    def options(self, section: str) -> List[str]:
+        if section not in self.data:
+            raise NoSectionError(section)
+        return list(self.data[section])
+
+    def items(self, section: str) -> List[Tuple[str, str]]:
+        if section not in self.data:
+            raise NoSectionError(section)
+        return list(self.data[section].items())
+
+    def get(self, section: str, option: str) -> str:
+        if section not in self.data:
+            raise NoSectionError(section)
+        try:
+            return self.data[section][option.lower()]
+        except KeyError:
+            raise NoOptionError(option, section) from None
+
+
+ConfigType = Union[ConfigParser, CompiledConfig]
+
+_memo: Dict[str, Tuple[str, CompiledConfig]] = {}
+_memo_lock = threading.Lock()
+
+
+def _content_key(content: bytes) -> str:
+    # the content itself, an edit within the mtime resolution keeping the size is not missed
+    return hashlib.sha1(content).hexdigest()
+
+
+def _cache_file(cache_dir: str, path: str) -> Path:
+    return Path(cache_dir) / f"{hashlib.sha1(path.encode('utf-8')).hexdigest()}.pickle"
+
+
+def _read_cache(cache_file: Path, file_key: str) -> Optional[CompiledConfig]:
+    try:
+        with open(cache_file, "rb") as handle:
+            version, cached_key, sections = pickle.load(handle)
+    except Exception:
+        return None
+    if version != CONFIG_CACHE_VERSION or cached_key != file_key:
+        return None
+    return CompiledConfig(sections)
+
+
+def _write_cache(cache_file: Path, file_key: str, config: CompiledConfig) -> None:
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(f".{cache_file.name}.{uuid.uuid4().hex}")
+    try:
+        with open(tmp_file, "wb") as handle:
+            pickle.dump((CONFIG_CACHE_VERSION, file_key, config.data), handle)
+        os.replace(tmp_file, cache_file)
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(tmp_file)
+
+
+def load_config(file_path: Union[str, Path]) -> CompiledConfig:
+    """
+    Parse the configuration file once and return its compiled form
+
+    The result is kept in memory for the process and, if QT_PACKAGING_CONFIG_CACHE_DIR is set,
+    pickled into that directory. Both are keyed by the SHA1 of the file content.
+    """
+    path = os.path.realpath(file_path)
+    with open(path, "rb") as handle:
+        content = handle.read()
+    file_key = _content_key(content)
+    with _memo_lock:
+        memo = _memo.get(path)
+    if memo is not None and memo[0] == file_key:
+        return memo[1]
+    cache_dir = os.environ.get(CONFIG_CACHE_DIR_ENV)
+    config = _read_cache(_cache_file(cache_dir, path), file_key) if cache_dir else None
+    if config is None:
+        parser = ConfigParser(interpolation=ExtendedInterpolation())
+        parser.read_string(content.decode("utf-8"), source=path)
+        config = CompiledConfig.from_parser(parser)
+        if cache_dir:
+            _write_cache(_cache_file(cache_dir, path), file_key, config)
+    else:
+        log.debug("Using cached configuration for: %s", path)
+    with _memo_lock:
+        _memo[path] = (file_key, config)
+    return config
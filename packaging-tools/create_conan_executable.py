@@ -33,6 +33,7 @@ import argparse
 import os
 import platform
 import sys
+from asyncio import gather
 from pathlib import Path
 from shutil import rmtree
 from typing import Dict, List
@@ -73,14 +74,17 @@ async def pip_install_from_checkout(pipenv: str, checkout_dir: str, env: Dict[st
 
 async def pip_install_url(pipenv: str, pip_packages: List[str], env: Dict[str, str]) -> None:
     chekout_folders: List[str] = []
+    clones = []
     for pkg in pip_packages or []:
         if is_valid_url_path(pkg):
             destination_dir = os.path.join(os.getcwd(), "_git_tmp", pkg.split("/")[-1])
             rmtree(destination_dir, ignore_errors=True)
-            await clone_repo(pkg, destination_dir, env)
+            clones.append(clone_repo(pkg, destination_dir, env))
             chekout_folders.append(destination_dir)
         else:
             chekout_folders.append(pkg)
+    # the clones are independent, the process supervisor limits how many run at once
+    await gather(*clones)
 
     for package in chekout_folders:
         await pip_install_from_checkout(pipenv, package, env)
@@ -30,34 +30,72 @@
 
 """Scripts to generate SDK installer based on open source InstallerFramework"""
 
+import json
 import os
 import re
 import shutil
 import sys
+import threading
 from argparse import ArgumentParser, ArgumentTypeError
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from configparser import ConfigParser, ExtendedInterpolation
 from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from functools import lru_cache, partial
 from multiprocessing import cpu_count
 from pathlib import Path
 from time import gmtime, strftime
-from typing import Any, Generator, List, Optional
+from typing import (
+    IO,
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlparse
+from urllib.request import urlopen
 
 import pkg_constants
 from archiveresolver import ArchiveLocationResolver
 from bld_utils import download, is_linux, is_macos, is_windows
 from bldinstallercommon import (
+    SubstitutionTable,
     copy_tree,
+    drain_tree_removals,
     extract_file,
     handle_component_rpath,
     is_content_url_valid,
+    is_stream_extractable,
+    is_stream_repackable,
     locate_executable,
     locate_path,
-    locate_paths,
     remove_one_tree_level,
     remove_tree,
-    replace_in_files,
+    remove_tree_async,
+    repack_tar_stream,
     retrieve_url,
     safe_config_key_fetch,
+    stream_extract_url,
+    sweep_tree_trash,
+)
+from config_cache import load_config
+from download_cache import (
+    DEFAULT_CACHE_SIZE,
+    DOWNLOAD_CACHE_DIR_ENV,
+    DOWNLOAD_CACHE_SIZE_ENV,
+    DownloadCache,
+    FileCache,
+    clone_file,
+    file_sha1,
+    get_download_cache,
+    set_download_cache,
+    url_validator,
 )
 from installer_utils import PackagingError
 from logging_util import init_logger
@@ -65,7 +103,7 @@ from patch_qt import patch_files, patch_qt_edition
 from pkg_constants import INSTALLER_OUTPUT_DIR_NAME
 from runner import run_cmd
 from sdkcomponent import SdkComponent
-from threadedwork import ThreadedWork
+from tracing import Tracer
 
 if is_windows():
     import win32api  # type: ignore # pylint: disable=E0401
@@ -82,6 +120,13 @@ INSTALL_PRIORITY_TAG = '%INSTALL_PRIORITY%'
 SORTING_PRIORITY_TAG = '%SORTING_PRIORITY%'
 VERSION_NUMBER_AUTO_INCREASE_TAG = '%VERSION_NUMBER_AUTO_INCREASE%'
 COMPONENT_SHA1_TAG = '%COMPONENT_SHA1%'
+# worker pools of the component data stages
+IO_POOL = 'io'
+CPU_POOL = 'cpu'
+# seconds between the checks for abort while waiting for an archive download slot
+ARCHIVE_WINDOW_POLL_INTERVAL = 1.0
+ARCHIVE_CACHE_DIR_ENV = 'QT_PACKAGING_ARCHIVE_CACHE'
+ARCHIVE_CACHE_SIZE_ENV = 'QT_PACKAGING_ARCHIVE_CACHE_SIZE'
 
 
 class CreateInstallerError(Exception):
@@ -100,12 +145,23 @@ def check_required_tools() -> None:
 ##############################################################
 # Cleanup
 ##############################################################
+def trash_dir_path(task: Any) -> str:
+    """Return the trash directory for the component temp data, outside the package directory"""
+    return os.path.join(os.path.dirname(os.path.normpath(task.packages_full_path_dst)), ".trash")
+
+
 def clean_work_dirs(task: Any) -> None:
     """Clean working directories."""
     log.info("Cleaning work environment")
-    for item in [task.packages_full_path_dst, task.repo_output_dir, task.config_dir_dst]:
+    work_dirs = [task.packages_full_path_dst, task.repo_output_dir, task.config_dir_dst]
+    # trash left behind by a killed run, before new trash is created below
+    for parent_dir in sorted({os.path.dirname(os.path.normpath(item)) for item in work_dirs}):
+        sweep_tree_trash(parent_dir)
+    remove_tree_async(trash_dir_path(task))
+    for item in work_dirs:
         if os.path.exists(item):
-            remove_tree(item)
+            # the directories are recreated right away, the old content is deleted in background
+            remove_tree_async(item)
             log.debug("Deleted directory: %s", item)
 
 
@@ -151,11 +207,9 @@ def set_config_xml(task: Any) -> Any:
 
     update_repository_url = safe_config_key_fetch(task.config, 'SdkUpdateRepository', 'repository_url_release')
 
-    fileslist = [config_template_dest]
-    replace_in_files(fileslist, UPDATE_REPOSITORY_URL_TAG, update_repository_url)
     # substitute values also from global substitution list
-    for item in task.substitutions:
-        replace_in_files(fileslist, item[0], item[1])
+    substitutions = SubstitutionTable([(UPDATE_REPOSITORY_URL_TAG, update_repository_url), *task.substitution_table])
+    substitutions.sub_in_files([config_template_dest])
     return config_template_dest
 
 
@@ -180,11 +234,10 @@ def substitute_global_tags(task: Any) -> None:
                 path = os.path.join(root, name)
                 fileslist.append(path)
 
-    replace_in_files(fileslist, PACKAGE_CREATION_DATE_TAG, task.build_timestamp)
+    tag_pairs = [(PACKAGE_CREATION_DATE_TAG, task.build_timestamp)]
     if task.force_version_number_increase:
-        replace_in_files(fileslist, VERSION_NUMBER_AUTO_INCREASE_TAG, task.version_number_auto_increase_value)
-    for item in task.substitutions:
-        replace_in_files(fileslist, item[0], item[1])
+        tag_pairs.append((VERSION_NUMBER_AUTO_INCREASE_TAG, task.version_number_auto_increase_value))
+    SubstitutionTable([*tag_pairs, *task.substitution_table]).sub_in_files(fileslist)
 
 
 ##############################################################
@@ -205,14 +258,16 @@ def substitute_component_tags(tag_pair_list: List[List[str]], meta_dir_dest: str
             path = os.path.join(root, name)
             fileslist.append(path)
 
+    tag_pairs = []
     for pair in tag_pair_list:
         tag = pair[0]
         value = pair[1]
         if tag and value:
             log.info("Matching '%s' and '%s' in files list", tag, value)
-            replace_in_files(fileslist, tag, value)
+            tag_pairs.append((tag, value))
         else:
             log.warning("Ignoring incomplete tag pair: %s = %s", tag, value)
+    SubstitutionTable(tag_pairs).sub_in_files(fileslist)
 
 
 ##############################################################
@@ -229,9 +284,7 @@ def parse_component_data(task: Any, configuration_file: str, configurations_base
             allos_conf_file_dir = os.path.normpath(task.configurations_dir + os.sep + 'all-os')
             file_full_path = locate_path(allos_conf_file_dir, [configuration_file], filters=[os.path.isfile])
     log.info("Reading target configuration file: %s", file_full_path)
-    configuration = ConfigParser(interpolation=ExtendedInterpolation())
-    with open(file_full_path, encoding="utf-8") as cfgfile:
-        configuration.read_file(cfgfile)
+    configuration = load_config(file_full_path)
 
     # parse package ignore list first
     sdk_component_exclude_list = safe_config_key_fetch(configuration, 'PackageIgnoreList', 'packages')
@@ -241,6 +294,7 @@ def parse_component_data(task: Any, configuration_file: str, configurations_base
         for item in pkg_list:
             task.sdk_component_ignore_list.append(item)
     # parse sdk components
+    sdk_components = []
     for section in configuration.sections():
         section_namespace = section.split(".")[0]
         if section_namespace in task.package_namespace:
@@ -250,25 +304,26 @@ def parse_component_data(task: Any, configuration_file: str, configurations_base
                     target_config=configuration,
                     packages_full_path_list=task.packages_dir_name_list,
                     archive_location_resolver=task.archive_location_resolver,
-                    key_value_substitution_list=task.substitutions,
+                    key_value_substitution_list=task.substitution_table,
                 )
+                # if include filter defined for component it is included only if LICENSE_TYPE matches to include_filter
+                # same configuration file can contain components that are included only to either edition
+                if sdk_component.include_filter and sdk_component.include_filter not in task.license_type:
+                    continue
                 if task.dry_run:
                     sdk_component.set_archive_skip(True)
-                # validate component
-                sdk_component.validate()
-                if sdk_component.is_valid():
-                    # if include filter defined for component it is included only if LICENSE_TYPE matches to include_filter
-                    # same configuration file can contain components that are included only to either edition
-                    if sdk_component.include_filter and sdk_component.include_filter in task.license_type:
-                        task.sdk_component_list.append(sdk_component)
-                    # components without include_filter definition are added by default
-                    elif not sdk_component.include_filter:
-                        task.sdk_component_list.append(sdk_component)
-                else:
-                    if task.strict_mode:
-                        raise CreateInstallerError(f"{sdk_component.error_msg()}")
-                    log.warning("Ignore invalid component (missing payload/metadata?): %s", section)
-                    task.sdk_component_list_skipped.append(sdk_component)
+                sdk_components.append(sdk_component)
+    # validate components concurrently, the archive location checks are network bound
+    with ThreadPoolExecutor(max_workers=max(1, task.max_download_count)) as pool:
+        list(pool.map(SdkComponent.validate, sdk_components))
+    for sdk_component in sdk_components:
+        if sdk_component.is_valid():
+            task.sdk_component_list.append(sdk_component)
+        else:
+            if task.strict_mode:
+                raise CreateInstallerError(f"{sdk_component.error_msg()}")
+            log.warning("Ignore invalid component (missing payload/metadata?): %s", sdk_component.package_subst_name)
+            task.sdk_component_list_skipped.append(sdk_component)
     # check for extra configuration files if defined
     extra_conf_list = safe_config_key_fetch(configuration, 'PackageConfigurationFiles', 'file_list')
     if extra_conf_list:
@@ -328,52 +383,219 @@ def get_component_sha1_file(sdk_component: SdkComponent, sha1_file_dest: str) ->
         sdk_component.component_sha1 = sha1_file.read().strip()
 
 
-def get_component_data(
-    task: Any,
-    sdk_component: SdkComponent,
-    archive: SdkComponent.DownloadableArchive,
-    install_dir: str,
-    data_dir_dest: str,
-    compress_content_dir: str,
-) -> None:
-    """download and create data for a component"""
-    package_raw_name = os.path.basename(archive.archive_uri)
-
-    # if no data to be installed, then just continue
-    if not package_raw_name:
-        return
-    if not archive.package_strip_dirs:
-        archive.package_strip_dirs = '0'
-
-    if package_raw_name.endswith(('.7z', '.tar.xz')) \
-       and archive.package_strip_dirs == '0' \
-       and not archive.package_finalize_items \
-       and not archive.archive_action \
-       and not archive.rpath_target \
-       and sdk_component.target_install_base == '/' \
-       and not archive.target_install_dir:
-        log.info("No repackaging actions required for the package, just download it directly to data directory")
-        downloaded_archive = os.path.normpath(data_dir_dest + os.sep + archive.archive_name)
-        # start download
-        download(archive.archive_uri, downloaded_archive)
-        return
-
-    downloaded_archive = os.path.normpath(install_dir + os.sep + package_raw_name)
-    # start download
-    download(archive.archive_uri, downloaded_archive)
-
-    # repackage content so that correct dir structure will get into the package
-
-    if not archive.extract_archive:
-        archive.extract_archive = 'yes'
+class ComponentArchiveJob:
+    """
+    Download and repack one archive of a component into its data directory
+
+    The work is split into stages so that the network bound fetch and the CPU bound extract,
+    finalize and compress stages can be scheduled into separate worker pools. Each stage is a
+    no-op once the job is done, e.g. when the archive was placed directly into the data directory.
+    """
+
+    def __init__(
+        self,
+        task: Any,
+        sdk_component: SdkComponent,
+        archive: SdkComponent.DownloadableArchive,
+        install_dir: str,
+        data_dir_dest: str,
+        compress_content_dir: str,
+    ) -> None:
+        self.task = task
+        self.sdk_component = sdk_component
+        self.archive = archive
+        self.install_dir = install_dir
+        self.data_dir_dest = data_dir_dest
+        self.compress_content_dir = compress_content_dir
+        self.saveas = os.path.normpath(data_dir_dest + os.sep + archive.archive_name)
+        self.downloaded_archive = ""
+        self.recipe_key: Optional[str] = None
+        self.repack_stream = False
+        self.holds_window_slot = False
+        self.done = False
+
+    def stages(self) -> List[Tuple[str, Callable[[], None]]]:
+        """Return the stages in execution order, tagged with the worker pool they belong to"""
+        return [
+            (IO_POOL, self.fetch),
+            (CPU_POOL, self.extract),
+            (CPU_POOL, self.finalize),
+            (CPU_POOL, self.compress),
+        ]
+
+    def run(self) -> None:
+        for _, stage in self.stages():
+            stage()
+
+    def trace(self, name: str) -> ContextManager[Dict[str, Any]]:
+        return self.task.tracer.span(  # type: ignore
+            name, "archive", archive=self.archive.archive_name, component=self.sdk_component.package_name
+        )
 
-    # extract contents
-    if archive.extract_archive == 'yes':
-        extracted = extract_file(downloaded_archive, install_dir)
+    def removes_debug_files(self) -> bool:
+        task = self.task
+        # don't remove debug information files from debug information archives
+        if self.archive.archive_name.endswith('debug-symbols.7z'):
+            return False
+        # remove debug information files only if exactly one of the file types is defined
+        return bool(task.remove_pdb_files != task.remove_debug_information_files)
+
+    def can_repack_stream(self) -> bool:
+        """Check whether only the member paths need to change so no extraction is required"""
+        archive = self.archive
+        return self.task.repack_stream \
+            and archive.extract_archive == 'yes' \
+            and is_stream_extractable(archive.archive_uri) \
+            and is_stream_repackable(self.saveas) \
+            and not archive.package_finalize_items \
+            and not archive.archive_action \
+            and not archive.rpath_target \
+            and not archive.component_sha1_file \
+            and not self.removes_debug_files() \
+            and not self.task.remove_debug_libraries
+
+    def repack(self, source: Union[str, IO[bytes]]) -> None:
+        """Rewrite the member paths of the source tar archive directly into the data directory"""
+        prefix = os.path.normpath(self.archive.get_archive_installation_directory())
+        repack_tar_stream(source, self.saveas, int(self.archive.package_strip_dirs), prefix)
+        self.store()
+
+    def store(self) -> None:
+        if self.recipe_key:
+            store_processed_archive(self.task.archive_cache, self.recipe_key, self.sdk_component, self.archive, self.saveas)
+        self.done = True
+
+    def fetch(self) -> None:
+        """Download the archive, or place a ready archive directly into the data directory"""
+        task, archive = self.task, self.archive
+        package_raw_name = os.path.basename(archive.archive_uri)
+
+        # if no data to be installed, then just continue
+        if not package_raw_name:
+            self.done = True
+            return
+        if not archive.package_strip_dirs:
+            archive.package_strip_dirs = '0'
+
+        if package_raw_name.endswith(('.7z', '.tar.xz')) \
+           and archive.package_strip_dirs == '0' \
+           and not archive.package_finalize_items \
+           and not archive.archive_action \
+           and not archive.rpath_target \
+           and self.sdk_component.target_install_base == '/' \
+           and not archive.target_install_dir:
+            log.info("No repackaging actions required for the package, just download it directly to data directory")
+            # start download
+            with self.trace("download") as args:
+                download(archive.archive_uri, self.saveas)
+                args["bytes"] = os.path.getsize(self.saveas)
+            self.done = True
+            return
+
+        if not archive.extract_archive:
+            archive.extract_archive = 'yes'
+
+        # the key is computed after the defaults are set, '' and 'yes' produce the same output
+        self.recipe_key = get_archive_recipe_key(task, archive) if task.archive_cache else None
+        if self.recipe_key:
+            with self.trace("archive cache lookup"):
+                restored = restore_processed_archive(task.archive_cache, self.recipe_key, self.sdk_component, self.saveas)
+            if restored:
+                self.done = True
+                return
+
+        # repackage content so that correct dir structure will get into the package
+
+        self.repack_stream = self.can_repack_stream()
+        stream = archive.extract_archive == 'yes' and use_stream_extract(task, archive.archive_uri)
+        if stream and self.repack_stream:
+            # download and repacking overlap, neither the archive nor its content land on disk
+            with self.trace("stream repack"), urlopen(archive.archive_uri) as response:
+                self.repack(response)
+        elif stream:
+            # download and extraction overlap, the archive itself never lands on disk
+            with self.trace("stream extract"):
+                stream_extract_url(archive.archive_uri, self.install_dir)
+        else:
+            # the archive lands on disk until extracted, limit how many of them wait there
+            self.acquire_window_slot()
+            self.downloaded_archive = os.path.normpath(self.install_dir + os.sep + package_raw_name)
+            try:
+                # start download
+                with self.trace("download") as args:
+                    download(archive.archive_uri, self.downloaded_archive)
+                    args["bytes"] = os.path.getsize(self.downloaded_archive)
+            except BaseException:
+                self.release_window_slot()
+                raise
+
+    def acquire_window_slot(self) -> None:
+        if self.task.archive_window is not None:
+            self.task.archive_window.acquire()
+            self.holds_window_slot = True
+
+    def release_window_slot(self) -> None:
+        if self.holds_window_slot:
+            self.holds_window_slot = False
+            self.task.archive_window.release()
+
+    def extract(self) -> None:
+        """Extract the downloaded archive into the installation directory"""
+        try:
+            self._extract()
+        finally:
+            self.release_window_slot()
+
+    def _extract(self) -> None:
+        if self.done or not self.downloaded_archive or self.archive.extract_archive != 'yes':
+            return
+        if self.repack_stream:
+            with self.trace("repack"):
+                self.repack(self.downloaded_archive)
+            os.remove(self.downloaded_archive)
+            return
+        with self.trace("extract"):
+            extracted = extract_file(self.downloaded_archive, self.install_dir)
         # remove old package if extraction was successful, else keep it
         if extracted:
-            os.remove(downloaded_archive)
+            os.remove(self.downloaded_archive)
+
+    def finalize(self) -> None:
+        """Apply the archive action, strip dirs, finalize items, debug file removal and rpath"""
+        if self.done:
+            return
+        task, archive, install_dir = self.task, self.archive, self.install_dir
+        if archive.extract_archive == 'yes':
+            with self.trace("finalize"):
+                self.finalize_items()
+
+        # remove debug information files when explicitly defined so and debug libraries
+        remove_debug_libraries = task.remove_debug_libraries and (is_windows() or is_macos())
+        if self.removes_debug_files() or remove_debug_libraries:
+            with self.trace("remove debug files"):
+                # remove debug information files according to host platform defaults
+                dbg_file_suffix = debug_information_file_suffix() if self.removes_debug_files() else ""
+                remove_debug_files(install_dir, dbg_file_suffix, remove_debug_libraries)
+
+        if archive.rpath_target:
+            if not archive.rpath_target.startswith(os.sep):
+                archive.rpath_target = os.sep + archive.rpath_target
+            if is_linux():
+                with self.trace("rpath"):
+                    handle_component_rpath(install_dir, archive.rpath_target)
+
+        if archive.component_sha1_file:
+            # read sha1 from the file
+            sha1_file_path = install_dir + os.sep + archive.component_sha1_file
+            if os.path.exists(sha1_file_path):
+                with open(sha1_file_path, "r", encoding="utf-8") as sha1_file:
+                    self.sdk_component.component_sha1 = sha1_file.read().strip()
+            else:
+                raise CreateInstallerError(f"Component SHA1 file '{archive.component_sha1_file}' not found")
 
+    def finalize_items(self) -> None:
+        """Run the archive action script, strip dirs and apply the package finalize items"""
+        task, archive, install_dir = self.task, self.archive, self.install_dir
         # perform custom action script for the extracted archive
         if archive.archive_action:
             script_file, script_args = archive.archive_action.split(",")
@@ -415,41 +637,227 @@ def get_component_data(
         if 'set_licheck' in archive.package_finalize_items:
             handle_set_licheck(task, install_dir, archive.package_finalize_items)
 
-    # remove debug information files when explicitly defined so
-    if not task.remove_pdb_files or not task.remove_debug_information_files:
-        # don't remove debug information files from debug information archives
-        if not archive.archive_name.endswith('debug-symbols.7z'):
-            # Check if debug information file types are defined
-            if task.remove_pdb_files or task.remove_debug_information_files:
-                # Remove debug information files according to host platform defaults
-                remove_all_debug_information_files(install_dir)
-
-    # remove debug libraries
-    if task.remove_debug_libraries:
-        remove_all_debug_libraries(install_dir)
-
-    if archive.rpath_target:
-        if not archive.rpath_target.startswith(os.sep):
-            archive.rpath_target = os.sep + archive.rpath_target
-        if is_linux():
-            handle_component_rpath(install_dir, archive.rpath_target)
-
-    if archive.component_sha1_file:
-        # read sha1 from the file
-        sha1_file_path = install_dir + os.sep + archive.component_sha1_file
-        if os.path.exists(sha1_file_path):
-            with open(sha1_file_path, "r", encoding="utf-8") as sha1_file:
-                sdk_component.component_sha1 = sha1_file.read().strip()
-        else:
-            raise CreateInstallerError(f"Component SHA1 file '{archive.component_sha1_file}' not found")
+    def compress(self) -> None:
+        """Compress the component content back to .7z archive in the data directory"""
+        if self.done:
+            return
+        content_list = os.listdir(self.compress_content_dir)
+        # adding compress_content_dir in front of every item
+        content_list = [(self.compress_content_dir + os.sep + x) for x in content_list]
+
+        with self.trace("archivegen") as args:
+            run_cmd(cmd=[self.task.archivegen_tool, self.saveas] + content_list, cwd=self.data_dir_dest)
+            args["bytes"] = os.path.getsize(self.saveas)
+        self.store()
 
-    # lastly compress the component back to .7z archive
-    content_list = os.listdir(compress_content_dir)
-    # adding compress_content_dir in front of every item
-    content_list = [(compress_content_dir + os.sep + x) for x in content_list]
 
-    saveas = os.path.normpath(data_dir_dest + os.sep + archive.archive_name)
-    run_cmd(cmd=[task.archivegen_tool, saveas] + content_list, cwd=data_dir_dest)
+def get_component_data(
+    task: Any,
+    sdk_component: SdkComponent,
+    archive: SdkComponent.DownloadableArchive,
+    install_dir: str,
+    data_dir_dest: str,
+    compress_content_dir: str,
+) -> None:
+    """download and create data for a component"""
+    ComponentArchiveJob(task, sdk_component, archive, install_dir, data_dir_dest, compress_content_dir).run()
+
+
+class ArchiveWindow:
+    """
+    Limit the count of archives downloaded to disk but not yet extracted
+
+    The downloads are faster than the extraction, without a limit every archive could land on
+    disk before the first one is extracted. Waiting for a slot is aborted when abort is set.
+    """
+
+    def __init__(self, size: int, abort: threading.Event) -> None:
+        self.slots = threading.BoundedSemaphore(max(1, size))
+        self.abort = abort
+
+    def acquire(self) -> None:
+        while not self.slots.acquire(timeout=ARCHIVE_WINDOW_POLL_INTERVAL):
+            # the stages releasing the slots are not started anymore after a failure
+            if self.abort.is_set():
+                raise CreateInstallerError("Aborted waiting for an archive download slot")
+
+    def release(self) -> None:
+        self.slots.release()
+
+
+class StageScheduler:
+    """
+    Run chains of dependent stages in separate worker pools
+
+    Each chain is a list of (pool name, callable) pairs executed in order, the next stage is
+    submitted to its pool as soon as the previous one finishes. Network bound and CPU bound
+    stages get their own concurrency limits this way. After the first failure no new stages
+    are started and that error is raised from wait().
+    """
+
+    def __init__(self, pool_sizes: Dict[str, int]) -> None:
+        self.pools = {
+            name: ThreadPoolExecutor(max_workers=max(1, size), thread_name_prefix=name)
+            for name, size in pool_sizes.items()
+        }
+        self.chains: List["Future[None]"] = []
+        self.failed = threading.Event()
+        self.first_error: Optional[BaseException] = None
+        self._error_lock = threading.Lock()
+
+    def add_chain(self, description: str, stages: List[Tuple[str, Callable[[], None]]]) -> "Future[None]":
+        chain_result: "Future[None]" = Future()
+        self.chains.append(chain_result)
+        log.info("Scheduled: %s", description)
+
+        def submit_stage(index: int) -> None:
+            if self.failed.is_set():
+                chain_result.cancel()
+                return
+            pool_name, function = stages[index]
+            self.pools[pool_name].submit(function).add_done_callback(
+                lambda stage_result: on_stage_done(index, stage_result)
+            )
+
+        def on_stage_done(index: int, stage_result: "Future[None]") -> None:
+            error = stage_result.exception()
+            if error is not None:
+                log.error("Failed: %s", description)
+                with self._error_lock:
+                    if self.first_error is None:
+                        self.first_error = error
+                self.failed.set()
+                chain_result.set_exception(error)
+            elif index + 1 < len(stages):
+                submit_stage(index + 1)
+            else:
+                chain_result.set_result(None)
+
+        if stages:
+            submit_stage(0)
+        else:
+            chain_result.set_result(None)
+        return chain_result
+
+    def _join(self) -> None:
+        try:
+            wait(self.chains)
+        finally:
+            for pool in self.pools.values():
+                pool.shutdown(wait=True)
+
+    def wait(self) -> None:
+        """Block until all chains are finished, raise the first error if any"""
+        self._join()
+        if self.first_error is not None:
+            raise self.first_error
+
+    def abort(self) -> None:
+        """Start no new stages and wait for the running ones, their errors are not raised"""
+        self.failed.set()
+        self._join()
+
+
+@lru_cache(maxsize=None)
+def _tool_checksum(tool_path: str, mtime_ns: int, size: int) -> str:
+    # mtime and size are part of the memo key, a rebuilt tool is hashed again
+    return file_sha1(tool_path)
+
+
+def tool_identity(tool_path: str) -> str:
+    """Return the path and the checksum of the tool binary, the path alone if it is missing"""
+    try:
+        stat = os.stat(tool_path)
+    except OSError:
+        return tool_path
+    return f"{tool_path}:{_tool_checksum(tool_path, stat.st_mtime_ns, stat.st_size)}"
+
+
+def get_archive_recipe_key(task: Any, archive: SdkComponent.DownloadableArchive) -> Optional[str]:
+    """
+    Return a key identifying the repacked output of the archive
+
+    The key covers the source content and every setting affecting the repacking. None is returned
+    if the source content can not be identified, the output is not cached then.
+    """
+    if os.path.isfile(archive.archive_uri):
+        source_checksum: Optional[str] = "sha1:" + file_sha1(archive.archive_uri)
+    else:
+        source_checksum = url_validator(archive.archive_uri)
+    if source_checksum is None:
+        return None
+    recipe = {
+        "archive_uri": archive.archive_uri,
+        "archive_name": archive.archive_name,
+        "archivegen": tool_identity(task.archivegen_tool),
+        "source": source_checksum,
+        "host": sys.platform,
+        "extract_archive": archive.extract_archive,
+        "archive_action": archive.archive_action,
+        "package_strip_dirs": archive.package_strip_dirs,
+        "package_finalize_items": archive.package_finalize_items,
+        "installation_directory": archive.get_archive_installation_directory(),
+        "rpath_target": archive.rpath_target,
+        "component_sha1_file": archive.component_sha1_file,
+        "remove_debug_information_files": task.remove_debug_information_files,
+        "remove_pdb_files": task.remove_pdb_files,
+        "remove_debug_libraries": task.remove_debug_libraries,
+        "substitutions": task.substitutions,
+    }
+    if archive.archive_action:
+        script_file = archive.archive_action.split(",")[0]
+        script_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), script_file)
+        if os.path.isfile(script_path):
+            recipe["archive_action_script"] = file_sha1(script_path)
+    if "set_licheck" in archive.package_finalize_items:
+        recipe["build_timestamp"] = task.build_timestamp
+    return json.dumps(recipe, sort_keys=True)
+
+
+def restore_processed_archive(
+    cache: FileCache, recipe_key: str, sdk_component: SdkComponent, saveas: str
+) -> bool:
+    """Place a previously repacked archive to saveas, return False on cache miss"""
+    with cache.key_lock(recipe_key):
+        with cache.locked():
+            handle = cache.open_blob(recipe_key)
+            sha1_blob = cache.lookup(recipe_key + "\ncomponent_sha1")
+            component_sha1 = sha1_blob.read_text(encoding="utf-8").strip() if sha1_blob else None
+        if handle is None:
+            return False
+        log.info("Reusing repacked archive from cache: %s", saveas)
+        # copied without the cache lock, the open blob stays readable even if it is evicted
+        with handle:
+            clone_file(handle, saveas)
+    if component_sha1 is not None:
+        sdk_component.component_sha1 = component_sha1
+    return True
+
+
+def store_processed_archive(
+    cache: FileCache,
+    recipe_key: str,
+    sdk_component: SdkComponent,
+    archive: SdkComponent.DownloadableArchive,
+    saveas: str,
+) -> None:
+    """Save the repacked archive and the component sha1 read from it to the cache"""
+    with cache.key_lock(recipe_key):
+        if archive.component_sha1_file:
+            sha1_tmp = cache.new_tmp_path()
+            sha1_tmp.write_text(sdk_component.component_sha1, encoding="utf-8")
+            cache.store(recipe_key + "\ncomponent_sha1", sha1_tmp)
+        archive_tmp = cache.new_tmp_path()
+        shutil.copyfile(saveas, archive_tmp)
+        cache.store(recipe_key, archive_tmp)
+
+
+def use_stream_extract(task: Any, archive_uri: str) -> bool:
+    """Check whether the remote archive can be piped to the extractor during the download"""
+    if not task.stream_extract or get_download_cache() is not None:
+        # a configured download cache is preferred so the archive can be reused later
+        return False
+    return urlparse(archive_uri).scheme in ('http', 'https') and is_stream_extractable(archive_uri)
 
 
 def handle_set_executable(base_dir: str, package_finalize_items: str) -> None:
@@ -483,88 +891,149 @@ def parse_package_finalize_items(package_finalize_items: str, item_category: str
 # Substitute pkg template directory names
 ##############################################################
 def substitute_package_name(task: Any, package_name: str) -> str:
-    for item in task.substitutions:
-        package_name = package_name.replace(item[0], item[1])
+    return task.substitution_table.replace(package_name)  # type: ignore
 
-    return package_name
 
+# directories searched for debug information files and debug libraries
+DEBUG_FILE_DIRS = ('bin', 'lib', 'qml', 'plugins')
+WINDOWS_DEBUG_LIBRARY_SUFFIXES = ('dll', 'lib', 'prl')
 
-##############################################################
-# Remove debug information files
-##############################################################
-def remove_all_debug_information_files(install_dir: str) -> None:
-    """Remove debug information files according to host machine."""
+
+def debug_information_file_suffix() -> str:
+    """Return the debug information file type of the host machine"""
     if is_windows():
-        debug_information_file_ending = 'pdb'
-    elif is_linux():
-        debug_information_file_ending = 'debug'
-    elif is_macos():
-        debug_information_file_ending = 'dSYM'
-    else:
-        raise CreateInstallerError('Host is not identified as Windows, Linux or macOS')
+        return 'pdb'
+    if is_linux():
+        return 'debug'
+    if is_macos():
+        return 'dSYM'
+    raise CreateInstallerError('Host is not identified as Windows, Linux or macOS')
+
 
-    remove_debug_information_files_by_file_type(install_dir, debug_information_file_ending)
+def is_debug_library(name: str, dir_content: Set[str]) -> bool:
+    """Check whether the file name matches the debug library naming of the host machine"""
+    if is_windows():
+        # at this point of packaging we don't necessarily have reliable source of library names
+        # on Windows we trust debug library filenames to follow *d.dll | *d.lib industry standard naming convention
+        base_name, _, suffix = name.rpartition('.')
+        if suffix in WINDOWS_DEBUG_LIBRARY_SUFFIXES and base_name.endswith('d'):
+            # but we must consider that library filenames can end with letter 'd' in release build,
+            # keep those if there is a library with double d at the end of file name in the same directory
+            return f"{base_name}d.{suffix}" not in dir_content
+        return False
+    if is_macos():
+        return fnmatch(name, '*_debug.*')
+    return False
 
 
 ##############################################################
-# Remove debug information files by file type
+# Remove debug information files and debug libraries
 ##############################################################
+def remove_debug_files(install_dir: str, dbg_file_suffix: str = "", debug_libraries: bool = False) -> None:
+    """
+    Remove debug information files and debug libraries in a single pass over the install_dir
+
+    Only the content of bin, lib, qml and plugins directories at any depth is considered. On
+    macOS the debug information is in dSYM folder bundles instead of files.
+    """
+    log.info("Removing debug files from: %s (debug information: %s, debug libraries: %s)",
+             install_dir, dbg_file_suffix or None, debug_libraries)
+    dbg_file_ending = os.path.normcase('.' + dbg_file_suffix)
+    stack = [(install_dir, False)]
+    while stack:
+        directory, is_debug_file_dir = stack.pop()
+        with os.scandir(directory) as iterator:
+            entries = list(iterator)
+        dir_content = {os.path.normcase(entry.name) for entry in entries}
+        for entry in entries:
+            name = os.path.normcase(entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                if is_debug_file_dir and dbg_file_suffix == 'dSYM' and name.endswith('dSYM'):
+                    remove_tree(entry.path)
+                else:
+                    stack.append((entry.path, is_debug_file_dir or name in DEBUG_FILE_DIRS))
+                continue
+            if not is_debug_file_dir:
+                continue
+            if dbg_file_suffix and dbg_file_suffix != 'dSYM' and name.endswith(dbg_file_ending) and entry.is_file():
+                os.unlink(entry.path)
+            elif debug_libraries and is_debug_library(name, dir_content):
+                os.unlink(entry.path)
+
+
+def remove_all_debug_information_files(install_dir: str) -> None:
+    """Remove debug information files according to host machine."""
+    remove_debug_files(install_dir, dbg_file_suffix=debug_information_file_suffix())
+
+
 def remove_debug_information_files_by_file_type(install_dir: str, dbg_file_suffix: str) -> None:
     """Remove debug information files by file type"""
-    dirs = locate_paths(install_dir, ['bin', 'lib', 'qml', 'plugins'], filters=[os.path.isdir])
-    for dbg_info_dir in dirs:
-        log.info("Removing debug information files from: %s", dbg_info_dir)
-        if dbg_file_suffix == 'dSYM':
-            # On macOS, debug symbols are in dSYM folder bundles instead of files.
-            dbg_file_list = locate_paths(dbg_info_dir, ["*dSYM"], [os.path.isdir])
-            for debug_information in dbg_file_list:
-                remove_tree(debug_information)
-        else:
-            for path in locate_paths(dbg_info_dir, ["*." + dbg_file_suffix], [os.path.isfile]):
-                Path(path).unlink()
+    remove_debug_files(install_dir, dbg_file_suffix=dbg_file_suffix)
 
 
-##############################################################
-# Remove debug libraries
-##############################################################
 def remove_all_debug_libraries(install_dir: str) -> None:
     """Remove debug libraries."""
-    # at this point of packaging we don't necessarily have reliable source of library names
-    # on Windows we trust debug library filenames to follow *d.dll | *d.lib industry standard naming convention
-    # but we must consider that library filenames can end with letter 'd' in release build
-    # and exclude those from removable items
-    if is_windows():
-        for directory in ('bin', 'lib', 'qml', 'plugins'):
-            windows_debug_library_dir = locate_path(install_dir, [directory], filters=[os.path.isdir])
-            log.info("Removing Windows debug libraries from: %s", windows_debug_library_dir)
-            # go through all library types and related qmake files
-            debug_library_file_endings = ['dll', 'lib', 'prl']
-            for debug_library_file_type in debug_library_file_endings:
-                # make list of all debug library names
-                all_debug_files_list = locate_paths(windows_debug_library_dir, ['*d.' + debug_library_file_type], filters=[os.path.isfile])
-                # in case library name ends with 'd' we need to keep that and remove only library with double d at the end of file name
-                double_d_debug_files_list = locate_paths(windows_debug_library_dir, ['*dd.' + debug_library_file_type], filters=[os.path.isfile])
-                if double_d_debug_files_list:
-                    # check intersection of all debug libraries and library names ending with letter 'd'
-                    debug_files_list_intersection = set(all_debug_files_list).intersection(double_d_debug_files_list)
-                    for debug_library_name in set(debug_files_list_intersection):
-                        # remove one 'd' from library names ending letter 'd' also in release builds
-                        # and exclude from removed libraries
-                        altered_library_name = debug_library_name[:-5] + debug_library_name[-5 + 1:]
-                        all_debug_files_list.remove(altered_library_name)
-                # remove all debug libraries with filenames ending *d.dll | *d.lib
-                for item in all_debug_files_list:
-                    Path(item).unlink()
-    # remove macOS debug libraries
-    elif is_macos():
-        for debug_library_dir in locate_paths(install_dir, ['bin', 'lib', 'qml', 'plugins'], filters=[os.path.isdir]):
-            log.info("Removing macOS debug libraries from: %s", debug_library_dir)
-            debug_library_file_ending = '_debug.*'
-            if os.path.exists(debug_library_dir):
-                for item in locate_paths(debug_library_dir, ['*' + debug_library_file_ending]):
-                    Path(item).unlink()
-    else:
+    if not is_windows() and not is_macos():
         log.info("Host was not Windows or macOS. For Linux and others we don\'t do anything at the moment")
+        return
+    remove_debug_files(install_dir, debug_libraries=True)
+
+
+def add_target_component(task: Any, sdk_component: SdkComponent, scheduler: StageScheduler) -> None:
+    """Prepare component metadata and schedule its data archives, the downloads start immediately"""
+    sdk_component.print_component_data()
+    # substitute pkg_template dir names and package_name
+    package_name = substitute_package_name(task, sdk_component.package_name)
+    dest_base = task.packages_full_path_dst + os.sep + package_name + os.sep
+    meta_dir_dest = os.path.normpath(dest_base + 'meta')
+    data_dir_dest = os.path.normpath(dest_base + 'data')
+    temp_data_dir = os.path.normpath(dest_base + 'tmp')
+    # save path for later substitute_component_tags call
+    sdk_component.meta_dir_dest = meta_dir_dest
+    # create meta destination folder
+    Path(meta_dir_dest).mkdir(parents=True, exist_ok=True)
+    # maybe there is some static data, copied before the archive jobs start to extract into the
+    # same directory so that an archive entry overrides a static file of the same path
+    data_content_source_root = os.path.normpath(sdk_component.pkg_template_dir + os.sep + 'data')
+    if os.path.exists(data_content_source_root):
+        Path(data_dir_dest).mkdir(parents=True, exist_ok=True)
+        report = copy_tree(data_content_source_root, data_dir_dest)
+        log.info("Copied static data for %s: %s", sdk_component.package_name, report)
+    # handle archives
+    if sdk_component.downloadable_archive_list:
+        # save path for later substitute_component_tags call
+        sdk_component.temp_data_dir = temp_data_dir
+        # Copy archives into temporary build directory if exists
+        for archive in sdk_component.downloadable_archive_list:
+            # fetch packages only if offline installer or repo creation, for online installer just handle the metadata
+            if task.offline_installer or task.create_repository:
+                # Create needed data dirs
+                compress_content_dir = os.path.normpath(temp_data_dir + os.sep + archive.archive_name)
+                install_dir = os.path.normpath(compress_content_dir + archive.get_archive_installation_directory())
+                # Create needed data dirs before the threads start to work
+                Path(install_dir).mkdir(parents=True, exist_ok=True)
+                Path(data_dir_dest).mkdir(parents=True, exist_ok=True)
+                if is_windows():
+                    install_dir = win32api.GetShortPathName(install_dir)
+                    data_dir_dest = win32api.GetShortPathName(data_dir_dest)
+                if not task.dry_run:
+                    job = ComponentArchiveJob(task, sdk_component, archive, install_dir, data_dir_dest, compress_content_dir)
+                    scheduler.add_chain(f"adding {archive.archive_name} to {sdk_component.package_name}", job.stages())
+    # handle component sha1 uri
+    if sdk_component.component_sha1_uri and not task.dry_run:
+        sha1_file_dest = os.path.normpath(dest_base + 'SHA1')
+        scheduler.add_chain(f"getting component sha1 file for {sdk_component.package_name}",
+                            [(IO_POOL, partial(get_component_sha1_file, sdk_component, sha1_file_dest))])
+    # Copy Meta data
+    metadata_content_source_root = os.path.normpath(sdk_component.pkg_template_dir + os.sep + 'meta')
+    copy_tree(metadata_content_source_root, meta_dir_dest)
+    if os.path.isfile(os.path.join(task.script_root_dir, "lrelease")):
+        # create translation binaries if translation source files exist for component
+        update_script = os.path.join(task.script_root_dir, "update_component_translations.sh")
+        lrelease_tool = os.path.join(task.script_root_dir, "lrelease")
+        run_cmd(cmd=[update_script, "-r", lrelease_tool, dest_base])
+    # add files into tag substitution
+    task.directories_for_substitutions.append(meta_dir_dest)
 
 
 ##############################################################
@@ -580,71 +1049,29 @@ def create_target_components(task: Any) -> None:
         if not os.path.isfile(os.path.join(task.script_root_dir, "lrelease")):
             download(os.environ.get("LRELEASE_TOOL", ""), task.script_root_dir)
             extract_file(os.path.basename(os.environ.get("LRELEASE_TOOL", "")), task.script_root_dir)
-    get_component_data_work = ThreadedWork("get components data")
-    for sdk_component in task.sdk_component_list:
-        sdk_component.print_component_data()
-        # substitute pkg_template dir names and package_name
-        package_name = substitute_package_name(task, sdk_component.package_name)
-        dest_base = task.packages_full_path_dst + os.sep + package_name + os.sep
-        meta_dir_dest = os.path.normpath(dest_base + 'meta')
-        data_dir_dest = os.path.normpath(dest_base + 'data')
-        temp_data_dir = os.path.normpath(dest_base + 'tmp')
-        # save path for later substitute_component_tags call
-        sdk_component.meta_dir_dest = meta_dir_dest
-        # create meta destination folder
-        Path(meta_dir_dest).mkdir(parents=True, exist_ok=True)
-        # Copy Meta data
-        metadata_content_source_root = os.path.normpath(sdk_component.pkg_template_dir + os.sep + 'meta')
-        copy_tree(metadata_content_source_root, meta_dir_dest)
-        if os.path.isfile(os.path.join(task.script_root_dir, "lrelease")):
-            # create translation binaries if translation source files exist for component
-            update_script = os.path.join(task.script_root_dir, "update_component_translations.sh")
-            lrelease_tool = os.path.join(task.script_root_dir, "lrelease")
-            run_cmd(cmd=[update_script, "-r", lrelease_tool, dest_base])
-        # add files into tag substitution
-        task.directories_for_substitutions.append(meta_dir_dest)
-        # handle archives
-        if sdk_component.downloadable_archive_list:
-            # save path for later substitute_component_tags call
-            sdk_component.temp_data_dir = temp_data_dir
-            # Copy archives into temporary build directory if exists
-            for archive in sdk_component.downloadable_archive_list:
-                # fetch packages only if offline installer or repo creation, for online installer just handle the metadata
-                if task.offline_installer or task.create_repository:
-                    # Create needed data dirs
-                    compress_content_dir = os.path.normpath(temp_data_dir + os.sep + archive.archive_name)
-                    install_dir = os.path.normpath(compress_content_dir + archive.get_archive_installation_directory())
-                    # adding get_component_data task to our work queue
-                    # Create needed data dirs before the threads start to work
-                    Path(install_dir).mkdir(parents=True, exist_ok=True)
-                    Path(data_dir_dest).mkdir(parents=True, exist_ok=True)
-                    if is_windows():
-                        install_dir = win32api.GetShortPathName(install_dir)
-                        data_dir_dest = win32api.GetShortPathName(data_dir_dest)
-                    get_component_data_work.add_task(f"adding {archive.archive_name} to {sdk_component.package_name}",
-                                                     get_component_data, task, sdk_component, archive, install_dir, data_dir_dest, compress_content_dir)
-        # handle component sha1 uri
-        if sdk_component.component_sha1_uri:
-            sha1_file_dest = os.path.normpath(dest_base + 'SHA1')
-            get_component_data_work.add_task(f"getting component sha1 file for {sdk_component.package_name}",
-                                             get_component_sha1_file, sdk_component, sha1_file_dest)
-
-        # maybe there is some static data
-        data_content_source_root = os.path.normpath(sdk_component.pkg_template_dir + os.sep + 'data')
-        if os.path.exists(data_content_source_root):
-            Path(data_dir_dest).mkdir(parents=True, exist_ok=True)
-            copy_tree(data_content_source_root, data_dir_dest)
-
-    if not task.dry_run:
-        # start the work threaded, more than 8 parallel downloads are not so useful
-        get_component_data_work.run(min([task.max_cpu_count, cpu_count()]))
+    # downloads are network bound and the repacking is CPU bound, use separate limits for them
+    cpu_workers = min([task.max_cpu_count, cpu_count()])
+    scheduler = StageScheduler({
+        IO_POOL: task.max_download_count,
+        CPU_POOL: cpu_workers,
+    })
+    # one archive being extracted and one waiting for each CPU worker keeps the disk use bounded
+    task.archive_window = ArchiveWindow(2 * cpu_workers, scheduler.failed)
+    try:
+        for sdk_component in task.sdk_component_list:
+            add_target_component(task, sdk_component, scheduler)
+    except BaseException:
+        # the stages already started must finish, but the original error is the one raised
+        scheduler.abort()
+        raise
+    scheduler.wait()
 
     for sdk_component in task.sdk_component_list:
         # substitute tags
         substitute_component_tags(create_metadata_map(sdk_component), sdk_component.meta_dir_dest)
         if hasattr(sdk_component, 'temp_data_dir') and os.path.exists(sdk_component.temp_data_dir):
-            # lastly remove temp dir after all data is prepared
-            if not remove_tree(sdk_component.temp_data_dir):
+            # lastly remove temp dir after all data is prepared, move it out of the package directory
+            if not remove_tree_async(sdk_component.temp_data_dir, trash_dir_path(task)):
                 raise CreateInstallerError(f"Unable to remove directory: {sdk_component.temp_data_dir}")
             # substitute downloadable archive names in installscript.qs
             substitute_component_tags(sdk_component.generate_downloadable_archive_list(), sdk_component.meta_dir_dest)
@@ -857,30 +1284,51 @@ def create_mac_disk_image(task: Any) -> None:
 def create_installer(task: Any) -> None:
     """Installer creation main steps."""
     log.info("Creating Qt Installer Framework based installer/online repository")
-    # check required tools
-    check_required_tools()
-    # clean env before starting
-    clean_work_dirs(task)
-    # set config templates
-    if task.online_installer or task.offline_installer:
-        set_config_directory(task)
-        set_config_xml(task)
-    # install Installer Framework tools
-    task.install_ifw_tools()
-    # parse SDK components
-    parse_components(task)
-    # create components
-    create_target_components(task)
-    # substitute global tags
-    substitute_global_tags(task)
-    # create the installer binary
-    if task.online_installer or task.offline_installer:
-        create_installer_binary(task)
-        # for mac we need some extra work
-        if is_macos():
-            create_mac_disk_image(task)
-    if task.create_repository:
-        create_online_repository(task)
+    tracer = task.tracer
+    try:
+        # check required tools
+        with tracer.span("check_required_tools"):
+            check_required_tools()
+        # clean env before starting
+        with tracer.span("clean_work_dirs"):
+            clean_work_dirs(task)
+        # set config templates
+        if task.online_installer or task.offline_installer:
+            with tracer.span("set_config_directory"):
+                set_config_directory(task)
+            with tracer.span("set_config_xml"):
+                set_config_xml(task)
+        # install Installer Framework tools
+        with tracer.span("install_ifw_tools"):
+            task.install_ifw_tools()
+        # parse SDK components
+        with tracer.span("parse_components"):
+            parse_components(task)
+        # create components
+        with tracer.span("create_target_components"):
+            create_target_components(task)
+        # substitute global tags
+        with tracer.span("substitute_global_tags"):
+            substitute_global_tags(task)
+        # create the installer binary
+        if task.online_installer or task.offline_installer:
+            with tracer.span("create_installer_binary"):
+                create_installer_binary(task)
+            # for mac we need some extra work
+            if is_macos():
+                with tracer.span("create_mac_disk_image"):
+                    create_mac_disk_image(task)
+        if task.create_repository:
+            with tracer.span("create_online_repository"):
+                create_online_repository(task)
+        # the background removals must not outlive the run, a killed process leaves trash behind
+        with tracer.span("drain_tree_removals"):
+            if not drain_tree_removals():
+                log.warning("Some of the removed work directories could not be deleted")
+    finally:
+        if task.trace_file:
+            tracer.write(task.trace_file)
+            tracer.log_summary()
 
 
 def str2bool(value: str) -> bool:
@@ -915,6 +1363,7 @@ class QtInstallerTask:
     installer_name: str = ""
     packages_dir_name_list: List[str] = field(default_factory=list)
     substitutions: List[List[str]] = field(default_factory=list)
+    substitution_table: SubstitutionTable = field(default_factory=SubstitutionTable)
     directories_for_substitutions: List[str] = field(default_factory=list)
     sdk_component_list: List[SdkComponent] = field(default_factory=list)
     sdk_component_list_skipped: List[SdkComponent] = field(default_factory=list)
@@ -934,6 +1383,13 @@ class QtInstallerTask:
     force_version_number_increase: bool = False
     version_number_auto_increase_value: str = "-" + strftime("%Y%m%d%H%M", gmtime())
     max_cpu_count: int = 8
+    max_download_count: int = 8
+    stream_extract: bool = True
+    repack_stream: bool = True
+    archive_cache: Optional[FileCache] = None
+    archive_window: Optional[ArchiveWindow] = None
+    trace_file: str = ""
+    tracer: Tracer = field(default_factory=lambda: Tracer(enabled=False))
     substitution_list: List[str] = field(default_factory=list)
 
     def __post_init__(self) -> None:
@@ -947,9 +1403,16 @@ class QtInstallerTask:
             self.config.get("PackageTemplates", "template_dirs"), self.configurations_dir
         )
         self._parse_substitutions()
+        self.substitution_table = SubstitutionTable(self.substitutions)
+        if self.trace_file:
+            self.tracer.enabled = True
+        if self.archive_cache is None and os.getenv(ARCHIVE_CACHE_DIR_ENV):
+            self.archive_cache = FileCache(
+                os.environ[ARCHIVE_CACHE_DIR_ENV], os.getenv(ARCHIVE_CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE)
+            )
         if self.archive_location_resolver is None:
             self.archive_location_resolver = ArchiveLocationResolver(
-                self.config, self.archive_base_url, self.configurations_dir, self.substitutions
+                self.config, self.archive_base_url, self.configurations_dir, self.substitution_table
             )
 
     def __str__(self) -> str:
@@ -976,7 +1439,12 @@ class QtInstallerTask:
   Build timestamp: {self.build_timestamp}
   Force version number increase: {self.force_version_number_increase}
   Version number auto increase value: {self.version_number_auto_increase_value}
-  Mac cpu count: {self.max_cpu_count}"""
+  Mac cpu count: {self.max_cpu_count}
+  Max download count: {self.max_download_count}
+  Stream extract: {self.stream_extract}
+  Repack stream: {self.repack_stream}
+  Archive cache: {self.archive_cache.cache_dir if self.archive_cache else None}
+  Trace file: {self.trace_file}"""
 
     def _parse_substitutions(self) -> None:
         for item in self.substitution_list:  # pylint: disable=not-an-iterable
@@ -1114,9 +1582,33 @@ def main() -> None:
 
     parser.add_argument("--max-cpu-count", dest="max_cpu_count", type=int, default=8,
                         help="Set maximum number of CPU's used on packaging")
+    parser.add_argument("--max-download-count", dest="max_download_count", type=int, default=8,
+                        help="Set maximum number of parallel downloads used on packaging")
+
+    parser.add_argument("--no-stream-extract", dest="stream_extract", action='store_false', default=True,
+                        help="Download remote tar archives to disk before extracting them")
+    parser.add_argument("--no-repack-stream", dest="repack_stream", action='store_false', default=True,
+                        help="Always extract and recompress tar archives needing only path changes")
+    parser.add_argument("--archive-cache-dir", dest="archive_cache_dir", type=str,
+                        default=os.getenv(ARCHIVE_CACHE_DIR_ENV),
+                        help="Persistent cache directory for repacked data archives, shared between runs")
+    parser.add_argument("--archive-cache-size", dest="archive_cache_size", type=str,
+                        default=os.getenv(ARCHIVE_CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE),
+                        help="Maximum size of the repacked archive cache, e.g. '512M' or '50G'")
+    parser.add_argument("--download-cache-dir", dest="download_cache_dir", type=str,
+                        default=os.getenv(DOWNLOAD_CACHE_DIR_ENV),
+                        help="Persistent cache directory for downloaded archives, shared between runs")
+    parser.add_argument("--download-cache-size", dest="download_cache_size", type=str,
+                        default=os.getenv(DOWNLOAD_CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE),
+                        help="Maximum size of the download cache, e.g. '512M' or '50G'")
+    parser.add_argument("--trace-file", dest="trace_file", type=str, default="",
+                        help="Write a timing trace of the phases and archives, open it in chrome://tracing or Perfetto")
 
     args = parser.parse_args(sys.argv[1:])
 
+    if args.download_cache_dir:
+        set_download_cache(DownloadCache(args.download_cache_dir, args.download_cache_size))
+
     task: QtInstallerTask = QtInstallerTask(
         configurations_dir=args.configurations_dir,
         configuration_file=args.configuration_file,
@@ -1136,7 +1628,12 @@ def main() -> None:
         remove_debug_information_files=args.remove_debug_information_files,
         remove_debug_libraries=args.remove_debug_libraries,
         remove_pdb_files=args.remove_pdb_files,
-        max_cpu_count=args.max_cpu_count
+        max_cpu_count=args.max_cpu_count,
+        max_download_count=args.max_download_count,
+        stream_extract=args.stream_extract,
+        repack_stream=args.repack_stream,
+        trace_file=args.trace_file,
+        archive_cache=FileCache(args.archive_cache_dir, args.archive_cache_size) if args.archive_cache_dir else None,
     )
     log.info(str(task))
     create_installer(task)
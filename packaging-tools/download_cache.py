@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from sys import platform
+from typing import BinaryIO, Callable, Dict, Generator, Optional, Set, Union
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from logging_util import init_logger
+
+if platform != "win32":
+    import fcntl
+
+log = init_logger(__name__, debug_mode=False)
+
+DOWNLOAD_CACHE_DIR_ENV = "QT_PACKAGING_DOWNLOAD_CACHE"
+DOWNLOAD_CACHE_SIZE_ENV = "QT_PACKAGING_DOWNLOAD_CACHE_SIZE"
+DEFAULT_CACHE_SIZE = "50G"
+CACHEABLE_URL_SCHEMES = ("http", "https", "ftp")
+# ioctl request number for FICLONE on Linux, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+COPY_BUFFER_SIZE = 1048576
+
+
+class DownloadCacheError(Exception):
+    pass
+
+
+def parse_size(size: Union[str, int]) -> int:
+    """Convert a size string such as '512M' or '50G' into bytes"""
+    if isinstance(size, int):
+        return size
+    match = re.fullmatch(r"\s*(\d+)\s*([kKmMgGtT]?)[bB]?\s*", size)
+    if not match:
+        raise DownloadCacheError(f"Invalid cache size: '{size}'")
+    exponent = " KMGT".index(match.group(2).upper() or " ")
+    return int(match.group(1)) << (10 * exponent)
+
+
+def reflink(source: Union[str, Path], target: Union[str, Path]) -> bool:
+    """Create a copy-on-write clone of the source file, return False if not supported"""
+    if platform != "linux":
+        return False
+    try:
+        with open(source, "rb") as src_handle, open(target, "wb") as dst_handle:
+            fcntl.ioctl(dst_handle.fileno(), FICLONE, src_handle.fileno())
+        return True
+    except OSError:
+        with suppress(FileNotFoundError):
+            os.remove(target)
+        return False
+
+
+def clone_file(source: BinaryIO, target: Union[str, Path]) -> None:
+    """
+    Place the content of the opened source file to target path using reflink or copy
+
+    A hardlink is never used, a chmod or an in-place write of the target would modify the blob.
+    """
+    with open(target, "wb") as dst_handle:
+        if platform == "linux":
+            with suppress(OSError):
+                fcntl.ioctl(dst_handle.fileno(), FICLONE, source.fileno())
+                return
+        source.seek(0)
+        shutil.copyfileobj(source, dst_handle, COPY_BUFFER_SIZE)
+
+
+def file_sha1(file_path: Union[str, Path], block_size: int = 1048576) -> str:
+    sha1 = hashlib.sha1()
+    with open(file_path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def url_validator(url: str) -> Optional[str]:
+    """
+    Return a string identifying the current version of the remote content
+
+    The ETag or Last-Modified headers are preferred. If the server provides neither, a sidecar
+    '<url>.sha1' file is tried. None is returned if the content can not be identified.
+    """
+    try:
+        with urlopen(Request(url, method="HEAD")) as response:
+            headers = response.info()
+            etag = headers.get("ETag")
+            last_modified = headers.get("Last-Modified")
+            content_length = headers.get("Content-Length")
+    except Exception:
+        return None
+    if etag:
+        return f"etag:{etag.strip()}"
+    if last_modified:
+        return f"last-modified:{last_modified.strip()}:{content_length}"
+    try:
+        with urlopen(url + ".sha1") as response:
+            sha1 = response.read(1024).decode("utf-8").split()[0].lower()
+        if re.fullmatch(r"[0-9a-f]{40}", sha1):
+            return f"sha1:{sha1}"
+    except Exception:
+        pass
+    return None
+
+
+class FileCache:
+    """
+    Size bounded content addressed file store with LRU eviction
+
+    Blobs are stored by their SHA1 under 'blobs/' and looked up through key files under 'keys/'
+    which contain the digest of the blob. The blob modification time is refreshed on every hit
+    and the least recently used blobs are evicted first when the size limit is exceeded.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], max_size: Union[str, int]) -> None:
+        self.cache_dir = Path(cache_dir).resolve()
+        self.max_size = parse_size(max_size)
+        self.blob_dir = self.cache_dir / "blobs"
+        self.key_dir = self.cache_dir / "keys"
+        self.tmp_dir = self.cache_dir / "tmp"
+        for directory in (self.blob_dir, self.key_dir, self.tmp_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._lock_depth = 0
+
+    @contextmanager
+    def locked(self) -> Generator[None, None, None]:
+        """Serialize cache index modifications between threads and processes"""
+        with self._lock:
+            # flock is bound to the open file description, take it only on the outermost level
+            if platform == "win32" or self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self.cache_dir / "lock", "a+", encoding="utf-8") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def key_lock(self, key: str) -> threading.Lock:
+        """Return a lock dedicated for the given key so the same content is fetched only once"""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _key_path(self, key: str) -> Path:
+        return self.key_dir / hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def new_tmp_path(self, suffix: str = "") -> Path:
+        """Return an unique path inside the cache for content not yet stored"""
+        return self.tmp_dir / (uuid.uuid4().hex + suffix)
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the blob path for the key or None, refreshing its LRU position"""
+        try:
+            digest = self._key_path(key).read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return None
+        blob = self._blob_path(digest)
+        try:
+            os.utime(blob)
+        except FileNotFoundError:
+            return None
+        return blob
+
+    def open_blob(self, key: str) -> Optional[BinaryIO]:
+        """
+        Return the blob of the key opened for reading or None
+
+        The open file stays readable even if the blob is evicted meanwhile, so the content can be
+        copied without holding the cache lock.
+        """
+        with self.locked():
+            blob = self.lookup(key)
+            if blob is None:
+                return None
+            try:
+                return open(blob, "rb")  # pylint: disable=consider-using-with
+            except FileNotFoundError:
+                return None
+
+    def store(self, key: str, source: Union[str, Path], digest: Optional[str] = None) -> Path:
+        """Move the source file into the cache under the given key, return the blob path"""
+        digest = digest or file_sha1(source)
+        blob = self._blob_path(digest)
+        with self.locked():
+            if blob.is_file():
+                Path(source).unlink()
+                os.utime(blob)
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(source, blob)
+            key_tmp = self.new_tmp_path(".key")
+            key_tmp.write_text(digest, encoding="utf-8")
+            os.replace(key_tmp, self._key_path(key))
+            self.evict(keep=blob)
+        return blob
+
+    def evict(self, keep: Optional[Path] = None) -> None:
+        """Remove the least recently used blobs until the cache fits into the size limit"""
+        with self.locked():
+            blobs = []
+            for blob in self.blob_dir.glob("*/*"):
+                try:
+                    blobs.append((blob.stat(), blob))
+                except FileNotFoundError:
+                    continue
+            total_size = sum(stat.st_size for stat, _ in blobs)
+            evicted = set()
+            for stat, blob in sorted(blobs, key=lambda item: item[0].st_mtime):
+                if total_size <= self.max_size:
+                    break
+                if blob == keep:
+                    continue
+                log.info("Evicting from download cache: %s", blob)
+                try:
+                    blob.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as error:
+                    # e.g. still open for a copy on Windows, evicted later
+                    log.warning("Unable to evict %s: %s", blob, error)
+                    continue
+                evicted.add(blob.name)
+                total_size -= stat.st_size
+            if evicted:
+                self._remove_keys(evicted)
+
+    def _remove_keys(self, digests: Set[str]) -> None:
+        """Remove the key files pointing to the given blob digests"""
+        for key_file in self.key_dir.iterdir():
+            with suppress(FileNotFoundError):
+                if key_file.read_text(encoding="utf-8").strip() in digests:
+                    key_file.unlink()
+
+
+class DownloadCache(FileCache):
+    """FileCache keyed by URL and the remote content validator"""
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        max_size: Union[str, int] = DEFAULT_CACHE_SIZE,
+        validator: Callable[[str], Optional[str]] = url_validator,
+    ) -> None:
+        super().__init__(cache_dir, max_size)
+        self.validator = validator
+
+    def fetch(self, url: str, target: str, download_function: Callable[[str, str], None]) -> bool:
+        """
+        Place the content of the url to target from the cache
+
+        On a cache miss the content is downloaded into the cache first with download_function.
+        Return False if the url content can not be cached, the caller should download it then.
+        """
+        if urlparse(url).scheme not in CACHEABLE_URL_SCHEMES:
+            return False
+        validator = self.validator(url)
+        if validator is None:
+            log.info("Unable to validate '%s', bypassing the download cache", url)
+            return False
+        key = f"{url}\n{validator}"
+        with self.key_lock(key):
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            # the blob is opened under the cache lock, evict() of another process could remove it,
+            # the possibly long copy runs without blocking the other users of the cache
+            handle = self.open_blob(key)
+            if handle is not None:
+                log.info("Download cache hit for '%s'", url)
+                with handle:
+                    clone_file(handle, target)
+                return True
+            tmp_file = self.new_tmp_path()
+            try:
+                download_function(url, str(tmp_file))
+                digest = file_sha1(tmp_file)
+                if validator.startswith("sha1:") and validator != f"sha1:{digest}":
+                    raise DownloadCacheError(f"Checksum mismatch for '{url}': {digest}")
+                with self.locked():
+                    self.store(key, tmp_file, digest)
+                    handle = self.open_blob(key)
+                if handle is None:
+                    raise DownloadCacheError(f"Stored content of '{url}' missing from the cache")
+                with handle:
+                    clone_file(handle, target)
+            finally:
+                with suppress(FileNotFoundError):
+                    tmp_file.unlink()
+        return True
+
+
+_download_cache: Optional[DownloadCache] = None  # pylint: disable=invalid-name
+_download_cache_initialized = False  # pylint: disable=invalid-name
+_download_cache_lock = threading.Lock()
+
+
+def set_download_cache(cache: Optional[DownloadCache]) -> None:
+    """Set the cache used by bld_utils.download, None disables caching"""
+    global _download_cache, _download_cache_initialized  # pylint: disable=W0603,C0103
+    _download_cache = cache
+    _download_cache_initialized = True
+
+
+def get_download_cache() -> Optional[DownloadCache]:
+    """Return the active download cache, initialized from the environment on first use"""
+    if not _download_cache_initialized:
+        with _download_cache_lock:
+            # concurrent first callers must all end up with the same cache
+            if not _download_cache_initialized:
+                cache_dir = os.environ.get(DOWNLOAD_CACHE_DIR_ENV)
+                cache_size = os.environ.get(DOWNLOAD_CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE)
+                set_download_cache(DownloadCache(cache_dir, cache_size) if cache_dir else None)
+    return _download_cache
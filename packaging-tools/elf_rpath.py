@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Union
+
+from logging_util import init_logger
+
+log = init_logger(__name__, debug_mode=False)
+
+ELF_MAGIC = b"\x7fELF"
+# e_ident[EI_CLASS] and e_ident[EI_DATA] values
+ELFCLASS32, ELFCLASS64 = 1, 2
+ELFDATA2LSB, ELFDATA2MSB = 1, 2
+PT_LOAD, PT_DYNAMIC = 1, 2
+DT_NULL, DT_STRTAB, DT_RPATH, DT_RUNPATH = 0, 5, 15, 29
+DYNAMIC_TAG_NAMES = {DT_RPATH: "RPATH", DT_RUNPATH: "RUNPATH"}
+
+Buffer = Union[bytes, mmap.mmap]
+
+# (e_phoff, e_phentsize, e_phnum) header formats, program header format and dynamic entry format
+_ELF_LAYOUTS = {
+    ELFCLASS32: ("16xHHIIIIIHHH", "IIIIIIII", "iI"),
+    ELFCLASS64: ("16xHHIQQQIHHH", "IIQQQQQQ", "qQ"),
+}
+
+
+class ElfError(IOError):
+    pass
+
+
+@dataclass
+class ElfRPath:
+    """The RPATH or RUNPATH string of an ELF file and its location inside the file"""
+
+    path: str
+    tag: str
+    value: str
+    offset: int
+
+    @property
+    def space(self) -> int:
+        """The longest value which fits into the string table without moving other strings"""
+        return len(self.value.encode("utf-8"))
+
+
+def _parse_program_headers(data: Buffer) -> Tuple[str, List[Tuple[int, int, int, int]], str]:
+    """Return the struct byte order, (p_type, p_offset, p_vaddr, p_filesz) and dynamic entry format"""
+    elf_class, elf_data = data[4], data[5]
+    if elf_class not in _ELF_LAYOUTS or elf_data not in (ELFDATA2LSB, ELFDATA2MSB):
+        raise ElfError(f"Unsupported ELF class {elf_class} or data encoding {elf_data}")
+    order = "<" if elf_data == ELFDATA2LSB else ">"
+    header_format, phdr_format, dyn_format = _ELF_LAYOUTS[elf_class]
+    header = struct.unpack_from(order + header_format, data)
+    phoff, phentsize, phnum = header[4], header[8], header[9]
+    headers = []
+    for index in range(phnum):
+        fields = struct.unpack_from(order + phdr_format, data, phoff + index * phentsize)
+        if elf_class == ELFCLASS64:
+            p_type, _, p_offset, p_vaddr, _, p_filesz = fields[:6]
+        else:
+            p_type, p_offset, p_vaddr, _, p_filesz = fields[:5]
+        headers.append((p_type, p_offset, p_vaddr, p_filesz))
+    return order, headers, dyn_format
+
+
+def _vaddr_to_offset(headers: List[Tuple[int, int, int, int]], address: int) -> int:
+    for p_type, p_offset, p_vaddr, p_filesz in headers:
+        if p_type == PT_LOAD and p_vaddr <= address < p_vaddr + p_filesz:
+            return address - p_vaddr + p_offset
+    raise ElfError(f"Address {address:#x} is not inside a loadable segment")
+
+
+def parse_elf_rpath(path: Union[str, "os.PathLike[str]"], data: Buffer) -> Optional[ElfRPath]:
+    """Find the first RPATH or RUNPATH entry from the dynamic section of the ELF file content"""
+    if data[:4] != ELF_MAGIC:
+        return None
+    try:
+        order, headers, dyn_format = _parse_program_headers(data)
+        dynamic = [(p_offset, p_filesz) for p_type, p_offset, _, p_filesz in headers if p_type == PT_DYNAMIC]
+        if not dynamic:
+            return None
+        dyn_offset, dyn_size = dynamic[0]
+        strtab, rpath = None, None
+        entry_size = struct.calcsize(order + dyn_format)
+        for offset in range(dyn_offset, dyn_offset + dyn_size - entry_size + 1, entry_size):
+            tag, value = struct.unpack_from(order + dyn_format, data, offset)
+            if tag == DT_NULL:
+                break
+            if tag == DT_STRTAB:
+                strtab = value
+            elif tag in DYNAMIC_TAG_NAMES and rpath is None:
+                rpath = (DYNAMIC_TAG_NAMES[tag], value)
+        if rpath is None or strtab is None:
+            return None
+        string_offset = _vaddr_to_offset(headers, strtab) + rpath[1]
+        end = data.find(b"\0", string_offset)
+        if end == -1:
+            raise ValueError("Unterminated string")
+    except (struct.error, ValueError) as err:
+        raise ElfError(f"Malformed ELF file: {path}") from err
+    value = data[string_offset:end].decode("utf-8", errors="surrogateescape")
+    return ElfRPath(os.fspath(path), rpath[0], value, string_offset)
+
+
+def read_elf_rpath(path: Union[str, "os.PathLike[str]"]) -> Optional[ElfRPath]:
+    """Return the RPATH or RUNPATH of the file, None for files without one or non-ELF files"""
+    with open(path, "rb") as handle:
+        if handle.read(4) != ELF_MAGIC:
+            return None
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return parse_elf_rpath(path, data)
+
+
+def write_elf_rpath(rpath: ElfRPath, new_value: str) -> None:
+    """Overwrite the rpath string in place, the new value has to fit into the space of the old one"""
+    encoded = new_value.encode("utf-8", errors="surrogateescape")
+    if len(encoded) > rpath.space:
+        log.warning("Warning - Not able to process RPath for file: %s", rpath.path)
+        log.warning("New RPath [%s] length: %s", new_value, len(encoded))
+        log.warning("Space available inside the binary: %s", rpath.space)
+        raise ElfError(f"New {rpath.tag} does not fit into {rpath.path}")
+    with open(rpath.path, "r+b") as handle:
+        handle.seek(rpath.offset)
+        # pad with NUL bytes like chrpath does so the old value does not leak past the terminator
+        handle.write(encoded + b"\0" * (rpath.space - len(encoded) + 1))
+    rpath.value = new_value
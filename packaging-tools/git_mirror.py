@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from subprocess import CalledProcessError
+from sys import platform
+from typing import Dict, Generator, List, Optional, Set, Tuple, Union
+
+from logging_util import init_logger
+from runner import run_cmd
+
+if platform != "win32":
+    import fcntl
+
+log = init_logger(__name__, debug_mode=False)
+
+GIT_MIRROR_DIR_ENV = "QT_PACKAGING_GIT_MIRROR_DIR"
+# the mirrors track branches and tags only, other refs are fetched on demand under MIRROR_REF_PREFIX
+MIRROR_FETCH_REFSPECS = ("+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*")
+MIRROR_REF_PREFIX = "refs/mirror/"
+
+
+class GitMirrorError(Exception):
+    pass
+
+
+def resolve_submodule_url(repo_url: str, url: str) -> str:
+    """Resolve a relative submodule url against the url of the superproject like git does"""
+    if not url.startswith(("./", "../")):
+        return url
+    parts = repo_url.rstrip("/").split("/")
+    for part in url.split("/"):
+        if part == "..":
+            parts.pop()
+        elif part != ".":
+            parts.append(part)
+    return "/".join(parts)
+
+
+class GitMirrorCache:
+    """
+    Persistent bare mirrors of remote repositories shared between the jobs of a host
+
+    A mirror is fetched the first time it is used in a process. Checkouts are cloned from the
+    mirror with '--shared' so no objects are copied, and submodules borrow the objects of their
+    own mirrors with '--reference'. Refs are never pruned from the mirrors so the objects used
+    by existing checkouts stay reachable.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path]) -> None:
+        self.cache_dir = Path(cache_dir).resolve()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._fetched: Set[str] = set()
+
+    def mirror_path(self, url: str) -> Path:
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", url.rstrip("/").split("/")[-1])
+        if name.endswith(".git"):
+            name = name[:-4]
+        return self.cache_dir / f"{name}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}.git"
+
+    @contextmanager
+    def locked(self, url: str) -> Generator[Path, None, None]:
+        """Serialize the updates of the mirror of the url between threads and processes"""
+        mirror = self.mirror_path(url)
+        with self._lock:
+            url_lock = self._url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            if platform == "win32":
+                yield mirror
+                return
+            with open(f"{mirror}.lock", "a+", encoding="utf-8") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield mirror
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _git(self, mirror: Path, args: List[str]) -> str:
+        return run_cmd(cmd=["git", "--git-dir", str(mirror)] + args)
+
+    def _rev_parse(self, mirror: Path, ref: str) -> Optional[str]:
+        try:
+            return self._git(mirror, ["rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}"]).strip()
+        except CalledProcessError:
+            return None
+
+    def update(self, url: str, ref: Optional[str] = None) -> Tuple[Path, Optional[str]]:
+        """
+        Create or fetch the mirror of the url, return the mirror path and the sha1 of the ref
+
+        The mirror is fetched once per process. A ref which is not a branch or a tag of the
+        mirror, e.g. a review ref or a sha1, is fetched separately.
+        """
+        with self.locked(url) as mirror:
+            if not mirror.exists():
+                log.info("Creating git mirror of '%s' into: %s", url, mirror)
+                tmp_mirror = mirror.with_name(f".{mirror.name}.{uuid.uuid4().hex}")
+                try:
+                    run_cmd(cmd=["git", "init", "--bare", str(tmp_mirror)])
+                    self._git(tmp_mirror, ["config", "remote.origin.url", url])
+                    for refspec in MIRROR_FETCH_REFSPECS:
+                        self._git(tmp_mirror, ["config", "--add", "remote.origin.fetch", refspec])
+                    self._git(tmp_mirror, ["fetch", "--quiet", "origin"])
+                    os.replace(tmp_mirror, mirror)
+                finally:
+                    shutil.rmtree(tmp_mirror, ignore_errors=True)
+                self._fetched.add(url)
+            elif url not in self._fetched:
+                log.info("Fetching git mirror of '%s': %s", url, mirror)
+                self._git(mirror, ["fetch", "--quiet", "origin"])
+                self._fetched.add(url)
+            if ref is None:
+                return mirror, None
+            sha1 = self._rev_parse(mirror, ref)
+            if sha1 is None:
+                mirror_ref = MIRROR_REF_PREFIX + re.sub(r"^refs/", "", ref)
+                self._git(mirror, ["fetch", "--quiet", "origin", f"+{ref}:{mirror_ref}"])
+                sha1 = self._rev_parse(mirror, mirror_ref)
+            if sha1 is None:
+                raise GitMirrorError(f"Unable to find '{ref}' from: {url}")
+            return mirror, sha1
+
+    def clone(
+        self,
+        url: str,
+        ref: str,
+        destination: str,
+        init_subrepos: bool = False,
+        recursive: bool = False,
+        config: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Check out the ref of the url into the destination using the mirror objects"""
+        mirror, sha1 = self.update(url, ref)
+        assert sha1 is not None
+        config_args = [arg for key, value in (config or {}).items() for arg in ("--config", f"{key}={value}")]
+        run_cmd(cmd=["git", "clone", "--shared", "--no-checkout"] + config_args + [str(mirror), destination])
+        if self._rev_parse(mirror, f"refs/heads/{ref}") == sha1:
+            run_cmd(cmd=["git", "checkout", "-B", ref, "--track", f"origin/{ref}"], cwd=destination)
+        else:
+            run_cmd(cmd=["git", "checkout", "--quiet", "--detach", sha1], cwd=destination)
+        run_cmd(cmd=["git", "remote", "set-url", "origin", url], cwd=destination)
+        if init_subrepos:
+            self.update_submodules(url, destination, recursive)
+
+    def update_submodules(self, url: str, checkout_dir: str, recursive: bool = False) -> None:
+        """Initialize the submodules of the checkout, each referencing its own mirror"""
+        if not os.path.isfile(os.path.join(checkout_dir, ".gitmodules")):
+            return
+        output = run_cmd(
+            cmd=["git", "config", "-f", ".gitmodules", "--get-regexp", r"^submodule\..*\.(path|url)$"],
+            cwd=checkout_dir,
+        )
+        submodules: Dict[str, Dict[str, str]] = {}
+        for line in output.splitlines():
+            key, _, value = line.partition(" ")
+            name, _, attribute = key[len("submodule."):].rpartition(".")
+            submodules.setdefault(name, {})[attribute] = value
+        run_cmd(cmd=["git", "submodule", "init"], cwd=checkout_dir)
+        for submodule in submodules.values():
+            submodule_url = resolve_submodule_url(url, submodule["url"])
+            mirror, _ = self.update(submodule_url)
+            run_cmd(
+                cmd=["git", "submodule", "update", "--reference", str(mirror), "--", submodule["path"]],
+                cwd=checkout_dir,
+            )
+            if recursive:
+                self.update_submodules(submodule_url, os.path.join(checkout_dir, submodule["path"]), recursive)
+
+    def archive(self, url: str, ref: str, archive_name: str) -> None:
+        """Run git archive for the ref straight from the mirror"""
+        mirror, sha1 = self.update(url, ref)
+        self._git(mirror, ["--no-pager", "archive", "-o", archive_name, sha1 or ref])
+
+
+_git_mirror_cache: Optional[GitMirrorCache] = None  # pylint: disable=invalid-name
+_git_mirror_cache_initialized = False  # pylint: disable=invalid-name
+
+
+def set_git_mirror_cache(cache: Optional[GitMirrorCache]) -> None:
+    """Set the mirror cache used by clone_repository and git_archive_repo, None disables it"""
+    global _git_mirror_cache, _git_mirror_cache_initialized  # pylint: disable=W0603,C0103
+    _git_mirror_cache = cache
+    _git_mirror_cache_initialized = True
+
+
+def get_git_mirror_cache() -> Optional[GitMirrorCache]:
+    """Return the active mirror cache, initialized from QT_PACKAGING_GIT_MIRROR_DIR on first use"""
+    if not _git_mirror_cache_initialized:
+        cache_dir = os.environ.get(GIT_MIRROR_DIR_ENV)
+        set_git_mirror_cache(GitMirrorCache(cache_dir) if cache_dir else None)
+    return _git_mirror_cache
@@ -37,7 +37,7 @@ from typing import List, Optional
 
 from bldinstallercommon import create_qt_download_task, patch_qt, remove_tree
 from logging_util import init_logger
-from threadedwork import ThreadedWork
+from threadedwork import TaskExecutor
 
 log = init_logger(__name__, debug_mode=False)
 
@@ -96,7 +96,7 @@ def install_qt(
     if not qt_modules:
         raise SystemExit("No modules specified in qt_modules")
     qt_path = os.path.abspath(qt_path)
-    dl_pkgs_work = ThreadedWork("get and extract Qt 5 binaries")
+    dl_pkgs_work = TaskExecutor("get and extract Qt 5 binaries")
     need_to_install_qt = not os.path.lexists(qt_path)
     if need_to_install_qt:
         opts = argparse.Namespace(
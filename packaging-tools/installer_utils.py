@@ -31,12 +31,12 @@
 
 import os
 from contextlib import contextmanager
-from fnmatch import fnmatch
 from typing import Any, Generator, List
 from urllib.parse import urlparse
 
 import wget  # type: ignore
 
+from archive_engine import ArchiveError, extract_command
 from logging_util import init_logger
 from runner import run_cmd
 
@@ -77,11 +77,10 @@ def download_archive(url: str, dest_dir: str) -> str:
 
 
 def get_extract_cmd(artifact: str) -> List[str]:
-    if artifact.endswith(".7z") or artifact.endswith(".zip"):
-        return ['7z', 'x', artifact]
-    if any(fnmatch(artifact, p) for p in ["*.tar*", "*.tgz"]):
-        return ['tar', '-xf', artifact]
-    raise PackagingError(f"Could not find suitable extractor for: {artifact}")
+    try:
+        return extract_command(artifact)
+    except ArchiveError as err:
+        raise PackagingError(str(err)) from err
 
 
 async def extract_archive(artifact: str, destination_dir: str) -> None:
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+
+import atexit
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from subprocess import CalledProcessError
+from typing import Any, Dict, Generator, List, Optional, Sequence, Union
+
+from logging_util import init_logger
+
+try:
+    import resource
+except ImportError:  # not available on Windows, only wall time and exit status are recorded
+    resource = None  # type: ignore
+
+log = init_logger(__name__, debug_mode=False)
+
+PROCESS_ACCOUNTING_ENV = "QT_PACKAGING_PROCESS_ACCOUNTING"
+# ru_inblock and ru_oublock count 512 byte blocks
+RUSAGE_BLOCK_SIZE = 512
+
+
+@dataclass
+class CommandRecord:
+    """
+    Resources used by one external command
+
+    The cpu, rss and block counts are the change of the RUSAGE_CHILDREN usage while the command
+    ran. Commands marked concurrent overlapped with other accounted commands and share them.
+    max_rss_kb is 0 when the command stayed below the largest child reaped before it.
+    """
+
+    program: str
+    cwd: str
+    wall_time: float = 0.0
+    user_time: float = 0.0
+    system_time: float = 0.0
+    max_rss_kb: int = 0
+    read_bytes: int = 0
+    write_bytes: int = 0
+    exit_code: Optional[int] = None
+    concurrent: bool = False
+
+
+def _children_usage() -> Any:
+    return resource.getrusage(resource.RUSAGE_CHILDREN) if resource is not None else None
+
+
+def _rss_kb(max_rss: int) -> int:
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return max_rss // 1024 if sys.platform == "darwin" else max_rss
+
+
+class ProcessAccounting:
+    """Record the wall time, cpu time, peak memory and block I/O of external commands"""
+
+    def __init__(self) -> None:
+        self.records: List[CommandRecord] = []
+        self._lock = threading.Lock()
+        self._active: Dict[int, CommandRecord] = {}
+
+    @contextmanager
+    def account(self, args: Union[Sequence[str], str], cwd: Optional[Union[str, Path]] = None) -> Generator[CommandRecord, None, None]:
+        """Account the command run in the enclosed block, set exit_code on the yielded record"""
+        program = args.split(" ", 1)[0] if isinstance(args, str) else str(args[0]) if args else ""
+        record = CommandRecord(os.path.basename(program), str(cwd or os.getcwd()))
+        with self._lock:
+            if self._active:
+                record.concurrent = True
+                for active in self._active.values():
+                    active.concurrent = True
+            self._active[id(record)] = record
+            self.records.append(record)
+        before = _children_usage()
+        start = time.perf_counter()
+        try:
+            yield record
+        except CalledProcessError as err:
+            record.exit_code = err.returncode
+            raise
+        except BaseException:
+            if record.exit_code is None:
+                record.exit_code = -1
+            raise
+        finally:
+            record.wall_time = time.perf_counter() - start
+            after = _children_usage()
+            if before is not None and after is not None:
+                record.user_time = after.ru_utime - before.ru_utime
+                record.system_time = after.ru_stime - before.ru_stime
+                if after.ru_maxrss > before.ru_maxrss:
+                    record.max_rss_kb = _rss_kb(after.ru_maxrss)
+                record.read_bytes = (after.ru_inblock - before.ru_inblock) * RUSAGE_BLOCK_SIZE
+                record.write_bytes = (after.ru_oublock - before.ru_oublock) * RUSAGE_BLOCK_SIZE
+            if record.exit_code is None:
+                record.exit_code = 0
+            with self._lock:
+                self._active.pop(id(record), None)
+
+    def summary(self, count: int = 10) -> List[Dict[str, Any]]:
+        """Return the recorded commands aggregated by program, the most time consuming first"""
+        programs: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for record in self.records:
+                item = programs.setdefault(record.program, {
+                    "program": record.program, "calls": 0, "failures": 0, "wall_time": 0.0,
+                    "user_time": 0.0, "system_time": 0.0, "max_rss_kb": 0, "read_bytes": 0,
+                    "write_bytes": 0,
+                })
+                item["calls"] += 1
+                item["failures"] += 1 if record.exit_code else 0
+                for key in ("wall_time", "user_time", "system_time", "read_bytes", "write_bytes"):
+                    item[key] += getattr(record, key)
+                item["max_rss_kb"] = max(item["max_rss_kb"], record.max_rss_kb)
+        return sorted(programs.values(), key=lambda item: item["wall_time"], reverse=True)[:count]
+
+    def log_report(self, count: int = 10) -> None:
+        summary = self.summary(count)
+        if not summary:
+            return
+        log.info("Top %s commands by wall time:", len(summary))
+        log.info("%10s %10s %10s %10s %10s %10s %6s  %s", "wall", "user", "sys", "max rss",
+                 "read", "written", "calls", "program")
+        for item in summary:
+            log.info(
+                "%9.1fs %9.1fs %9.1fs %8dMB %8dMB %8dMB %6d  %s%s", item["wall_time"],
+                item["user_time"], item["system_time"], item["max_rss_kb"] // 1024,
+                item["read_bytes"] // 2 ** 20, item["write_bytes"] // 2 ** 20, item["calls"],
+                item["program"], f" ({item['failures']} failed)" if item["failures"] else "",
+            )
+
+
+_process_accounting: Optional[ProcessAccounting] = None  # pylint: disable=invalid-name
+_process_accounting_initialized = False  # pylint: disable=invalid-name
+
+
+def set_process_accounting(accounting: Optional[ProcessAccounting]) -> None:
+    """Set the accounting used by the command runners, None disables accounting"""
+    global _process_accounting, _process_accounting_initialized  # pylint: disable=W0603,C0103
+    _process_accounting = accounting
+    _process_accounting_initialized = True
+
+
+def get_process_accounting() -> Optional[ProcessAccounting]:
+    """Return the active accounting, enabled from the environment on first use"""
+    if not _process_accounting_initialized:
+        accounting = None
+        if os.environ.get(PROCESS_ACCOUNTING_ENV, "") not in ("", "0"):
+            accounting = ProcessAccounting()
+            atexit.register(accounting.log_report)
+        set_process_accounting(accounting)
+    return _process_accounting
+
+
+@contextmanager
+def account_command(args: Union[Sequence[str], str], cwd: Optional[Union[str, Path]] = None) -> Generator[CommandRecord, None, None]:
+    """Account the command with the active accounting, records nothing when it is disabled"""
+    accounting = get_process_accounting()
+    if accounting is None:
+        yield CommandRecord("", "")
+        return
+    with accounting.account(args, cwd) as record:
+        yield record
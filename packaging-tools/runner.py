@@ -32,19 +32,31 @@
 import asyncio
 import os
 import shlex
+import signal
 import subprocess
 import sys
 from asyncio import create_subprocess_exec, wait_for
 from asyncio.subprocess import PIPE, STDOUT
+from collections import deque
+from contextlib import ExitStack
 from io import TextIOWrapper
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from threading import Timer
+from typing import IO, Callable, Deque, Dict, List, Optional, Tuple, Union
 
 from bld_utils import is_windows
 from logging_util import init_logger, with_no_logging
+from process_accounting import account_command
 
 log = init_logger(__name__, debug_mode=False)
 
+# lines of output returned by run_cmd in streaming mode
+RUN_CMD_TAIL_LINES = 1000
+# limit for the count of subprocesses run_cmd_async runs at the same time
+MAX_PROCESSES_ENV = "QT_PACKAGING_MAX_PROCESSES"
+# the longest single line of output read from an asynchronous subprocess, the rest is dropped
+ASYNC_LINE_LIMIT = 2 ** 20
+
 
 if is_windows():
 
@@ -85,14 +97,75 @@ def handle_output(output: str, redirect: Optional[Union[str, Path, TextIOWrapper
     return output
 
 
+def stream_output(
+    args: List[str],
+    cwd: Union[str, Path],
+    env: Dict[str, str],
+    timeout: Optional[int] = None,
+    redirect: Optional[Union[str, Path, TextIOWrapper]] = None,
+    tail_lines: int = RUN_CMD_TAIL_LINES,
+) -> str:
+    """Execute a command, tee its output line by line to the log and redirect, return the tail"""
+    tail: Deque[str] = deque(maxlen=tail_lines)
+    timed_out: List[bool] = []
+    with ExitStack() as stack:
+        target: Optional[IO[str]] = redirect if isinstance(redirect, TextIOWrapper) else None
+        if isinstance(redirect, (str, Path)):
+            target = stack.enter_context(open(redirect, "a", encoding="utf-8"))
+        with subprocess.Popen(
+            args,
+            shell=is_windows(),
+            cwd=cwd,
+            env=env,
+            universal_newlines=True,
+            errors="replace",
+            stdout=PIPE,
+            stderr=STDOUT,  # combine stdout,stderr streams
+        ) as proc:
+
+            def kill_on_timeout() -> None:
+                timed_out.append(True)
+                proc.kill()
+
+            timer = None
+            if timeout is not None:
+                timer = Timer(timeout, kill_on_timeout)
+                timer.start()
+            try:
+                for line in proc.stdout:  # type: ignore
+                    log.info(line.rstrip())
+                    tail.append(line)
+                    if target is not None:
+                        target.write(line)
+                proc.wait()
+            except BaseException:
+                proc.kill()
+                raise
+            finally:
+                if timer is not None:
+                    timer.cancel()
+    output = "".join(tail)
+    if timed_out:
+        raise subprocess.TimeoutExpired(args, timeout or 0, output=output)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args, output=output)
+    return output
+
+
 def run_cmd(
     cmd: Union[List[str], str],
     cwd: Optional[Union[str, Path]] = None,
     env: Optional[Dict[str, str]] = None,
     timeout: Optional[int] = None,
     redirect: Optional[Union[str, Path, TextIOWrapper]] = None,
+    stream: bool = False,
 ) -> str:
-    """Execute a command with the given options and return its output"""
+    """
+    Execute a command with the given options and return its output
+
+    With stream the output is logged and redirected while the command runs and only the last
+    RUN_CMD_TAIL_LINES lines of it are kept and returned, use it for long and verbose builds.
+    """
     if isinstance(cmd, str):
         args = shlex.split(cmd)
     else:
@@ -100,22 +173,147 @@ def run_cmd(
     cwd = cwd or os.getcwd()
     env = env or os.environ.copy()
     log.info("Calling: %s", " ".join(args))
+    with account_command(args, cwd):
+        if stream:
+            return stream_output(args, cwd, env, timeout, redirect)
+        try:
+            output = subprocess.run(
+                args,
+                shell=is_windows(),
+                cwd=cwd,
+                env=env,
+                timeout=timeout,
+                universal_newlines=True,
+                check=True,
+                stdout=PIPE,
+                stderr=STDOUT,  # combine stdout,stderr streams
+            ).stdout
+        except subprocess.CalledProcessError as err:
+            handle_output(err.stdout, redirect)
+            raise
+        return handle_output(output, redirect)
+
+
+def kill_process_tree(pid: int) -> None:
+    """Kill the process and its children, the process needs to be the leader of a new session"""
+    if is_windows():
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], check=False, capture_output=True)
+        return
     try:
-        output = subprocess.run(
-            args,
-            shell=is_windows(),
-            cwd=cwd,
-            env=env,
-            timeout=timeout,
-            universal_newlines=True,
-            check=True,
-            stdout=PIPE,
-            stderr=STDOUT,  # combine stdout,stderr streams
-        ).stdout
-    except subprocess.CalledProcessError as err:
-        handle_output(err.stdout, redirect)
-        raise
-    return handle_output(output, redirect)
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class ProcessSupervisor:
+    """Run subprocesses asynchronously, at most max_processes of them at the same time"""
+
+    def __init__(self, max_processes: Optional[int] = None) -> None:
+        self.max_processes = max_processes or os.cpu_count() or 1
+        self._loop_semaphore: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # a semaphore can be used only with one event loop, asyncio.run() creates a new one
+        loop = asyncio.get_event_loop()
+        if self._loop_semaphore is None or self._loop_semaphore[0] is not loop:
+            self._loop_semaphore = (loop, asyncio.Semaphore(self.max_processes))
+        return self._loop_semaphore[1]
+
+    async def run(
+        self,
+        args: List[str],
+        cwd: Optional[Union[str, Path]] = None,
+        env: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[str], None]] = None,
+        tail_lines: Optional[int] = RUN_CMD_TAIL_LINES,
+    ) -> str:
+        """
+        Execute a command and pass each line of its output to on_output as it arrives
+
+        A line longer than ASYNC_LINE_LIMIT bytes is truncated to the limit.
+
+        Returns:
+            The last tail_lines lines of the output, all of it if tail_lines is None
+
+        Raises:
+            asyncio.TimeoutError: When the timeout expired, the process group is killed
+            CalledProcessError: When the command exits with an exit code other than 0
+        """
+        tail: Deque[str] = deque(maxlen=tail_lines)
+        async with self._semaphore():
+            with account_command(args, cwd) as record:
+                proc = await create_subprocess_exec(
+                    *args,
+                    stdout=PIPE,
+                    stderr=STDOUT,  # combine stdout,stderr streams
+                    cwd=cwd,
+                    env=env,
+                    limit=ASYNC_LINE_LIMIT,
+                    start_new_session=not is_windows(),
+                )
+                try:
+                    await wait_for(self._pump(proc, tail, on_output), timeout=timeout)
+                except BaseException:
+                    # timeout or cancel, do not leave the process (or what it started) running
+                    kill_process_tree(proc.pid)
+                    await asyncio.shield(proc.wait())
+                    raise
+                record.exit_code = proc.returncode
+        output = "".join(tail)
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, args, output=output)
+        return output
+
+    @staticmethod
+    async def _pump(
+        proc: "asyncio.subprocess.Process", tail: Deque[str], on_output: Optional[Callable[[str], None]]
+    ) -> None:
+        assert proc.stdout is not None
+        truncating = False
+        while True:
+            try:
+                data = await proc.stdout.readuntil(b"\n")
+            except asyncio.IncompleteReadError as err:
+                # end of the output, possibly with a last line without a line end
+                if not err.partial or truncating:
+                    break
+                data = err.partial
+            except asyncio.LimitOverrunError as err:
+                # no line end within the limit, pass the beginning of the line and drop the rest
+                data = await proc.stdout.read(err.consumed)
+                if truncating:
+                    continue
+                truncating = True
+                log.warning("Truncating an output line longer than %d bytes", ASYNC_LINE_LIMIT)
+                data = data[:ASYNC_LINE_LIMIT] + b"\n"
+            else:
+                if truncating:
+                    # the end of the truncated line
+                    truncating = False
+                    continue
+            line = data.decode("utf-8", errors="replace")
+            tail.append(line)
+            if on_output is not None:
+                on_output(line)
+        await proc.wait()
+
+
+_process_supervisor: Optional[ProcessSupervisor] = None  # pylint: disable=invalid-name
+
+
+def set_process_supervisor(supervisor: ProcessSupervisor) -> None:
+    """Set the supervisor used by run_cmd_async"""
+    global _process_supervisor  # pylint: disable=W0603,C0103
+    _process_supervisor = supervisor
+
+
+def get_process_supervisor() -> ProcessSupervisor:
+    """Return the active supervisor, initialized from the environment on first use"""
+    if _process_supervisor is None:
+        set_process_supervisor(ProcessSupervisor(int(os.environ.get(MAX_PROCESSES_ENV, 0))))
+    assert _process_supervisor is not None
+    return _process_supervisor
 
 
 async def run_cmd_async(
@@ -133,20 +331,17 @@ async def run_cmd_async(
     cwd = cwd or os.getcwd()
     env = env or os.environ.copy()
     log.info("Calling asynchronously: %s", " ".join(args))
-    try:
-        proc = await create_subprocess_exec(
-            *args,
-            stdout=PIPE,
-            stderr=STDOUT,  # combine stdout,stderr streams
-            cwd=cwd,
-            env=env,
-        )
-        stdout, _ = await wait_for(proc.communicate(), timeout=timeout)
-        await proc.wait()
-    except subprocess.CalledProcessError as err:
-        handle_output(err.stdout.decode("utf-8"), redirect)
-        raise
-    return handle_output(stdout.decode("utf-8"), redirect)
+    with ExitStack() as stack:
+        target: Optional[IO[str]] = redirect if isinstance(redirect, TextIOWrapper) else None
+        if isinstance(redirect, (str, Path)):
+            target = stack.enter_context(open(redirect, "a", encoding="utf-8"))
+
+        def on_output(line: str) -> None:
+            log.info(line.rstrip())
+            if target is not None:
+                target.write(line)
+
+        return await get_process_supervisor().run(args, cwd, env, timeout, on_output, tail_lines=None)
 
 
 @with_no_logging
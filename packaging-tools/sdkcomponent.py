@@ -31,11 +31,16 @@
 
 import ntpath
 import os
-from configparser import ConfigParser
 from typing import Any, List
 
 from archiveresolver import ArchiveLocationResolver
-from bldinstallercommon import config_section_map, is_content_url_valid, safe_config_key_fetch
+from bldinstallercommon import (
+    SubstitutionTable,
+    config_section_map,
+    is_content_url_valid,
+    safe_config_key_fetch,
+)
+from config_cache import ConfigType
 from logging_util import init_logger
 
 log = init_logger(__name__, debug_mode=False)
@@ -53,9 +58,9 @@ class SdkComponent:
             package_name: str,
             parent_target_install_base: str,
             archive_server_name: str,
-            target_config: ConfigParser,
+            target_config: ConfigType,
             archive_location_resolver: ArchiveLocationResolver,
-            key_value_substitution_list: List[str],
+            key_value_substitution_list: SubstitutionTable,
         ) -> None:
             self.archive_uri = config_section_map(target_config, archive)['archive_uri']
             self.archive_action = safe_config_key_fetch(target_config, archive, 'archive_action')
@@ -82,10 +87,9 @@ class SdkComponent:
                 if not self.archive_name.endswith('.7z'):
                     self.archive_name += '.7z'
             # substitute key-value pairs if any
-            for item in key_value_substitution_list:
-                self.target_install_base = self.target_install_base.replace(item[0], item[1])
-                self.target_install_dir = self.target_install_dir.replace(item[0], item[1])
-                self.archive_name = self.archive_name.replace(item[0], item[1])
+            self.target_install_base = key_value_substitution_list.replace(self.target_install_base)
+            self.target_install_dir = key_value_substitution_list.replace(self.target_install_dir)
+            self.archive_name = key_value_substitution_list.replace(self.archive_name)
 
         def nomalize_archive_uri(
             self, package_name: str, archive_server_name: str, archive_location_resolver: ArchiveLocationResolver
@@ -113,10 +117,10 @@ class SdkComponent:
     def __init__(
         self,
         section_name: str,
-        target_config: ConfigParser,
+        target_config: ConfigType,
         packages_full_path_list: List[str],
         archive_location_resolver: ArchiveLocationResolver,
-        key_value_substitution_list: List[str],
+        key_value_substitution_list: SubstitutionTable,
     ):
         self.static_component = safe_config_key_fetch(target_config, section_name, 'static_component')
         self.root_component = safe_config_key_fetch(target_config, section_name, 'root_component')
@@ -149,9 +153,8 @@ class SdkComponent:
         self.meta_dir_dest: str = ""
         self.temp_data_dir: str = ""
         # substitute key-value pairs if any
-        for item in self.key_value_substitution_list:
-            self.target_install_base = self.target_install_base.replace(item[0], item[1])
-            self.version = self.version.replace(item[0], item[1])
+        self.target_install_base = self.key_value_substitution_list.replace(self.target_install_base)
+        self.version = self.key_value_substitution_list.replace(self.version)
 
     def is_root_component(self) -> bool:
         if self.root_component in ('yes', 'true'):
@@ -164,8 +167,7 @@ class SdkComponent:
     def validate(self) -> None:
         # look up correct package template directory from list
         found = False
-        for item in self.key_value_substitution_list:
-            self.package_name = self.package_name.replace(item[0], item[1])
+        self.package_name = self.key_value_substitution_list.replace(self.package_name)
         for item in self.packages_full_path_list:
             template_full_path = os.path.normpath(item + os.sep + self.package_subst_name)
             if os.path.exists(template_full_path):
@@ -226,7 +228,7 @@ class SdkComponent:
     def error_msg(self) -> str:
         return self.sanity_check_error_msg
 
-    def parse_archives(self, target_config: ConfigParser, archive_location_resolver: ArchiveLocationResolver) -> None:
+    def parse_archives(self, target_config: ConfigType, archive_location_resolver: ArchiveLocationResolver) -> None:
         if self.archives:
             archives_list = self.archives.split(',')
             for archive in archives_list:
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import os
+import tarfile
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Optional, Tuple
+from unittest.mock import patch
+
+from ddt import data, ddt  # type: ignore
+
+from archive_engine import (
+    ARCHIVE_PROFILE_ENV,
+    ArchiveError,
+    compress_archive,
+    compression_level,
+    extract_archive,
+    extract_command,
+)
+from bld_utils import is_windows
+from process_accounting import ProcessAccounting, set_process_accounting
+
+
+def no_programs(_: str) -> Optional[str]:
+    return None
+
+
+@ddt
+class TestArchiveEngine(unittest.TestCase):
+    def _create_tree(self, base_dir: str) -> None:
+        for name in ("top/a.so.1", "top/sub/b.txt", "other.dll"):
+            Path(base_dir, name).parent.mkdir(parents=True, exist_ok=True)
+            Path(base_dir, name).write_text(name, encoding="utf-8")
+
+    @data("out.tar", "out.tar.gz", "out.tar.xz", "out.tbz")  # type: ignore
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_compress_and_extract(self, archive: str) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            self._create_tree(tmpdir)
+            report = compress_archive(archive, ["top", "*.dll"], cwd=tmpdir, profile="fast")
+            self.assertEqual(report.bytes, os.path.getsize(os.path.join(tmpdir, archive)))
+            self.assertTrue(report.backend.startswith("tar"))
+            report = extract_archive(os.path.join(tmpdir, archive), os.path.join(tmpdir, "extracted"))
+            self.assertEqual(report.operation, "Extracted")
+            extracted = Path(tmpdir, "extracted")
+            self.assertEqual((extracted / "top" / "sub" / "b.txt").read_text(encoding="utf-8"), "top/sub/b.txt")
+            self.assertTrue((extracted / "other.dll").is_file())
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_archive_commands_accounted(self) -> None:
+        accounting = ProcessAccounting()
+        set_process_accounting(accounting)
+        try:
+            with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+                self._create_tree(tmpdir)
+                compress_archive("out.tar", ["top"], cwd=tmpdir)
+                extract_archive(os.path.join(tmpdir, "out.tar"), os.path.join(tmpdir, "extracted"))
+        finally:
+            set_process_accounting(None)
+        self.assertEqual([record.program for record in accounting.records], ["tar", "tar"])
+        self.assertEqual([record.exit_code for record in accounting.records], [0, 0])
+
+    def test_python_fallback(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            self._create_tree(tmpdir)
+            with patch("archive_engine.find_program", no_programs):
+                report = compress_archive("out.tar.gz", ["top"], cwd=tmpdir)
+                self.assertEqual(report.backend, "tarfile")
+                # a relative archive path is resolved against the target directory
+                Path(tmpdir, "extracted").mkdir()
+                os.rename(os.path.join(tmpdir, "out.tar.gz"), os.path.join(tmpdir, "extracted", "out.tar.gz"))
+                report = extract_archive("out.tar.gz", os.path.join(tmpdir, "extracted"))
+                self.assertEqual(report.backend, "tarfile")
+            self.assertTrue(Path(tmpdir, "extracted", "top", "a.so.1").is_file())
+
+    def test_python_fallback_path_traversal(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            Path(tmpdir, "evil").write_text("evil", encoding="utf-8")
+            with tarfile.open(os.path.join(tmpdir, "evil.tar"), "w") as tar_file:
+                tar_file.add(os.path.join(tmpdir, "evil"), arcname="../evil")
+            with patch("archive_engine.find_program", no_programs):
+                with self.assertRaises(ArchiveError):
+                    extract_archive(os.path.join(tmpdir, "evil.tar"), os.path.join(tmpdir, "extracted"))
+
+    @data(  # type: ignore
+        ("file.7z", "7z"), ("file.zip", "7z"), ("file.tar.xz", "tar"), ("file.tgz", "tar"), ("file.tar.zst", "tar")
+    )
+    def test_extract_command(self, test_data: Tuple[str, str]) -> None:
+        archive, program = test_data
+        with patch("archive_engine.find_program", no_programs):
+            cmd = extract_command(archive, threads=4)
+        self.assertEqual(cmd[0], program)
+        self.assertEqual(cmd[-1], archive)
+        with self.assertRaises(ArchiveError):
+            extract_command("file.foo")
+
+    def test_compression_level(self) -> None:
+        self.assertEqual(compression_level("max"), 9)
+        with patch.dict(os.environ, {ARCHIVE_PROFILE_ENV: "fast"}):
+            self.assertEqual(compression_level(), 1)
+        with self.assertRaises(ArchiveError):
+            compression_level("ultra")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -30,21 +30,39 @@
 #############################################################################
 
 import os
+import tarfile
+import threading
 import unittest
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from typing import Callable, List, Optional, Tuple
 
 from ddt import data, ddt  # type: ignore
 
-from bld_utils import is_windows
+from bld_utils import file_url, is_windows
 from bldinstallercommon import (
+    SEARCH_PARALLEL_FILE_COUNT,
+    SubstitutionTable,
     calculate_relpath,
+    clear_url_validity_memo,
+    content_url_sizes,
+    copy_tree,
+    drain_tree_removals,
+    file_matches_regexp,
+    is_content_url_valid,
     locate_executable,
     locate_path,
     locate_paths,
+    remove_one_tree_level,
+    remove_tree,
+    remove_tree_async,
+    repack_tar_stream,
     replace_in_files,
     search_for_files,
+    stream_extract_url,
+    sweep_tree_trash,
 )
 from installer_utils import PackagingError
 
@@ -89,6 +107,48 @@ class TestCommon(unittest.TestCase):
                 # check that file contents match
                 self.assertEqual(file_contents, expected_file_content)
 
+    def test_substitution_table_sub_in_files(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            tagged_file = Path(tmp_base_dir) / "package.xml"
+            tagged_file.write_text("<Version>%TAG_VERSION%-%TAG_EDITION%</Version>", encoding="utf-8")
+            plain_file = Path(tmp_base_dir) / "installscript.qs"
+            plain_file.write_text("function Component() {}", encoding="utf-8")
+            os.utime(plain_file, (0, 0))
+            table = SubstitutionTable([("%TAG_VERSION%", "%TAG_RELEASE%"), ("%TAG_EDITION%", "opensource"),
+                                       ("%TAG_RELEASE%", "6.3.0"), ("[0-9]+\\.", "x.")])
+            report = table.sub_in_files([str(tagged_file), str(plain_file)])
+            self.assertEqual(report, {str(tagged_file): 5, str(plain_file): 0})
+            self.assertEqual(tagged_file.read_text(encoding="utf-8"), "<Version>x.x.0-opensource</Version>")
+            # files without matches are not written
+            self.assertEqual(plain_file.stat().st_mtime, 0)
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_substitution_table_sub_in_files_bytes(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            content = b"\xff\xfeQMAKE_PRL_BUILD_DIR = /foo/bar\n"
+            source_file = Path(tmp_base_dir) / "source.prl"
+            source_file.write_bytes(content)
+            source_file.chmod(0o750)
+            files = [Path(tmp_base_dir) / f"{index}.prl" for index in range(SubstitutionTable.PARALLEL_FILE_COUNT)]
+            for file in files:
+                file.write_bytes(b"unrelated")
+            target_file = Path(tmp_base_dir) / "target.prl"
+            os.link(source_file, target_file)
+            report = replace_in_files([str(file) for file in files + [target_file]], "/foo/bar", "/baz")
+            self.assertEqual(list(report.values()), [0] * len(files) + [1])
+            self.assertEqual(target_file.read_bytes(), b"\xff\xfeQMAKE_PRL_BUILD_DIR = /baz\n")
+            self.assertEqual(target_file.stat().st_mode & 0o777, 0o750)
+            # the file is replaced instead of being written in place
+            self.assertEqual(source_file.read_bytes(), content)
+            self.assertEqual(len(os.listdir(tmp_base_dir)), len(files) + 2)
+
+    def test_substitution_table_replace(self) -> None:
+        table = SubstitutionTable([["%LICENSE%", "opensource"], ["qt.qt6.", "qt.qt6.630."], ["6.3.", "[0-9]"]])
+        self.assertEqual(table.replace("qt.qt6.%LICENSE%"), "qt.qt6.630.opensource")
+        self.assertEqual(table.replace("Qt 6.3.0"), "Qt [0-9]0")
+        self.assertEqual(list(table), [("%LICENSE%", "opensource"), ("qt.qt6.", "qt.qt6.630."), ("6.3.", "[0-9]")])
+
     def test_replace_in_files_invalid_path(self) -> None:
         with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
             # invalid file path should raise FileNotFoundError
@@ -151,6 +211,24 @@ class TestCommon(unittest.TestCase):
             for result_path, expected_path in zip(result, expected_files):
                 self.assertEqual(Path(result_path).name, expected_path)
 
+    def test_file_matches_regexp(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            text_file = Path(tmp_base_dir) / "file.pc"
+            text_file.write_bytes(b"prefix=/foo/\xe4\nlibdir=/build/lib\n")
+            binary_file = Path(tmp_base_dir) / "file.la"
+            binary_file.write_bytes(b"\x7fELF\0\0/build/lib")
+            self.assertTrue(file_matches_regexp(text_file, b"^libdir=/build"))
+            self.assertFalse(file_matches_regexp(text_file, b"^/build"))
+            self.assertFalse(file_matches_regexp(binary_file, b"/build"))
+
+    def test_search_for_files_process_pool(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            for index in range(SEARCH_PARALLEL_FILE_COUNT + 1):
+                Path(tmp_base_dir, f"{index}.prl").write_text("/build" if index % 2 else "/foo", encoding="utf-8")
+            result = search_for_files(tmp_base_dir, ["*.prl"], "/build", max_workers=2)
+            self.assertEqual(len(result), SEARCH_PARALLEL_FILE_COUNT // 2)
+            self.assertEqual(result, search_for_files(tmp_base_dir, ["*.prl"], "/build", max_workers=1))
+
     @data(  # type: ignore
         (([], [], ['d', '.d', 'tst.y', '.t', 'tst.t', 'tempty', 'd/tst.t', 'd/n', '.d/.t'])),
         ((["*"], [], ['d', '.d', 'tst.y', '.t', 'tst.t', 'tempty', 'd/tst.t', 'd/n', '.d/.t'])),
@@ -176,6 +254,123 @@ class TestCommon(unittest.TestCase):
             result = [str(Path(p).relative_to(tmp_base_dir)) for p in result]
             self.assertCountEqual(expected_results, result)
 
+    @data(  # type: ignore
+        ((["*"], None, None, ['d', '.d', 'tst.y', '.t', 'tst.t', 'tempty', 'd/n', '.d/.t', 'd/tst.t', 'd/n/deep.t'])),
+        ((["*.t"], 1, None, ['.t', 'tst.t'])),
+        ((["*.t"], 2, None, ['.t', 'tst.t', 'd/tst.t', '.d/.t'])),
+        ((["*.t"], None, ["d"], ['.t', 'tst.t', '.d/.t'])),
+        ((["n", "*.y"], None, [".d", "n"], ['tst.y', 'd/n'])),
+        ((["d/*"], None, None, ['d/n', 'd/tst.t'])),
+    )
+    def test_locate_paths_depth_and_prune(
+        self, test_data: Tuple[List[str], Optional[int], Optional[List[str]], List[str]]
+    ) -> None:
+        pattern, max_depth, prune, expected_results = test_data
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            for folder in ["/tempty", "/d/n", "/.d"]:
+                Path(tmp_base_dir + folder).mkdir(parents=True)
+            for file in ["/tst.t", "/tst.y", "/d/tst.t", "/.t", "/.d/.t", "/d/n/deep.t"]:
+                Path(tmp_base_dir + file).touch()
+            result = locate_paths(tmp_base_dir, pattern, max_depth=max_depth, prune=prune)
+            result = [Path(p).relative_to(tmp_base_dir).as_posix() for p in result]
+            self.assertCountEqual(expected_results, result)
+            # the same order as with Path.rglob
+            rglob_result = [p.relative_to(tmp_base_dir).as_posix() for p in Path(tmp_base_dir).rglob("*")]
+            self.assertEqual([p for p in rglob_result if p in result], result)
+
+    @data(False, True)  # type: ignore
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_copy_tree(self, hardlink: bool) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            source_dir = Path(tmp_base_dir) / "source"
+            (source_dir / "empty").mkdir(parents=True)
+            (source_dir / "bin").mkdir()
+            (source_dir / "bin" / "tool").write_bytes(b"binary")
+            (source_dir / "bin" / "tool").chmod(0o755)
+            (source_dir / "package.xml").write_text("<Package/>", encoding="utf-8")
+            dest_dir = Path(tmp_base_dir) / "dest"
+            dest_dir.mkdir()
+            (dest_dir / "package.xml").write_text("old content", encoding="utf-8")
+            report = copy_tree(str(source_dir), str(dest_dir), hardlink=hardlink)
+            self.assertEqual((report.files, report.bytes), (2, 16))
+            self.assertEqual(sum(report.methods.values()), 2)
+            self.assertTrue((dest_dir / "empty").is_dir())
+            self.assertEqual((dest_dir / "bin" / "tool").read_bytes(), b"binary")
+            self.assertTrue(os.access(dest_dir / "bin" / "tool", os.X_OK))
+            self.assertEqual((dest_dir / "package.xml").read_text(encoding="utf-8"), "<Package/>")
+            self.assertEqual(
+                (dest_dir / "package.xml").stat().st_ino == (source_dir / "package.xml").stat().st_ino,
+                report.methods.get("hardlink") == 2,
+            )
+
+    def test_remove_one_tree_level(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            top_dir = Path(tmp_base_dir) / "top"
+            # the child has an entry with the same name as itself
+            (top_dir / "qt" / "qt" / "lib").mkdir(parents=True)
+            (top_dir / "qt" / "qt" / "lib" / "libQt6Core.so").write_bytes(b"content")
+            (top_dir / "qt" / "bin").mkdir()
+            (top_dir / "qt" / ".hidden").touch()
+            remove_one_tree_level(str(top_dir))
+            self.assertCountEqual(os.listdir(top_dir), ["qt", "bin", ".hidden"])
+            self.assertEqual((top_dir / "qt" / "lib" / "libQt6Core.so").read_bytes(), b"content")
+            remove_one_tree_level(str(top_dir / "qt"))
+            self.assertEqual(os.listdir(top_dir / "qt"), ["libQt6Core.so"])
+
+    def test_remove_one_tree_level_invalid(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            Path(tmp_base_dir, "file").touch()
+            with self.assertRaises(IOError):
+                remove_one_tree_level(tmp_base_dir)
+            Path(tmp_base_dir, "dir").mkdir()
+            with self.assertRaises(IOError):
+                remove_one_tree_level(tmp_base_dir)
+
+    def _create_tree(self, root: Path) -> None:
+        for directory in ("lib/cmake", "bin", "empty"):
+            (root / directory).mkdir(parents=True)
+        for file in ("lib/libQt6Core.so", "lib/cmake/config.cmake", "bin/qmake", "README"):
+            (root / file).write_text("content", encoding="utf-8")
+        (root / "lib" / "link").symlink_to(root / "bin")
+        # read-only content has to be removed as well
+        (root / "lib" / "cmake" / "config.cmake").chmod(0o444)
+        (root / "lib" / "cmake").chmod(0o555)
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_remove_tree(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            self._create_tree(Path(tmp_base_dir) / "tree")
+            self.assertTrue(remove_tree(str(Path(tmp_base_dir) / "tree")))
+            self.assertEqual(os.listdir(tmp_base_dir), [])
+
+    @data(None, "trash")  # type: ignore
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_remove_tree_async(self, trash_dir: Optional[str]) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            tree = Path(tmp_base_dir) / "tree"
+            self._create_tree(tree)
+            trash = str(Path(tmp_base_dir) / trash_dir) if trash_dir else None
+            self.assertTrue(remove_tree_async(str(tree), trash))
+            # the path can be reused immediately
+            self.assertFalse(tree.exists())
+            tree.mkdir()
+            self.assertTrue(drain_tree_removals())
+            self.assertCountEqual(os.listdir(tmp_base_dir), ["tree", trash_dir] if trash_dir else ["tree"])
+            self.assertEqual(os.listdir(trash) if trash else [], [])
+            self.assertTrue(remove_tree_async(str(Path(tmp_base_dir) / "nonexistent")))
+
+    def test_sweep_tree_trash(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            # the trash of a killed run and directories only resembling it
+            leftover = Path(tmp_base_dir) / f".tree.trash-{'0' * 32}"
+            self._create_tree(leftover)
+            for name in ("tree", ".tree.trash", "tree.trash-" + "0" * 32):
+                (Path(tmp_base_dir) / name).mkdir()
+            self.assertEqual(sweep_tree_trash(tmp_base_dir), 1)
+            self.assertTrue(drain_tree_removals())
+            self.assertCountEqual(os.listdir(tmp_base_dir), ["tree", ".tree.trash", "tree.trash-" + "0" * 32])
+            self.assertEqual(sweep_tree_trash(str(Path(tmp_base_dir) / "nonexistent")), 0)
+
     def test_locate_path(self) -> None:
         with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
             test_file = tmp_base_dir + "/test"
@@ -206,6 +401,110 @@ class TestCommon(unittest.TestCase):
                 locate_executable(tmp_base_dir, ["test_file2"]),
                 tmp_base_dir + "/test_file2")
 
+    @data("tar", "tar.gz", "tar.xz", "tar.bz2")  # type: ignore
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_stream_extract_url(self, suffix: str) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            source_dir = Path(tmp_base_dir) / "src"
+            (source_dir / "dir").mkdir(parents=True)
+            (source_dir / "dir" / "file").write_text("content", encoding="utf-8")
+            archive = Path(tmp_base_dir) / f"archive.{suffix}"
+            mode = "w" if suffix == "tar" else "w:" + suffix.split(".")[-1]
+            with tarfile.open(archive, mode) as tar:  # type: ignore
+                tar.add(str(source_dir / "dir"), arcname="dir")
+            target_dir = Path(tmp_base_dir) / "target"
+            stream_extract_url(file_url(str(archive)), str(target_dir))
+            self.assertEqual((target_dir / "dir" / "file").read_text(encoding="utf-8"), "content")
+
+    @data(("tar.xz", 1, "opt/qt"), ("tar.gz", 2, ""), ("tar", 0, "Tools"))  # type: ignore
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_repack_tar_stream(self, test_data: Tuple[str, int, str]) -> None:
+        suffix, strip_dirs, prefix = test_data
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            source_dir = Path(tmp_base_dir) / "src"
+            (source_dir / "top" / "sub" / "bin").mkdir(parents=True)
+            (source_dir / "top" / "sub" / "bin" / "file").write_text("content", encoding="utf-8")
+            os.link(source_dir / "top" / "sub" / "bin" / "file", source_dir / "top" / "sub" / "bin" / "link")
+            source = Path(tmp_base_dir) / "source.tar.gz"
+            with tarfile.open(source, "w:gz") as tar:
+                tar.add(str(source_dir / "top"), arcname="top")
+            target = Path(tmp_base_dir) / f"target.{suffix}"
+            repack_tar_stream(str(source), str(target), strip_dirs, prefix)
+            # compare against the result of the extract and remove tree level cycle
+            expected_dir = Path(tmp_base_dir) / "expected"
+            (expected_dir / prefix).mkdir(parents=True)
+            with tarfile.open(source) as tar:
+                tar.extractall(expected_dir / prefix)
+            for _ in range(strip_dirs):
+                remove_one_tree_level(str(expected_dir / prefix))
+            result_dir = Path(tmp_base_dir) / "result"
+            with tarfile.open(target) as tar:
+                tar.extractall(result_dir)
+            self.assertEqual(
+                sorted(str(p.relative_to(expected_dir)) for p in expected_dir.rglob("*")),
+                sorted(str(p.relative_to(result_dir)) for p in result_dir.rglob("*")),
+            )
+            bin_dir = result_dir / prefix / "/".join(["top", "sub"][strip_dirs:]) / "bin"
+            self.assertEqual((bin_dir / "link").read_text(encoding="utf-8"), "content")
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_repack_tar_stream_multiple_top_level_entries(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            source_dir = Path(tmp_base_dir) / "src"
+            for name in ("first", "second"):
+                (source_dir / name).mkdir(parents=True)
+                (source_dir / name / "file").touch()
+            source = Path(tmp_base_dir) / "source.tar"
+            with tarfile.open(source, "w") as tar:
+                tar.add(str(source_dir / "first"), arcname="first")
+                tar.add(str(source_dir / "second"), arcname="second")
+            target = Path(tmp_base_dir) / "target.tar.xz"
+            with self.assertRaises(IOError):
+                repack_tar_stream(str(source), str(target), 1)
+            self.assertFalse(target.exists())
+
+    def test_is_content_url_valid_memo(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            Path(tmp_base_dir, "archive.7z").write_bytes(b"content")
+            handler = partial(SimpleHTTPRequestHandler, directory=tmp_base_dir)
+            with HTTPServer(("127.0.0.1", 0), handler) as server:
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                url = f"http://127.0.0.1:{server.server_address[1]}/archive.7z"
+                try:
+                    clear_url_validity_memo()
+                    self.assertTrue(is_content_url_valid(url))
+                    Path(tmp_base_dir, "archive.7z").unlink()
+                    # the result of the first check is reused
+                    self.assertTrue(is_content_url_valid(url))
+                    clear_url_validity_memo()
+                    self.assertFalse(is_content_url_valid(url))
+                    # a failed check is not memoized
+                    Path(tmp_base_dir, "archive.7z").write_bytes(b"content")
+                    self.assertTrue(is_content_url_valid(url))
+                finally:
+                    server.shutdown()
+
+    def test_content_url_sizes(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            Path(tmp_base_dir, "small.7z").write_bytes(b"1")
+            Path(tmp_base_dir, "big.7z").write_bytes(b"12345")
+            handler = partial(SimpleHTTPRequestHandler, directory=tmp_base_dir)
+            with HTTPServer(("127.0.0.1", 0), handler) as server:
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                base_url = f"http://127.0.0.1:{server.server_address[1]}"
+                urls = [f"{base_url}/small.7z", f"{base_url}/big.7z", f"{base_url}/missing.7z"]
+                local_file = os.path.join(tmp_base_dir, "big.7z")
+                try:
+                    clear_url_validity_memo()
+                    sizes = content_url_sizes(urls + [urls[0], local_file])
+                    self.assertEqual(sizes, dict(zip(urls + [local_file], [1, 5, 0, 5])))
+                    # the sizes are memoized for the later validity checks
+                    Path(tmp_base_dir, "big.7z").unlink()
+                    self.assertTrue(is_content_url_valid(urls[1]))
+                finally:
+                    clear_url_validity_memo()
+                    server.shutdown()
+
     @data(  # type: ignore
         ("/home/qt/bin/foo/bar", "/home/qt/lib", "../../../lib"),
         ("/home/qt/bin/foo/", "/home/qt/lib", "/home/qt/lib"),
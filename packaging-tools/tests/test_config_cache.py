@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import os
+import unittest
+from configparser import ConfigParser, ExtendedInterpolation, NoOptionError
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import config_cache
+from bldinstallercommon import config_section_map, safe_config_key_fetch
+from config_cache import CONFIG_CACHE_DIR_ENV, CompiledConfig, load_config
+
+CONFIG_CONTENT = """
+[PackageNamespace]
+name = qt
+
+[qt.qt6.630.gcc_64]
+archives = qt.qt6.630.gcc_64.qtbase
+target_install_base = /%QT_VERSION%/gcc_64
+version = 6.3.0
+
+[qt.qt6.630.gcc_64.qtbase]
+archive_uri = /qt/${qt.qt6.630.gcc_64:version}/qtbase.7z
+Package_Strip_Dirs = 5
+broken = ${Missing:key}
+"""
+
+
+class TestConfigCache(unittest.TestCase):
+    def setUp(self) -> None:
+        config_cache._memo.clear()  # pylint: disable=W0212
+
+    def _write_config(self, tmpdir: str, content: str = CONFIG_CONTENT) -> Path:
+        config_file = Path(tmpdir) / "linux.conf"
+        config_file.write_text(content, encoding="utf-8")
+        return config_file
+
+    def test_compiled_config_lookups(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            parser = ConfigParser(interpolation=ExtendedInterpolation())
+            parser.read(self._write_config(tmpdir), encoding="utf-8")
+            compiled = CompiledConfig.from_parser(parser)
+            self.assertEqual(compiled.sections(), parser.sections())
+            for section in parser.sections():
+                for key in ("archives", "archive_uri", "package_strip_dirs", "PACKAGE_STRIP_DIRS", "broken", "none"):
+                    self.assertEqual(
+                        safe_config_key_fetch(compiled, section, key), safe_config_key_fetch(parser, section, key)
+                    )
+                self.assertEqual(config_section_map(compiled, section), config_section_map(parser, section))
+            self.assertEqual(compiled.get("qt.qt6.630.gcc_64.qtbase", "archive_uri"), "/qt/6.3.0/qtbase.7z")
+            with self.assertRaises(NoOptionError):
+                compiled.get("qt.qt6.630.gcc_64", "archive_uri")
+
+    def test_safe_config_key_fetch_values(self) -> None:
+        parser = ConfigParser(interpolation=ExtendedInterpolation(), allow_no_value=True)
+        parser.read_string(CONFIG_CONTENT + "valueless\n")
+        section = "qt.qt6.630.gcc_64.qtbase"
+        for config in (parser, CompiledConfig.from_parser(parser)):
+            # the values returned before the lookup was changed to a single get
+            self.assertEqual(safe_config_key_fetch(config, "Missing", "archive_uri"), "")
+            self.assertEqual(safe_config_key_fetch(config, section, "missing"), "")
+            self.assertEqual(safe_config_key_fetch(config, section, "broken"), "")
+            self.assertIsNone(safe_config_key_fetch(config, section, "valueless"))
+            for key in parser.options(section):
+                self.assertEqual(safe_config_key_fetch(config, section, key), config_section_map(parser, section)[key])
+
+    def test_load_config(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            config_file = self._write_config(tmpdir)
+            cache_dir = Path(tmpdir) / "cache"
+            with patch.dict(os.environ, {CONFIG_CACHE_DIR_ENV: str(cache_dir)}):
+                config = load_config(config_file)
+                self.assertIs(load_config(config_file), config)
+                self.assertEqual(len(list(cache_dir.glob("*.pickle"))), 1)
+                # a new process reads the pickled configuration without parsing the file
+                config_cache._memo.clear()  # pylint: disable=W0212
+                with patch("config_cache.ConfigParser", side_effect=AssertionError("parsed")):
+                    self.assertEqual(load_config(config_file).data, config.data)
+                # changes to the file are picked up
+                self._write_config(tmpdir, CONFIG_CONTENT.replace("6.3.0", "6.4.0"))
+                os.utime(config_file, ns=(0, 0))
+                config = load_config(config_file)
+                self.assertEqual(config.get("qt.qt6.630.gcc_64.qtbase", "archive_uri"), "/qt/6.4.0/qtbase.7z")
+                # also an edit keeping the size and the modification time, in memory and pickled
+                self._write_config(tmpdir, CONFIG_CONTENT.replace("6.3.0", "6.5.0"))
+                os.utime(config_file, ns=(0, 0))
+                config = load_config(config_file)
+                self.assertEqual(config.get("qt.qt6.630.gcc_64.qtbase", "archive_uri"), "/qt/6.5.0/qtbase.7z")
+                config_cache._memo.clear()  # pylint: disable=W0212
+                self._write_config(tmpdir, CONFIG_CONTENT.replace("6.3.0", "6.6.0"))
+                os.utime(config_file, ns=(0, 0))
+                config = load_config(config_file)
+                self.assertEqual(config.get("qt.qt6.630.gcc_64.qtbase", "archive_uri"), "/qt/6.6.0/qtbase.7z")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -30,16 +30,34 @@
 #############################################################################
 
 import os
+import tarfile
+import threading
 import unittest
+from functools import partial
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Tuple
+from types import SimpleNamespace
+from typing import Any, List, Optional, Tuple
+from unittest.mock import patch
 
 from ddt import data, ddt  # type: ignore
 
 from bld_utils import is_macos, is_windows
 from bldinstallercommon import locate_paths
-from create_installer import remove_all_debug_libraries
+from create_installer import (
+    ArchiveWindow,
+    ComponentArchiveJob,
+    CreateInstallerError,
+    StageScheduler,
+    add_target_component,
+    get_archive_recipe_key,
+    remove_all_debug_libraries,
+    remove_debug_information_files_by_file_type,
+    restore_processed_archive,
+    store_processed_archive,
+)
+from download_cache import FileCache
+from tracing import Tracer
 
 
 @ddt
@@ -72,6 +90,221 @@ class TestCommon(unittest.TestCase):
                 else:
                     self.assertCountEqual(result_rel, remaining_files)
 
+    @data(  # type: ignore
+        ("debug", ["lib/libQt6Core.so.6.debug", "plugins/platforms/libqxcb.so.debug", "lib/cmake/lib/x.debug"]),
+        ("dSYM", ["lib/QtCore.framework.dSYM/Contents/Info.plist", "plugins/libqcocoa.dylib.dSYM/x"]),
+    )
+    def test_remove_debug_information_files_by_file_type(self, test_data: Tuple[str, List[str]]) -> None:
+        suffix, removed_files = test_data
+        kept_files = [
+            "lib/libQt6Core.so.6", "plugins/platforms/libqxcb.so", "unrelated/foo.debug", "x.debug",
+            "unrelated/foo.dSYM/x", "debug/lib.dSYM", "qml/foo.debug.qml",
+        ]
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            for file in removed_files + kept_files:
+                Path(tmpdir, file).parent.mkdir(parents=True, exist_ok=True)
+                Path(tmpdir, file).touch()
+            remove_debug_information_files_by_file_type(tmpdir, suffix)
+            result_paths = locate_paths(tmpdir, ["*"], [os.path.isfile])
+            result_rel = [Path(p).relative_to(tmpdir).as_posix() for p in result_paths]
+            self.assertCountEqual(result_rel, kept_files)
+
+    def _recipe_task_and_archive(self, archive_uri: str) -> Tuple[Any, Any]:
+        task = SimpleNamespace(
+            remove_debug_information_files=False, remove_pdb_files=False, remove_debug_libraries=False,
+            substitutions=[["%LICENSE%", "opensource"]], build_timestamp="2022-01-01", archivegen_tool=""
+        )
+        archive = SimpleNamespace(
+            archive_uri=archive_uri, archive_name="archive.7z", extract_archive="yes", archive_action="", package_strip_dirs="1",
+            package_finalize_items="", rpath_target="", component_sha1_file="",
+            get_archive_installation_directory=lambda: "/foo/bar"
+        )
+        return task, archive
+
+    def test_get_archive_recipe_key(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            source = Path(tmpdir) / "source.tar.gz"
+            source.write_bytes(b"content")
+            task, archive = self._recipe_task_and_archive(str(source))
+            key = get_archive_recipe_key(task, archive)
+            self.assertEqual(key, get_archive_recipe_key(task, archive))
+            archive.package_strip_dirs = "2"
+            self.assertNotEqual(key, get_archive_recipe_key(task, archive))
+            archive.package_strip_dirs = "1"
+            archive.archive_name = "archive.tar.gz"
+            self.assertNotEqual(key, get_archive_recipe_key(task, archive))
+            archive.archive_name = "archive.7z"
+            archivegen = Path(tmpdir) / "archivegen"
+            archivegen.write_bytes(b"tool")
+            task.archivegen_tool = str(archivegen)
+            tool_key = get_archive_recipe_key(task, archive)
+            self.assertNotEqual(key, tool_key)
+            archivegen.write_bytes(b"rebuilt tool")
+            os.utime(archivegen, ns=(0, 0))
+            self.assertNotEqual(tool_key, get_archive_recipe_key(task, archive))
+            task.archivegen_tool = ""
+            source.write_bytes(b"changed content")
+            self.assertNotEqual(key, get_archive_recipe_key(task, archive))
+
+    def test_processed_archive_cache(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            cache = FileCache(Path(tmpdir) / "cache", "1M")
+            component = SimpleNamespace(component_sha1="")
+            _, archive = self._recipe_task_and_archive("")
+            saveas = Path(tmpdir) / "data" / "archive.7z"
+            self.assertFalse(restore_processed_archive(cache, "key", component, str(saveas)))  # type: ignore
+            saveas.parent.mkdir()
+            saveas.write_bytes(b"repacked")
+            archive.component_sha1_file = "SHA1"
+            component.component_sha1 = "1234"
+            store_processed_archive(cache, "key", component, archive, str(saveas))  # type: ignore
+            saveas.unlink()
+            component.component_sha1 = ""
+            self.assertTrue(restore_processed_archive(cache, "key", component, str(saveas)))  # type: ignore
+            self.assertEqual(saveas.read_bytes(), b"repacked")
+            self.assertEqual(component.component_sha1, "1234")
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_component_archive_job_repack_stream(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            source_dir = Path(tmpdir) / "src" / "top"
+            source_dir.mkdir(parents=True)
+            (source_dir / "file").write_text("content", encoding="utf-8")
+            source = Path(tmpdir) / "source.tar.gz"
+            with tarfile.open(source, "w:gz") as tar:
+                tar.add(str(source_dir), arcname="top")
+            task, archive = self._recipe_task_and_archive(str(source))
+            task.repack_stream, task.stream_extract, task.archive_cache = True, False, None
+            task.archive_window = ArchiveWindow(1, threading.Event())
+            task.tracer = Tracer()
+            archive.archive_name, archive.target_install_dir = "archive.tar.xz", "bar"
+            component = SimpleNamespace(component_sha1="", target_install_base="/foo", package_name="qt.foo")
+            install_dir = Path(tmpdir) / "tmp" / "archive.tar.xz" / "foo" / "bar"
+            install_dir.mkdir(parents=True)
+            data_dir = Path(tmpdir) / "data"
+            data_dir.mkdir()
+            job = ComponentArchiveJob(
+                task, component, archive, str(install_dir), str(data_dir), str(install_dir.parent.parent)  # type: ignore
+            )
+            # archivegen is not available, the job has to finish without the compress stage
+            job.run()
+            # the download slot is released after the extraction
+            self.assertTrue(task.archive_window.slots.acquire(blocking=False))
+            self.assertEqual(os.listdir(install_dir), [])
+            with tarfile.open(data_dir / "archive.tar.xz") as tar:
+                self.assertEqual(tar.extractfile("foo/bar/file").read(), b"content")  # type: ignore
+            (archive_name, _, spans), = task.tracer.archive_summary()
+            self.assertEqual(archive_name, "archive.tar.xz")
+            self.assertCountEqual(spans, ["download", "repack"])
+
+    def test_stage_scheduler(self) -> None:
+        calls: List[Tuple[str, str, str]] = []
+
+        def stage(chain: str, name: str) -> None:
+            calls.append((chain, name, threading.current_thread().name.split("_")[0]))
+
+        scheduler = StageScheduler({"io": 2, "cpu": 1})
+        for chain in ("a", "b", "c"):
+            scheduler.add_chain(chain, [("io", lambda c=chain: stage(c, "fetch")),  # type: ignore
+                                        ("cpu", lambda c=chain: stage(c, "compress"))])  # type: ignore
+        scheduler.wait()
+        self.assertEqual(len(calls), 6)
+        for chain in ("a", "b", "c"):
+            self.assertEqual([(n, p) for c, n, p in calls if c == chain], [("fetch", "io"), ("compress", "cpu")])
+
+    def test_stage_scheduler_failure(self) -> None:
+        calls: List[str] = []
+
+        def fail() -> None:
+            raise ValueError("failed stage")
+
+        scheduler = StageScheduler({"io": 1, "cpu": 1})
+        scheduler.add_chain("failing", [("io", fail), ("cpu", lambda: calls.append("never"))])
+        with self.assertRaises(ValueError):
+            scheduler.wait()
+        self.assertEqual(calls, [])
+
+    def test_stage_scheduler_first_error(self) -> None:
+        def fail(error: Exception, after: Optional[threading.Event] = None) -> None:
+            if after is not None:
+                after.wait(5)
+            raise error
+
+        scheduler = StageScheduler({"io": 2, "cpu": 1})
+        # the chain added first fails last, the error raised is the one that happened first
+        scheduler.add_chain("second", [("io", partial(fail, ValueError("second"), scheduler.failed))])
+        scheduler.add_chain("first", [("io", partial(fail, KeyError("first")))])
+        with self.assertRaises(KeyError):
+            scheduler.wait()
+
+    def test_stage_scheduler_abort(self) -> None:
+        calls: List[str] = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def fail() -> None:
+            started.set()
+            release.wait(5)
+            raise ValueError("failed stage")
+
+        scheduler = StageScheduler({"io": 1, "cpu": 1})
+        scheduler.add_chain("failing", [("io", fail), ("cpu", lambda: calls.append("never"))])
+        scheduler.add_chain("pending", [("cpu", lambda: calls.append("pending"))])
+        started.wait(5)
+        threading.Timer(0.1, release.set).start()
+        # the running stage is waited for, its error does not replace the one being handled
+        scheduler.abort()
+        self.assertEqual(calls, ["pending"])
+        self.assertIsInstance(scheduler.first_error, ValueError)
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_add_target_component_static_data_first(self) -> None:
+        static_files_at_schedule: List[bool] = []
+
+        class FakeScheduler:
+            def add_chain(self, description: str, stages: Any) -> None:
+                static_files_at_schedule.append(Path(data_dir, "static.txt").is_file())
+
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            template_dir = Path(tmp_base_dir) / "template"
+            (template_dir / "data").mkdir(parents=True)
+            (template_dir / "data" / "static.txt").write_text("static", encoding="utf-8")
+            (template_dir / "meta").mkdir()
+            data_dir = Path(tmp_base_dir) / "packages" / "foo" / "data"
+            task = SimpleNamespace(
+                substitution_table=SimpleNamespace(replace=lambda name: name),
+                packages_full_path_dst=str(Path(tmp_base_dir) / "packages"),
+                offline_installer=True,
+                create_repository=False,
+                dry_run=False,
+                script_root_dir=tmp_base_dir,
+                directories_for_substitutions=[],
+            )
+            archive = SimpleNamespace(archive_name="archive.7z", get_archive_installation_directory=lambda: "")
+            component = SimpleNamespace(
+                print_component_data=lambda: None,
+                package_name="foo",
+                downloadable_archive_list=[archive],
+                component_sha1_uri="",
+                pkg_template_dir=str(template_dir),
+            )
+            with patch("create_installer.ComponentArchiveJob"):
+                add_target_component(task, component, FakeScheduler())  # type: ignore
+        # the archive jobs must not race with the static data copy into the same directory
+        self.assertEqual(static_files_at_schedule, [True])
+
+    def test_archive_window(self) -> None:
+        abort = threading.Event()
+        window = ArchiveWindow(2, abort)
+        window.acquire()
+        window.acquire()
+        self.assertFalse(window.slots.acquire(blocking=False))
+        window.release()
+        window.acquire()
+        abort.set()
+        with self.assertRaises(CreateInstallerError):
+            window.acquire()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import os
+import unittest
+from pathlib import Path
+from sys import platform
+from tempfile import TemporaryDirectory
+from typing import List, Optional, Tuple, Union
+
+from ddt import data, ddt  # type: ignore
+
+from download_cache import (
+    DownloadCache,
+    DownloadCacheError,
+    FileCache,
+    clone_file,
+    parse_size,
+)
+
+
+@ddt
+class TestDownloadCache(unittest.TestCase):
+    @data(  # type: ignore
+        ("100", 100),
+        ("1K", 1024),
+        ("512m", 512 * 1024 ** 2),
+        ("50G", 50 * 1024 ** 3),
+        (42, 42),
+    )
+    def test_parse_size(self, test_data: Tuple[Union[str, int], int]) -> None:
+        size, expected = test_data
+        self.assertEqual(parse_size(size), expected)
+
+    def test_parse_size_invalid(self) -> None:
+        with self.assertRaises(DownloadCacheError):
+            parse_size("lots")
+
+    def test_file_cache_store_lookup(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            cache = FileCache(Path(tmp_base_dir) / "cache", "1M")
+            self.assertIsNone(cache.lookup("key"))
+            source = Path(tmp_base_dir) / "source"
+            source.write_bytes(b"content")
+            blob = cache.store("key", source)
+            self.assertFalse(source.exists())
+            self.assertEqual(cache.lookup("key"), blob)
+            self.assertEqual(blob.read_bytes(), b"content")
+
+    def test_file_cache_evict_lru(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            cache = FileCache(Path(tmp_base_dir) / "cache", 25)
+            for index, key in enumerate(("first", "second", "third")):
+                source = Path(tmp_base_dir) / key
+                source.write_bytes(str(index).encode() * 10)
+                blob = cache.store(key, source)
+                os.utime(blob, (index, index))
+            # the oldest blob is evicted when the third one is stored
+            self.assertIsNone(cache.lookup("first"))
+            self.assertIsNotNone(cache.lookup("second"))
+            self.assertIsNotNone(cache.lookup("third"))
+            # the key of the evicted blob is removed with it
+            self.assertEqual(len(list(cache.key_dir.iterdir())), 2)
+
+    @data(  # type: ignore
+        ("etag:\"abc\"", 1),
+        (None, 2),
+    )
+    def test_download_cache_fetch(self, test_data: Tuple[Optional[str], int]) -> None:
+        validator, expected_downloads = test_data
+        downloads: List[str] = []
+
+        def fake_download(url: str, target: str) -> None:
+            downloads.append(url)
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            Path(target).write_bytes(b"archive")
+
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            cache = DownloadCache(Path(tmp_base_dir) / "cache", validator=lambda _: validator)
+            for index in range(2):
+                target = Path(tmp_base_dir) / "out" / f"archive{index}.7z"
+                if not cache.fetch("https://foo.bar/archive.7z", str(target), fake_download):
+                    fake_download("https://foo.bar/archive.7z", str(target))
+                self.assertEqual(target.read_bytes(), b"archive")
+            self.assertEqual(len(downloads), expected_downloads)
+
+    def test_download_cache_target_not_shared(self) -> None:
+        def fake_download(_: str, target: str) -> None:
+            Path(target).write_bytes(b"archive")
+
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            cache = DownloadCache(Path(tmp_base_dir) / "cache", validator=lambda _: "etag:x")
+            targets = [Path(tmp_base_dir) / f"archive{index}.7z" for index in range(2)]
+            for target in targets:
+                self.assertTrue(cache.fetch("https://foo.bar/archive.7z", str(target), fake_download))
+            blob = next(cache.blob_dir.glob("*/*"))
+            for target in targets:
+                # modifying a target must never modify the cached content
+                self.assertNotEqual(target.stat().st_ino, blob.stat().st_ino)
+                target.chmod(0o755)
+                target.write_bytes(b"modified")
+            self.assertEqual(blob.read_bytes(), b"archive")
+
+    def test_file_cache_open_blob_evicted(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            cache = FileCache(Path(tmp_base_dir) / "cache", "1M")
+            self.assertIsNone(cache.open_blob("key"))
+            source = Path(tmp_base_dir) / "source"
+            source.write_bytes(b"content")
+            cache.store("key", source)
+            handle = cache.open_blob("key")
+            assert handle is not None
+            with handle:
+                if platform != "win32":
+                    # the opened blob can be copied after the cache lock is released and evicted
+                    cache.max_size = 0
+                    cache.evict()
+                    self.assertIsNone(cache.lookup("key"))
+                target = Path(tmp_base_dir) / "target"
+                clone_file(handle, target)
+            self.assertEqual(target.read_bytes(), b"content")
+
+    def test_download_cache_checksum_mismatch(self) -> None:
+        def fake_download(_: str, target: str) -> None:
+            Path(target).write_bytes(b"data")
+
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            cache = DownloadCache(Path(tmp_base_dir) / "cache", validator=lambda _: "sha1:" + "0" * 40)
+            with self.assertRaises(DownloadCacheError):
+                cache.fetch("https://foo.bar/a.7z", os.path.join(tmp_base_dir, "a.7z"), fake_download)
+
+    def test_download_cache_local_url_not_cached(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            cache = DownloadCache(Path(tmp_base_dir) / "cache", validator=lambda _: "etag:x")
+            self.assertFalse(cache.fetch("/some/local/file.7z", "target", lambda url, target: None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import os
+import struct
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from bld_utils import is_linux
+from bldinstallercommon import handle_component_rpath
+from elf_rpath import DT_RPATH, DT_RUNPATH, ElfError, read_elf_rpath, write_elf_rpath
+
+BASE_ADDRESS = 0x400000
+
+
+def elf64_file(rpath: bytes, tag: int = DT_RUNPATH) -> bytes:
+    """Minimal little-endian ELF64 file with one loadable segment holding the dynamic section"""
+    dynamic_offset = 64 + 2 * 56
+    strtab_offset = dynamic_offset + 3 * 16
+    size = strtab_offset + len(rpath) + 2
+    header = b"\x7fELF" + bytes([2, 1, 1]) + bytes(9)
+    header += struct.pack("<HHIQQQIHHHHHH", 3, 62, 1, 0, 64, 0, 0, 64, 56, 2, 64, 0, 0)
+    program_headers = struct.pack("<IIQQQQQQ", 1, 5, 0, BASE_ADDRESS, BASE_ADDRESS, size, size, 0x1000)
+    program_headers += struct.pack(
+        "<IIQQQQQQ", 2, 6, dynamic_offset, BASE_ADDRESS + dynamic_offset, BASE_ADDRESS + dynamic_offset, 48, 48, 8
+    )
+    dynamic = struct.pack("<qQqQqQ", 5, BASE_ADDRESS + strtab_offset, tag, 1, 0, 0)
+    return header + program_headers + dynamic + b"\0" + rpath + b"\0"
+
+
+class TestElfRPath(unittest.TestCase):
+    def test_read_elf_rpath(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            binary = Path(tmpdir) / "binary"
+            binary.write_bytes(elf64_file(b"$ORIGIN/../lib", tag=DT_RPATH))
+            rpath = read_elf_rpath(binary)
+            assert rpath is not None
+            self.assertEqual((rpath.tag, rpath.value, rpath.space), ("RPATH", "$ORIGIN/../lib", 14))
+            script = Path(tmpdir) / "script"
+            script.write_text("#!/bin/sh\n", encoding="utf-8")
+            self.assertIsNone(read_elf_rpath(script))
+            truncated = Path(tmpdir) / "truncated"
+            truncated.write_bytes(elf64_file(b"$ORIGIN")[:100])
+            with self.assertRaises(ElfError):
+                read_elf_rpath(truncated)
+
+    def test_write_elf_rpath(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            binary = Path(tmpdir) / "binary"
+            content = elf64_file(b"/build/lib:$ORIGIN")
+            binary.write_bytes(content)
+            rpath = read_elf_rpath(binary)
+            assert rpath is not None
+            with self.assertRaises(ElfError):
+                write_elf_rpath(rpath, "$ORIGIN/../../../lib")
+            write_elf_rpath(rpath, "$ORIGIN")
+            self.assertEqual(binary.read_bytes(), content[:rpath.offset] + b"$ORIGIN" + bytes(12))
+            self.assertEqual(read_elf_rpath(binary), rpath)
+
+    @unittest.skipIf(not is_linux(), "This test is only for Linux")
+    def test_handle_component_rpath(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            (Path(tmpdir) / "bin").mkdir()
+            (Path(tmpdir) / "lib").mkdir()
+            tool = Path(tmpdir) / "bin" / "tool"
+            tool.write_bytes(elf64_file(b"/build/qt/lib:$ORIGIN/../lib"))
+            tool.chmod(0o755)
+            library = Path(tmpdir) / "lib" / "libfoo.so"
+            library.write_bytes(elf64_file(b"/build/qt/lib"))
+            data = Path(tmpdir) / "lib" / "data.so"
+            data.write_bytes(elf64_file(b"/build/qt/lib"))
+            library.chmod(0o755)
+            handle_component_rpath(tmpdir, "/lib")
+            self.assertEqual(read_elf_rpath(tool).value, "$ORIGIN/../lib")  # type: ignore
+            self.assertEqual(read_elf_rpath(library).value, "$ORIGIN")  # type: ignore
+            # files which are not executable are left as they are
+            self.assertEqual(read_elf_rpath(data).value, "/build/qt/lib")  # type: ignore
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import os
+import subprocess
+import tarfile
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Tuple
+from unittest.mock import patch
+
+from ddt import data, ddt  # type: ignore
+
+from git_mirror import GitMirrorCache, resolve_submodule_url
+
+# local paths are used as submodule urls in the tests
+GIT_TEST_ENVIRONMENT = {
+    "GIT_CONFIG_COUNT": "1", "GIT_CONFIG_KEY_0": "protocol.file.allow", "GIT_CONFIG_VALUE_0": "always",
+    "GIT_AUTHOR_NAME": "test", "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "test", "GIT_COMMITTER_EMAIL": "test@example.com",
+}
+
+
+def git(cwd: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git"] + list(args), cwd=cwd, check=True, stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout.strip()
+
+
+def create_repository(path: Path, content: str) -> None:
+    path.mkdir(parents=True)
+    git(path, "init", "--quiet", "--initial-branch=dev")
+    (path / "file.txt").write_text(content, encoding="utf-8")
+    git(path, "add", "file.txt")
+    git(path, "commit", "--quiet", "-m", content)
+
+
+@ddt
+@patch.dict(os.environ, GIT_TEST_ENVIRONMENT)
+class TestGitMirror(unittest.TestCase):
+    @data(  # type: ignore
+        ("https://code.qt.io/qt/qt5.git", "../qtbase.git", "https://code.qt.io/qt/qtbase.git"),
+        ("https://code.qt.io/qt/qt5.git/", "./qtbase", "https://code.qt.io/qt/qt5.git/qtbase"),
+        ("https://code.qt.io/qt/qt5.git", "https://example.com/a.git", "https://example.com/a.git"),
+    )
+    def test_resolve_submodule_url(self, test_data: Tuple[str, str, str]) -> None:
+        repo_url, url, expected = test_data
+        self.assertEqual(resolve_submodule_url(repo_url, url), expected)
+
+    def test_clone(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            upstream = Path(tmpdir) / "upstream.git"
+            create_repository(upstream, "first")
+            cache = GitMirrorCache(Path(tmpdir) / "mirrors")
+            checkout = Path(tmpdir) / "checkout"
+            cache.clone(str(upstream), "dev", str(checkout))
+            self.assertEqual(git(checkout, "symbolic-ref", "--short", "HEAD"), "dev")
+            self.assertEqual(git(checkout, "remote", "get-url", "origin"), str(upstream))
+            self.assertTrue((checkout / ".git" / "objects" / "info" / "alternates").is_file())
+            # the mirror is fetched once per process, a review ref is fetched on demand
+            (upstream / "file.txt").write_text("second", encoding="utf-8")
+            git(upstream, "commit", "--quiet", "-am", "second")
+            git(upstream, "update-ref", "refs/changes/01/1/1", "HEAD")
+            git(upstream, "reset", "--quiet", "--hard", "HEAD~1")
+            review = Path(tmpdir) / "review"
+            cache.clone(str(upstream), "refs/changes/01/1/1", str(review))
+            self.assertEqual((review / "file.txt").read_text(encoding="utf-8"), "second")
+            self.assertEqual(len(list((Path(tmpdir) / "mirrors").glob("*.git"))), 1)
+
+    def test_clone_submodules(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            create_repository(Path(tmpdir) / "sub.git", "sub")
+            superproject = Path(tmpdir) / "super.git"
+            create_repository(superproject, "super")
+            git(superproject, "submodule", "add", "--quiet", "../sub.git", "sub")
+            git(superproject, "commit", "--quiet", "-m", "add submodule")
+            cache = GitMirrorCache(Path(tmpdir) / "mirrors")
+            checkout = Path(tmpdir) / "checkout"
+            cache.clone(str(superproject), "dev", str(checkout), init_subrepos=True)
+            self.assertEqual((checkout / "sub" / "file.txt").read_text(encoding="utf-8"), "sub")
+            self.assertEqual(len(list((Path(tmpdir) / "mirrors").glob("*.git"))), 2)
+
+    def test_archive(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            upstream = Path(tmpdir) / "upstream.git"
+            create_repository(upstream, "content")
+            git(upstream, "tag", "v1.0")
+            archive_name = str(Path(tmpdir) / "upstream-v1.0.tar.gz")
+            GitMirrorCache(Path(tmpdir) / "mirrors").archive(str(upstream), "v1.0", archive_name)
+            with tarfile.open(archive_name) as tar_file:
+                self.assertEqual(tar_file.extractfile("file.txt").read(), b"content")  # type: ignore
+
+
+if __name__ == "__main__":
+    unittest.main()
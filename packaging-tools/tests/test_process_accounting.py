@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+
+import os
+import sys
+import unittest
+from subprocess import CalledProcessError
+
+from bld_utils import is_windows, run_command
+from process_accounting import (
+    CommandRecord,
+    ProcessAccounting,
+    account_command,
+    set_process_accounting,
+)
+from runner import run_cmd
+
+
+class TestProcessAccounting(unittest.TestCase):
+    def setUp(self) -> None:
+        self.accounting = ProcessAccounting()
+        set_process_accounting(self.accounting)
+
+    def tearDown(self) -> None:
+        set_process_accounting(None)
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test")
+    def test_run_cmd_accounting(self) -> None:
+        script = "import sys; sum(range(3000000)); sys.exit(int(sys.argv[1]))"
+        run_cmd([sys.executable, "-c", script, "0"], cwd=os.getcwd())
+        with self.assertRaises(CalledProcessError):
+            run_cmd([sys.executable, "-c", script, "3"], stream=True)
+        self.assertEqual(run_command([sys.executable, "-c", script, "2"], os.getcwd(), expected_exit_codes=[2]), 2)
+        records = self.accounting.records
+        self.assertEqual([record.exit_code for record in records], [0, 3, 2])
+        for record in records:
+            self.assertEqual(record.program, os.path.basename(sys.executable))
+            self.assertEqual(record.cwd, os.getcwd())
+            self.assertGreater(record.wall_time, 0)
+            self.assertGreater(record.user_time + record.system_time, 0)
+            self.assertFalse(record.concurrent)
+        summary, = self.accounting.summary()
+        self.assertEqual((summary["calls"], summary["failures"]), (3, 2))
+        self.assertAlmostEqual(summary["wall_time"], sum(record.wall_time for record in records))
+        self.accounting.log_report()
+
+    def test_accounting_summary_order(self) -> None:
+        self.accounting.records = [
+            CommandRecord("7z", "/", wall_time=1.0, exit_code=0),
+            CommandRecord("cmake", "/", wall_time=5.0, max_rss_kb=10, exit_code=0),
+            CommandRecord("7z", "/", wall_time=2.0, max_rss_kb=20, exit_code=1),
+        ]
+        summary = self.accounting.summary()
+        self.assertEqual([(item["program"], item["wall_time"]) for item in summary], [("cmake", 5.0), ("7z", 3.0)])
+        self.assertEqual((summary[1]["max_rss_kb"], summary[1]["failures"]), (20, 1))
+        self.assertEqual(len(self.accounting.summary(count=1)), 1)
+
+    def test_accounting_concurrent(self) -> None:
+        with account_command(["first"]) as first:
+            with account_command("second --arg") as second:
+                pass
+            self.assertEqual(second.program, "second")
+        with account_command(["third"]) as third:
+            pass
+        self.assertEqual([first.concurrent, second.concurrent, third.concurrent], [True, True, False])
+
+    def test_accounting_disabled(self) -> None:
+        set_process_accounting(None)
+        with account_command(["cmd"]):
+            pass
+        self.assertEqual(self.accounting.records, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
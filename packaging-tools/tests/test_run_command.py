@@ -37,7 +37,7 @@ import unittest
 from time import sleep
 from typing import Any
 
-from bld_utils import run_command
+from bld_utils import OutputTail, run_command
 from threadedwork import ThreadedWork
 
 if sys.platform.startswith("win"):
@@ -123,6 +123,15 @@ class TestRunCommand(unittest.TestCase):
             ), 5
         )
 
+    def test_output_tail(self) -> None:
+        tail = OutputTail(max_lines=3)
+        tail.feed(b"first\nsec")
+        tail.feed(b"ond\nthird\n\xc3")
+        tail.feed(b"\xa4 fourth\nfifth")
+        self.assertEqual(list(tail.lines), ["second\n", "third\n", "\u00e4 fourth\n"])
+        tail.feed(b"", final=True)
+        self.assertEqual(list(tail.lines), ["third\n", "\u00e4 fourth\n", "fifth"])
+
     def test_with_threadedwork(self) -> None:
         current_method_name = sys._getframe().f_code.co_name  # pylint: disable=W0212
         test_work = ThreadedWork(f"{current_method_name} - run some command threaded")
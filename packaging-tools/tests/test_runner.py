@@ -33,14 +33,14 @@ import asyncio
 import os
 import unittest
 from pathlib import Path
-from subprocess import TimeoutExpired
+from subprocess import CalledProcessError, TimeoutExpired
 from tempfile import TemporaryDirectory
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple
 
 from ddt import data, ddt  # type: ignore
 
 from bld_utils import is_windows
-from runner import run_cmd, run_cmd_async
+from runner import ASYNC_LINE_LIMIT, ProcessSupervisor, run_cmd, run_cmd_async
 from tests.testhelpers import asyncio_test
 
 
@@ -57,6 +57,49 @@ class TestRunner(unittest.TestCase):
         with self.assertRaises(asyncio.TimeoutError):
             await run_cmd_async(cmd=cmd, timeout=1)
 
+    @unittest.skipIf(is_windows(), "Windows not supported for this test yet")
+    @asyncio_test
+    async def test_process_supervisor(self) -> None:
+        supervisor = ProcessSupervisor(max_processes=2)
+        lines: List[str] = []
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            # every command counts the running commands in a file, at most two may run at once
+            script = "touch running.$$; ls running.* | wc -l >> counts; sleep 0.2; rm running.$$"
+            calls = [supervisor.run(["sh", "-c", script], cwd=tmp_base_dir) for _ in range(5)]
+            await asyncio.gather(*calls)
+            counts = Path(tmp_base_dir, "counts").read_text(encoding="utf-8").split()
+            self.assertEqual(len(counts), 5)
+            self.assertLessEqual(max(int(count) for count in counts), 2)
+        output = await supervisor.run(["sh", "-c", "echo 1; echo 2"], on_output=lines.append)
+        self.assertEqual(lines, ["1\n", "2\n"])
+        self.assertEqual(output, "1\n2\n")
+        with self.assertRaises(CalledProcessError) as context_manager:
+            await supervisor.run(["sh", "-c", "echo failed; exit 2"])
+        self.assertEqual(context_manager.exception.returncode, 2)
+        self.assertEqual(context_manager.exception.output, "failed\n")
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test yet")
+    @asyncio_test
+    async def test_process_supervisor_timeout_kills_group(self) -> None:
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            # the child started in the background would create the file if it was not killed
+            script = "(sleep 1; touch leaked) & sleep 5"
+            with self.assertRaises(asyncio.TimeoutError):
+                await ProcessSupervisor().run(["sh", "-c", script], cwd=tmp_base_dir, timeout=0.3)
+            await asyncio.sleep(1.2)
+            self.assertFalse(Path(tmp_base_dir, "leaked").exists())
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test yet")
+    @asyncio_test
+    async def test_async_exec_cmd_output(self) -> None:
+        # the whole output is returned, not only its tail
+        output = await run_cmd_async(cmd=["seq", "1", "2000"])
+        self.assertEqual(output.splitlines(), [str(i) for i in range(1, 2001)])
+        # an overlong line is truncated instead of failing the command
+        script = f"head -c {2 * ASYNC_LINE_LIMIT + 10} /dev/zero | tr '\\0' x; echo; printf last"
+        output = await ProcessSupervisor().run(["sh", "-c", script])
+        self.assertEqual(output.splitlines(), ["x" * ASYNC_LINE_LIMIT, "last"])
+
     def test_exec_cmd_timeout(self) -> None:
         cmd = ["sleep", "2"]
         with self.assertRaises(TimeoutExpired):
@@ -104,6 +147,25 @@ class TestRunner(unittest.TestCase):
             output = ""
         self.assertEqual(output, expected_value)
 
+    @unittest.skipIf(is_windows(), "Windows not supported for this test yet")
+    def test_exec_cmd_stream(self) -> None:
+        script = "for i in $(seq 1 5); do echo line $i; done; echo error >&2"
+        with TemporaryDirectory(dir=os.getcwd()) as tmp_base_dir:
+            log_file = Path(tmp_base_dir) / "log"
+            output = run_cmd(cmd=["sh", "-c", script], redirect=str(log_file), stream=True)
+            self.assertEqual(output, "".join(f"line {i}\n" for i in range(1, 6)) + "error\n")
+            self.assertEqual(log_file.read_text(encoding="utf-8"), output)
+        with self.assertRaises(CalledProcessError) as context_manager:
+            run_cmd(cmd=["sh", "-c", "seq 1 2000; exit 3"], stream=True)
+        self.assertEqual(context_manager.exception.returncode, 3)
+        tail_lines = context_manager.exception.output.splitlines()
+        self.assertEqual(tail_lines, [str(i) for i in range(1001, 2001)])
+
+    @unittest.skipIf(is_windows(), "Windows not supported for this test yet")
+    def test_exec_cmd_stream_timeout(self) -> None:
+        with self.assertRaises(TimeoutExpired):
+            run_cmd(["sleep", "2"], timeout=1, stream=True)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+
+import io
+import sys
+import threading
+import unittest
+from typing import List, Optional
+from unittest.mock import patch
+
+import threadedwork
+from threadedwork import ProgressRenderer, Task, TaskCancelledError, TaskExecutor
+
+
+class TestTaskExecutor(unittest.TestCase):
+    def test_task_executor_results(self) -> None:
+        executor = TaskExecutor("results")
+        for value in range(5):
+            executor.add_task(f"square {value}", lambda x: x * x, value)
+        futures = executor.run(max_threads=3)
+        self.assertEqual([future.result() for future in futures], [0, 1, 4, 9, 16])
+        self.assertCountEqual(executor.timings.keys(), range(5))
+
+    def test_task_executor_longest_first(self) -> None:
+        started: List[str] = []
+        executor = TaskExecutor("lpt")
+        for name, cost in (("small", 1), ("big", 100), ("none", 0), ("medium", 10), ("big2", 100)):
+            executor.add_task(name, started.append, name, cost=cost)
+        executor.run(max_threads=1)
+        self.assertEqual(started, ["big", "big2", "medium", "small", "none"])
+
+    def test_task_executor_chained_functions(self) -> None:
+        calls: List[int] = []
+        task = Task("chained", calls.append, 1)
+        task.add_function(calls.append, 2)
+        task.add_function(len, calls)
+        executor = TaskExecutor("chained")
+        executor.add_task_object(task)
+        future, = executor.run()
+        self.assertEqual(future.result(), 2)
+        self.assertEqual(calls, [1, 2])
+
+    def test_task_executor_failure_cancels(self) -> None:
+        calls: List[str] = []
+        release = threading.Event()
+
+        def fail() -> None:
+            raise ValueError("failed task")
+
+        executor = TaskExecutor("failure")
+        # the running task notices the cancellation before its second function
+        running = Task("running", release.wait, 5)
+        running.add_function(calls.append, "running")
+        executor.add_task_object(running, cost=3)
+        executor.add_task("fail", fail, cost=2)
+        executor.add_task("pending", calls.append, "pending", cost=1)
+
+        def release_after_cancel() -> None:
+            executor.cancel_event.wait(5)
+            release.set()
+
+        releaser = threading.Thread(target=release_after_cancel)
+        releaser.start()
+        with self.assertRaises(ValueError):
+            executor.run(max_threads=2)
+        releaser.join()
+        self.assertEqual(calls, [])
+        self.assertTrue(executor.cancel_event.is_set())
+
+    def test_task_executor_cancel(self) -> None:
+        executor = TaskExecutor("cancel")
+        executor.add_task("cancelled", lambda: None)
+        executor.cancel()
+        with self.assertRaises(TaskCancelledError):
+            executor.run()
+
+    def test_task_executor_empty(self) -> None:
+        self.assertEqual(TaskExecutor("empty").run(), [])
+
+    def test_task_executor_output_labelled(self) -> None:
+        both_running = threading.Barrier(2, timeout=5)
+
+        def report(text: str) -> None:
+            both_running.wait()
+            print(text)
+
+        with patch("threadedwork.is_progress_tty", return_value=False):
+            with patch("sys.__stdout__", new_callable=io.StringIO) as output:
+                executor = TaskExecutor("labelled")
+                executor.add_task("first", report, "first output line")
+                executor.add_task("second", report, "second output line")
+                executor.run(max_threads=2)
+        lines = output.getvalue().splitlines()
+        self.assertCountEqual(lines, ["0: first output line", "1: second output line", "0: Done", "1: Done"])
+        self.assertEqual(executor.legend[1].split(), ["1:", "second"])
+
+    def test_task_executor_progress_renderer(self) -> None:
+        renderers: List[Optional[ProgressRenderer]] = []
+        both_running = threading.Barrier(2, timeout=5)
+
+        def report(text: str) -> None:
+            both_running.wait()
+            renderers.append(threadedwork.progress_renderer)
+            print(text)
+
+        stdout = sys.stdout
+        with patch("threadedwork.is_progress_tty", return_value=True), patch("sys.__stdout__", new_callable=io.StringIO):
+            executor = TaskExecutor("progress")
+            executor.add_task("first", report, "a")
+            executor.add_task("second", report, "b")
+            executor.run(max_threads=2)
+        # the renderer is stopped and the hooks are removed after the run
+        self.assertIsNone(threadedwork.progress_renderer)
+        self.assertIs(sys.stdout, stdout)
+        renderer = renderers[0]
+        assert renderer is not None
+        self.assertIs(renderers[1], renderer)
+        # every worker repaints its own slot
+        self.assertCountEqual([slot.split(":")[0] for slot in renderer.slots], ["0", "1"])
+
+
+class TestProgressRenderer(unittest.TestCase):
+    def test_progress_renderer_render(self) -> None:
+        stream = io.StringIO()
+        renderer = ProgressRenderer(2, stream=stream)
+        renderer.update(0, "0: ..")
+        renderer.update(1, "1: long text")
+        renderer.render()
+        renderer.render()
+        renderer.update(1, "1: ..")
+        renderer.render()
+        self.assertEqual(stream.getvalue().split("\r")[1:], ["0: ..     1: long text", "0: ..     1: .." + " " * 7])
+
+    def test_progress_renderer_thread(self) -> None:
+        stream = io.StringIO()
+        renderer = ProgressRenderer(1, interval=0.01, stream=stream)
+        renderer.start()
+        renderer.update(0, "0: ..")
+        renderer.stop()
+        self.assertEqual(stream.getvalue(), "\r0: ..")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+
+import json
+import os
+import threading
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tracing import Tracer
+
+
+class TestTracing(unittest.TestCase):
+    def test_write_trace(self) -> None:
+        tracer = Tracer()
+        with tracer.span("create_target_components"):
+            with tracer.span("download", "archive", archive="qtbase.7z") as args:
+                args["bytes"] = 1024
+
+        def extract() -> None:
+            with tracer.span("extract", "archive", archive="qtsvg.7z"):
+                pass
+
+        worker = threading.Thread(target=extract, name="worker")
+        worker.start()
+        worker.join()
+        with TemporaryDirectory(dir=os.getcwd()) as tmpdir:
+            trace_file = Path(tmpdir) / "trace.json"
+            tracer.write(trace_file)
+            with open(trace_file, encoding="utf-8") as handle:
+                events = json.load(handle)["traceEvents"]
+        spans = [event for event in events if event["ph"] == "X"]
+        self.assertEqual([event["name"] for event in spans], ["download", "create_target_components", "extract"])
+        self.assertEqual(spans[0]["args"], {"archive": "qtbase.7z", "bytes": 1024})
+        self.assertTrue(all(event["dur"] >= 0 for event in spans))
+        thread_names = [event["args"]["name"] for event in events if event["ph"] == "M"]
+        self.assertEqual(thread_names, [threading.current_thread().name, "worker"])
+
+    def test_archive_summary(self) -> None:
+        tracer = Tracer()
+        for archive, duration in (("fast.7z", 1.0), ("slow.7z", 3.0), ("medium.7z", 2.0)):
+            for name in ("download", "archivegen"):
+                with tracer.span(name, "archive", archive=archive):
+                    pass
+                tracer.events[-1]["dur"] = duration * 1e6
+        with tracer.span("parse_components"):
+            pass
+        summary = tracer.archive_summary(count=2)
+        self.assertEqual([(archive, total) for archive, total, _ in summary], [("slow.7z", 6.0), ("medium.7z", 4.0)])
+        self.assertEqual(summary[0][2], {"download": 3.0, "archivegen": 3.0})
+
+    def test_disabled_tracer(self) -> None:
+        tracer = Tracer(enabled=False)
+        with tracer.span("download", "archive", archive="qtbase.7z") as args:
+            args["bytes"] = 1024
+        self.assertEqual(tracer.trace_events(), [])
+        self.assertEqual(tracer.archive_summary(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,21 +33,88 @@ import itertools
 import os
 import sys
 import threading
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
 from multiprocessing import cpu_count
 from queue import Queue
-from time import sleep
+from time import perf_counter, sleep
 from traceback import format_exc
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from logging_util import init_logger
+
+log = init_logger(__name__, debug_mode=False)
 
 # we are using RLock, because threaded_print is using the same lock
 output_lock = threading.RLock()  # pylint: disable=invalid-name
-output_states = []  # pylint: disable=invalid-name
-output_format_string = ''  # pylint: disable=invalid-name
+progress_renderer: Optional["ProgressRenderer"] = None  # pylint: disable=invalid-name
+
+# seconds between two repaints of the progress line
+PROGRESS_REFRESH_INTERVAL = 0.2
+
+
+class ProgressRenderer:
+    """
+    Repaint the status line of all worker threads from a single thread at a fixed rate.
+    The workers only store their state in their own slot and never wait for the terminal.
+    """
+
+    def __init__(self, slot_count: int, interval: float = PROGRESS_REFRESH_INTERVAL, stream: Any = None) -> None:
+        self.slots = [""] * slot_count
+        self.interval = interval
+        self.stream = stream or sys.__stdout__
+        self._last_line = ""
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def update(self, slot: int, value: str) -> None:
+        # a single list item assignment is atomic, no lock needed
+        # the workers of a nested executor share the slots of the outer one
+        self.slots[slot % len(self.slots)] = value
+
+    def render(self) -> None:
+        line = "".join(f"{value:10}" for value in self.slots).strip()
+        if line == self._last_line:
+            return
+        # cleanup old output if the new line is shorter
+        cleaner_string = " " * max(len(self._last_line) - len(line), 0)
+        with output_lock:
+            self.stream.write("\r" + line + cleaner_string)
+            self.stream.flush()
+        self._last_line = line
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="progress_renderer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.render()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.render()
+
+
+def is_progress_tty() -> bool:
+    return sys.__stdout__ is not None and sys.__stdout__.isatty()
 
 
 # prepare our std output hooks
 class StdOutHook:
     def write(self, text: str) -> None:
+        # threads not started by a worker (e.g. a reader thread of a command) have no task
+        task_number = getattr(thread_data, "task_number", "-")
+        if progress_renderer is None:
+            # no terminal to repaint (e.g. CI), log the lines prefixed with the task number
+            lines = [f"{task_number}: {line}" for line in text.splitlines() if line.strip()]
+            if lines:
+                with output_lock:
+                    sys.__stdout__.write(os.linesep.join(lines) + os.linesep)
+            return
         # general print method sends line break just ignore that
         stripped_text = text.strip()
         if stripped_text == "":
@@ -57,19 +124,8 @@ class StdOutHook:
             local_progress_indicator = next_progress_indicator()
         else:
             local_progress_indicator = stripped_text
-
-        new_value = f"{thread_data.task_number}: {local_progress_indicator}"
-        with output_lock:
-            if new_value != output_states[thread_data.worker_thread_id]:
-                old_output = "\r" + output_format_string.format(*output_states).strip()
-                output_states[thread_data.worker_thread_id] = new_value
-                new_output = "\r" + output_format_string.format(*output_states).strip()
-                # cleanup old output if the new line is shorter
-                cleaner_string = ""
-                if len(old_output) > len(new_output):
-                    cleaner_string = " " * (len(old_output) - len(new_output))
-
-                sys.__stdout__.write(new_output + cleaner_string)
+        slot = getattr(thread_data, "worker_thread_id", 0)
+        progress_renderer.update(slot, f"{task_number}: {local_progress_indicator}")
 
     def flush(self) -> None:
         sys.__stdout__.flush()
@@ -97,13 +153,11 @@ org_sterr = sys.stderr
 
 
 def enable_threaded_print(enable: bool = True, thread_count: int = cpu_count()) -> None:
+    global progress_renderer  # pylint: disable=W0603,C0103
     if enable:
-        global output_states  # pylint: disable=W0603,C0103
-        global output_format_string  # pylint: disable=W0603,C0103
-        output_states = [""] * (thread_count)
-        output_format_string = ""
-        for xthread in range(thread_count):
-            output_format_string = output_format_string + "{" + str(xthread) + ":10}"
+        if is_progress_tty():
+            progress_renderer = ProgressRenderer(thread_count)
+            progress_renderer.start()
         sys.stdout = StdOutHook()  # type: ignore
         sys.stderr = StdErrHook()  # type: ignore
         builtins.print = threaded_print
@@ -111,15 +165,24 @@ def enable_threaded_print(enable: bool = True, thread_count: int = cpu_count())
         sys.stdout = org_stdout
         sys.stderr = org_sterr
         builtins.print = org_print
+        if progress_renderer is not None:
+            progress_renderer.stop()
+            progress_renderer = None
 
 
 thread_data = threading.local()
 
 
 def next_progress_indicator() -> Any:
+    if not hasattr(thread_data, "progress_indicator"):
+        thread_data.progress_indicator = itertools.cycle(['..'])
     return next(thread_data.progress_indicator)
 
 
+class TaskCancelledError(Exception):
+    pass
+
+
 class TaskFunction:
 
     def __init__(self, function: Any, *arguments) -> None:  # type: ignore
@@ -164,6 +227,27 @@ class Task:
                 self.exit_function(*(self.exit_function_arguments))
         print("Done")
 
+    def run_functions(self, cancel_event: Optional[threading.Event] = None) -> Any:
+        """
+        Run the task functions in order and return the result of the last one.
+        Unlike do_task() a failure is raised to the caller instead of exiting the program.
+
+        Args:
+            cancel_event: When set, the remaining functions are not started
+
+        Returns:
+            The return value of the last task function
+
+        Raises:
+            TaskCancelledError: When the cancel_event was set before all functions were run
+        """
+        result = None
+        for task_function in self.list_of_functions:
+            if cancel_event is not None and cancel_event.is_set():
+                raise TaskCancelledError(f"{self.task_number}: {self.description} cancelled")
+            result = task_function.function(*(task_function.arguments))
+        return result
+
 
 class ThreadedWork:
 
@@ -246,3 +330,123 @@ class Consumer(threading.Thread):
             thread_data.task_number = task.task_number
             task.do_task()
             self.queue.task_done()
+
+
+class TaskExecutor:
+    """
+    Run tasks in a thread pool and return their futures, a drop-in for ThreadedWork.
+
+    The tasks with the highest cost hint (e.g. archive size) are dispatched first, longest
+    processing time first ordering keeps a big archive from starting last. A failing task
+    cancels the tasks not yet started and the failure is raised from run().
+    Like ThreadedWork the output of the tasks goes through the threaded print hooks, each
+    worker repaints its own slot of the progress line.
+    """
+
+    def __init__(self, description: str) -> None:
+        self.description = description
+        self.tasks: List[Tuple[float, Task]] = []
+        self.legend: List[str] = []
+        self.task_number = 0
+        self.timings: Dict[int, float] = {}
+        self.cancel_event = threading.Event()
+        self._timings_lock = threading.Lock()
+        self._slot_ids = itertools.count()
+
+    def add_task(self, description: str, function: Any, *arguments: Any, cost: float = 0.0) -> None:
+        self.add_task_object(Task(description, function, *arguments), cost=cost)
+
+    def add_task_object(self, task: Task, cost: float = 0.0) -> None:
+        task.task_number = self.task_number
+        self.legend.append(("{:d}: " + os.linesep + "\t{}" + os.linesep).format(task.task_number, task.description))
+        self.tasks.append((cost, task))
+        self.task_number = self.task_number + 1
+
+    def cancel(self) -> None:
+        """Request the running tasks to stop after their current function"""
+        self.cancel_event.set()
+
+    def _init_worker(self) -> None:
+        thread_data.progress_indicator = itertools.cycle(['..'])
+        thread_data.worker_thread_id = next(self._slot_ids)
+
+    def _run_task(self, task: Task) -> Any:
+        # we like to know which task get the progress -> see std handling
+        thread_data.task_number = task.task_number
+        start = perf_counter()
+        try:
+            result = task.run_functions(self.cancel_event)
+        except TaskCancelledError:
+            raise
+        except Exception:
+            print("FAIL")
+            # stop the other tasks already here, a free worker would start the next task
+            self.cancel()
+            raise
+        finally:
+            with self._timings_lock:
+                self.timings[task.task_number] = perf_counter() - start
+        print("Done")
+        return result
+
+    def run(self, max_threads: Optional[int] = None) -> "List[Future[Any]]":
+        """
+        Run all added tasks and wait for them to finish.
+
+        Args:
+            max_threads: The worker thread count, by default one per task up to the cpu count
+
+        Returns:
+            The futures of the tasks in the order the tasks were added
+
+        Raises:
+            Exception: The failure of the first failed task
+        """
+        if not self.tasks:
+            return []
+        if max_threads is None:
+            max_threads = min(cpu_count(), self.task_number)
+        log.info("##### %s #####", self.description)
+        print(os.linesep.join(self.legend))
+        # sorted() is stable, tasks with an equal cost keep the order they were added in
+        ordered_tasks = sorted(self.tasks, key=lambda item: item[0], reverse=True)
+        futures: Dict[int, "Future[Any]"] = {}
+        self._slot_ids = itertools.count()
+        # a nested executor prints through the hooks of the outer one
+        threaded_output = max_threads > 1 and not isinstance(sys.stdout, StdOutHook)
+        if threaded_output:
+            enable_threaded_print(True, max_threads)
+        start = perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=max(max_threads, 1), initializer=self._init_worker) as executor:
+                try:
+                    for _, task in ordered_tasks:
+                        futures[task.task_number] = executor.submit(self._run_task, task)
+                    _, not_done = wait(futures.values(), return_when=FIRST_EXCEPTION)
+                except BaseException:
+                    # e.g. KeyboardInterrupt, do not start anything new and let the running tasks stop
+                    self.cancel()
+                    for future in futures.values():
+                        future.cancel()
+                    raise
+                if not_done:
+                    self.cancel()
+                    for future in not_done:
+                        future.cancel()
+        finally:
+            if threaded_output:
+                enable_threaded_print(False)
+        for task_number, duration in sorted(self.timings.items()):
+            log.debug("%d: %.2fs", task_number, duration)
+        log.info("##### %s ... done in %.2fs #####", self.description, perf_counter() - start)
+        result = [futures[task_number] for task_number in sorted(futures)]
+        failures: List[BaseException] = []
+        for future in result:
+            exception = None if future.cancelled() else future.exception()
+            if exception is not None:
+                failures.append(exception)
+        # raise the real failure rather than the cancellations it caused
+        failures.sort(key=lambda exc: isinstance(exc, TaskCancelledError))
+        if failures:
+            raise failures[0]
+        return result
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#############################################################################
+#
+# Copyright (C) 2022 The Qt Company Ltd.
+# Contact: https://www.qt.io/licensing/
+#
+# This file is part of the release tools of the Qt Toolkit.
+#
+# $QT_BEGIN_LICENSE:GPL-EXCEPT$
+# Commercial License Usage
+# Licensees holding valid commercial Qt licenses may use this file in
+# accordance with the commercial license agreement provided with the
+# Software or, alternatively, in accordance with the terms contained in
+# a written agreement between you and The Qt Company. For licensing terms
+# and conditions see https://www.qt.io/terms-conditions. For further
+# information use the contact form at https://www.qt.io/contact-us.
+#
+# GNU General Public License Usage
+# Alternatively, this file may be used under the terms of the GNU
+# General Public License version 3 as published by the Free Software
+# Foundation with exceptions as appearing in the file LICENSE.GPL3-EXCEPT
+# included in the packaging of this file. Please review the following
+# information to ensure the GNU General Public License requirements will
+# be met: https://www.gnu.org/licenses/gpl-3.0.html.
+#
+# $QT_END_LICENSE$
+#
+#############################################################################
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Tuple, Union
+
+from logging_util import init_logger
+
+log = init_logger(__name__, debug_mode=False)
+
+
+class Tracer:
+    """
+    Record timed spans into the Trace Event Format understood by chrome://tracing and Perfetto
+
+    Each span is stored as a complete ('X') event tagged with the thread it ran on. Spans which
+    carry an 'archive' argument are additionally aggregated into the slowest archives summary.
+    A disabled tracer records nothing.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._threads: Dict[int, str] = {}
+        self._start = time.perf_counter()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._start) * 1e6
+
+    @contextmanager
+    def span(self, name: str, category: str = "phase", **args: Any) -> Generator[Dict[str, Any], None, None]:
+        """Time the enclosed block, the yielded dict can be used to attach more arguments"""
+        if not self.enabled:
+            yield args
+            return
+        start = self._now_us()
+        try:
+            yield args
+        finally:
+            duration = self._now_us() - start
+            thread = threading.current_thread()
+            event = {
+                "name": name, "cat": category, "ph": "X", "ts": start, "dur": duration,
+                "pid": os.getpid(), "tid": thread.ident, "args": args,
+            }
+            with self._lock:
+                self._threads.setdefault(thread.ident or 0, thread.name)
+                self.events.append(event)
+
+    def trace_events(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            thread_names = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in self._threads.items()
+            ]
+            return thread_names + list(self.events)
+
+    def write(self, trace_file: Union[str, Path]) -> None:
+        """Write the recorded events as JSON, load the file into chrome://tracing or Perfetto"""
+        Path(trace_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(trace_file, "w", encoding="utf-8") as handle:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, handle)
+        log.info("Wrote trace of %s events to: %s", len(self.events), trace_file)
+
+    def archive_summary(self, count: int = 10) -> List[Tuple[str, float, Dict[str, float]]]:
+        """Return (archive, total seconds, seconds by span name) for the slowest archives"""
+        archives: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for event in self.events:
+                archive = event["args"].get("archive")
+                if archive:
+                    spans = archives.setdefault(archive, {})
+                    spans[event["name"]] = spans.get(event["name"], 0.0) + event["dur"] / 1e6
+        summary = [(archive, sum(spans.values()), spans) for archive, spans in archives.items()]
+        return sorted(summary, key=lambda item: item[1], reverse=True)[:count]
+
+    def log_summary(self, count: int = 10) -> None:
+        summary = self.archive_summary(count)
+        if not summary:
+            return
+        log.info("Slowest archives:")
+        for archive, total, spans in summary:
+            details = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in spans.items())
+            log.info("%9.1fs  %s (%s)", total, archive, details)